@@ -53,6 +53,10 @@ function! leaderf#File#cleanup()
     call leaderf#LfPy("fileExplManager._beforeExit()")
 endfunction
 
+function! leaderf#File#watch()
+    call leaderf#LfPy("fileExplManager.watch()")
+endfunction
+
 function! leaderf#File#TimerCallback(id)
     call leaderf#LfPy("fileExplManager._workInIdle(bang=True)")
 endfunction
@@ -38,6 +38,8 @@ typedef struct FeString
 {
     char*    str;
     uint32_t len;
+    /* see getSignature(), all bits are set if it is unknown */
+    uint64_t signature;
 }FeString;
 
 typedef struct TaskItem
@@ -116,6 +118,11 @@ struct FuzzyEngine
         {
             PatternContext* pPattern_ctxt;
             uint8_t         is_name_only;
+            /* the pattern that matches the directory name, used by GET_WEIGHT_REFINE */
+            PatternContext* pDir_pattern_ctxt;
+            /* the patterns that must all be matched, used by GET_WEIGHT_AND */
+            PatternContext** pattern_ctxts;
+            uint32_t        pattern_count;
         };
         struct
         {
@@ -130,6 +137,9 @@ struct FuzzyEngine
         FeResult*        results;
         HighlightGroup** highlights;
     };
+    uint32_t        top_k;
+    /* set by abort(), the tasks that compute the weights stop as soon as it is set */
+    volatile uint8_t aborted;
     FeCircularQueue task_queue;
 };
 
@@ -321,8 +331,24 @@ struct FuzzyEngine
 
 #define MIN(a, b) ((a) < (b) ? (a) : (b))
 
+/**
+ * the same as QUEUE_JOIN, but the GIL is released while waiting, so that other python threads,
+ * e.g., the thread reading the output of a command, can run in the meantime.
+ * it must only be used when the tasks do not touch any python object, the tasks that do,
+ * e.g., PY_SET_ITEM, rely on the GIL held by the waiting thread.
+ */
+#define QUEUE_JOIN_ALLOW_THREADS(queue)                                             \
+    do {                                                                            \
+        Py_BEGIN_ALLOW_THREADS                                                      \
+        QUEUE_JOIN(queue);                                                          \
+        Py_END_ALLOW_THREADS                                                        \
+    } while(0)
+
 #define MAX_TASK_COUNT(cpu_count) ((cpu_count) << 3)
 
+/* how often the tasks that compute the weights check whether the search is aborted */
+#define ABORT_CHECK_MASK 0x3FF
+
 enum
 {
     GET_WEIGHT = 0,
@@ -333,7 +359,10 @@ enum
     MERGE,
     MERGE_2,
     PY_SET_ITEM,
-    PY_SET_ITEM_2
+    PY_SET_ITEM_2,
+    TOP_K,
+    GET_WEIGHT_AND,
+    GET_WEIGHT_REFINE
 };
 
 /* sort in descending order */
@@ -353,6 +382,82 @@ static int compare2(const void* a, const void* b)
     return (int)wb - (int)wa;
 }
 
+/* sift down the item at `i` of a min-heap ordered by weight */
+static void siftDown(FeResult* heap, uint32_t size, uint32_t i)
+{
+    FeResult item = heap[i];
+    while ( 1 )
+    {
+        uint32_t child = (i << 1) + 1;
+        if ( child >= size )
+            break;
+
+        if ( child + 1 < size && heap[child + 1].weight < heap[child].weight )
+            ++child;
+
+        if ( heap[child].weight < item.weight )
+        {
+            heap[i] = heap[child];
+            i = child;
+        }
+        else
+        {
+            break;
+        }
+    }
+    heap[i] = item;
+}
+
+/**
+ * move the `k` items with the highest weights to the front of `results` and sort them
+ * in descending order, the order of the other items is unspecified.
+ */
+static void selectTopK(FeResult* results, uint32_t length, uint32_t k)
+{
+    if ( k >= length )
+    {
+        qsort(results, length, sizeof(FeResult), compare);
+        return;
+    }
+
+    uint32_t i;
+    for ( i = k >> 1; i > 0; --i )
+    {
+        siftDown(results, k, i - 1);
+    }
+
+    for ( i = k; i < length; ++i )
+    {
+        if ( results[i].weight > results[0].weight )
+        {
+            FeResult tmp = results[0];
+            results[0] = results[i];
+            results[i] = tmp;
+            siftDown(results, k, 0);
+        }
+    }
+
+    qsort(results, k, sizeof(FeResult), compare);
+}
+
+/**
+ * return the length of the directory name of `str`, including the trailing path separator,
+ * the file name starts right after it.
+ */
+static uint32_t getDirnameLength(const char* str, uint32_t length)
+{
+    const char* p = str + length - 1;
+    for ( ; p >= str; --p )
+    {
+        if ( *p == '/' || *p == '\\' )
+        {
+            return (uint32_t)(p + 1 - str);
+        }
+    }
+
+    return 0;
+}
+
 #if defined(_MSC_VER)
 static DWORD WINAPI _worker(LPVOID pParam)
 #else
@@ -374,16 +479,97 @@ static void* _worker(void* pParam)
                 {
                     FeString* tasks = pEngine->source + pTask->offset;
                     FeResult* results = pEngine->results + pTask->offset;
+                    uint64_t signature = pEngine->pPattern_ctxt->signature;
                     uint32_t length = pTask->length;
                     uint32_t i = 0;
                     for ( ; i < length; ++i )
                     {
-                        results[i].weight = getWeight(tasks[i].str, tasks[i].len,
-                                                      pEngine->pPattern_ctxt, pEngine->is_name_only);
+                        if ( (i & ABORT_CHECK_MASK) == 0 && pEngine->aborted )
+                            break;
+
+                        /* some characters of the pattern are not in the text */
+                        if ( signature & ~tasks[i].signature )
+                        {
+                            results[i].weight = MIN_WEIGHT;
+                        }
+                        else
+                        {
+                            results[i].weight = getWeight(tasks[i].str, tasks[i].len,
+                                                          pEngine->pPattern_ctxt, pEngine->is_name_only);
+                        }
                         results[i].index = pTask->offset + i;
                     }
                 }
                 break;
+            case GET_WEIGHT_AND:
+                {
+                    FeString* tasks = pEngine->source + pTask->offset;
+                    FeResult* results = pEngine->results + pTask->offset;
+                    PatternContext** pattern_ctxts = pEngine->pattern_ctxts;
+                    uint32_t pattern_count = pEngine->pattern_count;
+                    uint32_t length = pTask->length;
+                    uint32_t i = 0;
+                    for ( ; i < length; ++i )
+                    {
+                        if ( (i & ABORT_CHECK_MASK) == 0 && pEngine->aborted )
+                            break;
+
+                        weight_t weight = 0;
+                        uint32_t k;
+                        for ( k = 0; k < pattern_count; ++k )
+                        {
+                            /* some characters of the pattern are not in the text */
+                            if ( pattern_ctxts[k]->signature & ~tasks[i].signature )
+                            {
+                                weight = MIN_WEIGHT;
+                                break;
+                            }
+                        }
+
+                        for ( k = 0; k < pattern_count && weight > MIN_WEIGHT; ++k )
+                        {
+                            weight_t w = getWeight(tasks[i].str, tasks[i].len, pattern_ctxts[k], pEngine->is_name_only);
+                            if ( w > MIN_WEIGHT )
+                                weight += w;
+                            else
+                                weight = MIN_WEIGHT;
+                        }
+                        results[i].weight = weight;
+                        results[i].index = pTask->offset + i;
+                    }
+                }
+                break;
+            case GET_WEIGHT_REFINE:
+                {
+                    FeString* tasks = pEngine->source + pTask->offset;
+                    FeResult* results = pEngine->results + pTask->offset;
+                    PatternContext* pName_ctxt = pEngine->pPattern_ctxt;
+                    PatternContext* pDir_ctxt = pEngine->pDir_pattern_ctxt;
+                    uint64_t signature = pName_ctxt->signature | pDir_ctxt->signature;
+                    uint32_t length = pTask->length;
+                    uint32_t i = 0;
+                    for ( ; i < length; ++i )
+                    {
+                        if ( (i & ABORT_CHECK_MASK) == 0 && pEngine->aborted )
+                            break;
+
+                        results[i].weight = MIN_WEIGHT;
+                        results[i].index = pTask->offset + i;
+                        /* some characters of the patterns are not in the text */
+                        if ( signature & ~tasks[i].signature )
+                            continue;
+
+                        uint32_t dir_len = getDirnameLength(tasks[i].str, tasks[i].len);
+                        weight_t name_weight = getWeight(tasks[i].str + dir_len, tasks[i].len - dir_len, pName_ctxt, 1);
+                        if ( name_weight > MIN_WEIGHT )
+                        {
+                            weight_t dir_weight = getWeight(tasks[i].str, dir_len, pDir_ctxt, 0);
+                            if ( dir_weight > MIN_WEIGHT )
+                                results[i].weight = name_weight + dir_weight;
+                        }
+                    }
+                }
+                break;
             case GET_HIGHLIGHTS:
                 {
                     FeString* tasks = pEngine->source + pTask->offset;
@@ -496,6 +682,12 @@ static void* _worker(void* pParam)
                     }
                 }
                 break;
+            case TOP_K:
+                {
+                    FeResult* tasks = pEngine->results + pTask->offset;
+                    selectTopK(tasks, pTask->length, pEngine->top_k);
+                }
+                break;
             case PY_SET_ITEM_2:
                 {
                     PySetTaskItem* pPySetTask = (PySetTaskItem*)pTask;
@@ -545,6 +737,7 @@ FuzzyEngine* createFuzzyEngine(uint32_t cpu_count)
     pEngine->threads = NULL;
     pEngine->pPattern_ctxt = NULL;
     pEngine->source = NULL;
+    pEngine->aborted = 0;
 
     int32_t ret = 0;
     QUEUE_INIT(pEngine->task_queue, MAX_TASK_COUNT(cpu_count) + cpu_count + 1, ret);
@@ -654,6 +847,50 @@ static PyObject* fuzzyEngine_closeFuzzyEngine(PyObject* self, PyObject* args)
     Py_RETURN_NONE;
 }
 
+/**
+ * abort(engine)
+ *
+ * abort the search in progress, if any, that is run by fuzzyMatch(), fuzzyMatchEx() or fuzzyMatchPart().
+ * it is meant to be called from another thread, since the GIL is released while searching.
+ * the aborted search returns None.
+ * the searches do not clear the flag when they start, so that an abort made just before a
+ * search starts is not lost, clearAbort() clears it.
+ */
+static PyObject* fuzzyEngine_abort(PyObject* self, PyObject* args)
+{
+    PyObject* engine = NULL;
+    if ( !PyArg_ParseTuple(args, "O:abort", &engine) )
+        return NULL;
+
+    FuzzyEngine* pEngine = (FuzzyEngine*)PyCapsule_GetPointer(engine, NULL);
+    if ( !pEngine )
+        return NULL;
+
+    pEngine->aborted = 1;
+
+    Py_RETURN_NONE;
+}
+
+/**
+ * clearAbort(engine)
+ *
+ * make the searches run by `engine` not aborted, see abort().
+ */
+static PyObject* fuzzyEngine_clearAbort(PyObject* self, PyObject* args)
+{
+    PyObject* engine = NULL;
+    if ( !PyArg_ParseTuple(args, "O:clearAbort", &engine) )
+        return NULL;
+
+    FuzzyEngine* pEngine = (FuzzyEngine*)PyCapsule_GetPointer(engine, NULL);
+    if ( !pEngine )
+        return NULL;
+
+    pEngine->aborted = 0;
+
+    Py_RETURN_NONE;
+}
+
 static void delPatternContext(PyObject* obj)
 {
     free(PyCapsule_GetPointer(obj, NULL));
@@ -685,13 +922,285 @@ static PyObject* createWeights(void* weights)
     return PyCapsule_New(weights, NULL, delWeights);
 }
 
+#define CORPUS_BLOCK_SIZE (1 << 20)
+
+/**
+ * the arena blocks of a corpus are never reallocated, so the pointers
+ * in FeCorpus.strings stay valid while the corpus grows.
+ */
+typedef struct FeCorpusBlock
+{
+    struct FeCorpusBlock* next;
+    uint32_t capacity;
+    uint32_t used;
+    char     data[1];
+}FeCorpusBlock;
+
+typedef struct FeCorpus
+{
+    FeString*      strings;
+    uint32_t       size;
+    uint32_t       capacity;
+    /* the block being filled, it links to the blocks filled before */
+    FeCorpusBlock* blocks;
+}FeCorpus;
+
+static void closeCorpus(FeCorpus* pCorpus)
+{
+    if ( !pCorpus )
+        return;
+
+    FeCorpusBlock* block = pCorpus->blocks;
+    while ( block )
+    {
+        FeCorpusBlock* next = block->next;
+        free(block);
+        block = next;
+    }
+    free(pCorpus->strings);
+    free(pCorpus);
+}
+
+static int32_t appendToCorpus(FeCorpus* pCorpus, const char* str, uint32_t len)
+{
+    if ( pCorpus->size == pCorpus->capacity )
+    {
+        uint32_t capacity = pCorpus->capacity ? pCorpus->capacity << 1 : 4096;
+        FeString* strings = (FeString*)realloc(pCorpus->strings, capacity * sizeof(FeString));
+        if ( !strings )
+        {
+            fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
+            return -1;
+        }
+        pCorpus->strings = strings;
+        pCorpus->capacity = capacity;
+    }
+
+    FeCorpusBlock* block = pCorpus->blocks;
+    if ( !block || block->capacity - block->used < len )
+    {
+        uint32_t capacity = len > CORPUS_BLOCK_SIZE ? len : CORPUS_BLOCK_SIZE;
+        block = (FeCorpusBlock*)malloc(sizeof(FeCorpusBlock) + capacity);
+        if ( !block )
+        {
+            fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
+            return -1;
+        }
+        block->next = pCorpus->blocks;
+        block->capacity = capacity;
+        block->used = 0;
+        pCorpus->blocks = block;
+    }
+
+    FeString* s = pCorpus->strings + pCorpus->size;
+    s->str = block->data + block->used;
+    s->len = len;
+    s->signature = getSignature(str, len);
+    memcpy(s->str, str, len);
+    block->used += len;
+    ++pCorpus->size;
+
+    return 0;
+}
+
+static void delCorpus(PyObject* obj)
+{
+    closeCorpus((FeCorpus*)PyCapsule_GetPointer(obj, NULL));
+}
+
 /**
- * fuzzyMatch(engine, source, pattern, is_name_only=False, sort_results=True)
+ * createCorpus()
+ *
+ * return a corpus object, which keeps the utf-8 encoded items of a list, so that they
+ * need not be converted again every time the list is matched.
+ */
+static PyObject* fuzzyEngine_createCorpus(PyObject* self, PyObject* args)
+{
+    FeCorpus* pCorpus = (FeCorpus*)calloc(1, sizeof(FeCorpus));
+    if ( !pCorpus )
+    {
+        fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
+        return NULL;
+    }
+
+    return PyCapsule_New(pCorpus, NULL, delCorpus);
+}
+
+/**
+ * appendCorpus(corpus, source, start=0)
+ *
+ * append the items of `source` from index `start` to the end to `corpus`.
+ * return the number of items in `corpus`.
+ */
+static PyObject* fuzzyEngine_appendCorpus(PyObject* self, PyObject* args, PyObject* kwargs)
+{
+    PyObject* py_corpus = NULL;
+    PyObject* py_source = NULL;
+    uint32_t start = 0;
+    static char* kwlist[] = {"corpus", "source", "start", NULL};
+
+    if ( !PyArg_ParseTupleAndKeywords(args, kwargs, "OO|I:appendCorpus", kwlist, &py_corpus, &py_source, &start) )
+        return NULL;
+
+    FeCorpus* pCorpus = (FeCorpus*)PyCapsule_GetPointer(py_corpus, NULL);
+    if ( !pCorpus )
+        return NULL;
+
+    if ( !PyList_Check(py_source) )
+    {
+        PyErr_SetString(PyExc_TypeError, "parameter `source` must be a list.");
+        return NULL;
+    }
+
+    uint32_t source_size = (uint32_t)PyList_Size(py_source);
+    uint32_t i = start;
+    for ( ; i < source_size; ++i )
+    {
+        char* str = NULL;
+        uint32_t len = 0;
+        if ( pyObject_ToStringAndSize(PyList_GET_ITEM(py_source, i), &str, &len) < 0 )
+        {
+            fprintf(stderr, "pyObject_ToStringAndSize error!\n");
+            return NULL;
+        }
+
+        if ( appendToCorpus(pCorpus, str, len) < 0 )
+            return PyErr_NoMemory();
+    }
+
+    return Py_BuildValue("I", pCorpus->size);
+}
+
+/**
+ * return 0 if `py_corpus` is None or it holds the items of `source`, which is a slice
+ * of the list the corpus is built from, starting at `offset`; otherwise return -1.
+ */
+static int32_t getCorpus(PyObject* py_corpus, uint32_t offset, uint32_t source_size, FeCorpus** ppCorpus)
+{
+    *ppCorpus = NULL;
+    if ( !py_corpus || py_corpus == Py_None )
+        return 0;
+
+    FeCorpus* pCorpus = (FeCorpus*)PyCapsule_GetPointer(py_corpus, NULL);
+    if ( !pCorpus )
+        return -1;
+
+    if ( offset + source_size > pCorpus->size )
+    {
+        PyErr_SetString(PyExc_ValueError, "parameter `corpus` does not contain all the items of `source`.");
+        return -1;
+    }
+
+    *ppCorpus = pCorpus;
+    return 0;
+}
+
+/**
+ * move the `top_k` results with the highest weights to the front of `results` in descending order,
+ * the order of the rest of `results` is unspecified, `top_k` must be less than `results_count`.
+ * each chunk selects its own top `top_k` in the worker threads, then the chunks are merged.
+ *
+ * return 0 if success, otherwise return -1.
+ */
+static int32_t partialSort(FuzzyEngine* pEngine, TaskItem* tasks, uint32_t task_count,
+                           FeResult* results, uint32_t results_count, uint32_t top_k)
+{
+    if ( task_count == 1 || results_count < 60000 )
+    {
+        Py_BEGIN_ALLOW_THREADS
+        selectTopK(results, results_count, top_k);
+        Py_END_ALLOW_THREADS
+        return 0;
+    }
+
+    uint32_t chunk_size = (results_count + task_count - 1) / task_count;
+    if ( chunk_size < top_k )
+    {
+        chunk_size = top_k;
+    }
+    task_count = (results_count + chunk_size - 1) / chunk_size;
+
+    FeResult* buffer = (FeResult*)malloc(results_count * sizeof(FeResult));
+    if ( !buffer )
+    {
+        return -1;
+    }
+
+    uint32_t* heads = (uint32_t*)calloc(task_count, sizeof(uint32_t));
+    if ( !heads )
+    {
+        free(buffer);
+        return -1;
+    }
+
+    pEngine->top_k = top_k;
+    uint32_t i;
+#if defined(_MSC_VER)
+    QUEUE_SET_TASK_COUNT(pEngine->task_queue, task_count);
+#endif
+    for ( i = 0; i < task_count; ++i )
+    {
+        uint32_t offset = i * chunk_size;
+        uint32_t length = MIN(chunk_size, results_count - offset);
+
+        tasks[i].function = TOP_K;
+        tasks[i].offset = offset;
+        tasks[i].length = length;
+        QUEUE_PUT(pEngine->task_queue, tasks + i);
+    }
+
+    QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
+
+    uint32_t n;
+    for ( n = 0; n < top_k; ++n )
+    {
+        uint32_t best = task_count;
+        for ( i = 0; i < task_count; ++i )
+        {
+            if ( heads[i] < MIN(top_k, tasks[i].length)
+                 && (best == task_count
+                     || results[tasks[i].offset + heads[i]].weight > results[tasks[best].offset + heads[best]].weight) )
+            {
+                best = i;
+            }
+        }
+        buffer[n] = results[tasks[best].offset + heads[best]];
+        ++heads[best];
+    }
+
+    for ( i = 0; i < task_count; ++i )
+    {
+        uint32_t length = tasks[i].length - heads[i];
+        memcpy(buffer + n, results + tasks[i].offset + heads[i], length * sizeof(FeResult));
+        n += length;
+    }
+
+    memcpy(results, buffer, results_count * sizeof(FeResult));
+
+    free(heads);
+    free(buffer);
+
+    return 0;
+}
+
+/**
+ * fuzzyMatch(engine, source, pattern, is_name_only=False, sort_results=True, corpus=None, offset=0, top_k=0,
+ *            dir_pattern=None)
  *
  * `is_name_only` is optional, it defaults to `False`, which indicates using the full path matching algorithm.
  * `sort_results` is optional, it defineds to `True`, which indicates whether to sort the results.
+ * `corpus` is optional, if it is not None, the items of `source` are read from `corpus` starting at
+ *      `offset` instead of being converted one by one, `source` must be the slice of the list that
+ *      `corpus` is built from.
+ * `top_k` is optional, if it is greater than 0 and `sort_results` is `True`, only the first `top_k` results
+ *      are sorted, the rest are left unsorted and can be sorted later by sortRemainder(result, top_k).
+ * `dir_pattern` is optional, if it is not None, the items of `source` are file paths, `pattern` is matched
+ *      against the file name and `dir_pattern` against the directory name, e.g. `abc;def` in refine mode,
+ *      an item matches if both of them match, and its weight is the sum of the two weights.
+ *      `is_name_only` is ignored in this case.
  *
- * return a tuple, (a list of corresponding weight, a sorted list of items from `source` that match `pattern`).
+ * return a tuple, (a list of corresponding weight, a sorted list of items from `source` that match `pattern`),
+ * or None if the search is aborted by abort().
  */
 static PyObject* fuzzyEngine_fuzzyMatch(PyObject* self, PyObject* args, PyObject* kwargs)
 {
@@ -700,10 +1209,16 @@ static PyObject* fuzzyEngine_fuzzyMatch(PyObject* self, PyObject* args, PyObject
     PyObject* py_patternCtxt = NULL;
     uint8_t is_name_only = 0;
     uint8_t sort_results = 1;
-    static char* kwlist[] = {"engine", "source", "pattern", "is_name_only", "sort_results", NULL};
-
-    if ( !PyArg_ParseTupleAndKeywords(args, kwargs, "OOO|bb:fuzzyMatch", kwlist, &py_engine,
-                                      &py_source, &py_patternCtxt, &is_name_only, &sort_results) )
+    PyObject* py_corpus = NULL;
+    uint32_t corpus_offset = 0;
+    uint32_t top_k = 0;
+    PyObject* py_dirPatternCtxt = NULL;
+    static char* kwlist[] = {"engine", "source", "pattern", "is_name_only", "sort_results", "corpus", "offset",
+                             "top_k", "dir_pattern", NULL};
+
+    if ( !PyArg_ParseTupleAndKeywords(args, kwargs, "OOO|bbOIIO:fuzzyMatch", kwlist, &py_engine, &py_source,
+                                      &py_patternCtxt, &is_name_only, &sort_results, &py_corpus, &corpus_offset,
+                                      &top_k, &py_dirPatternCtxt) )
         return NULL;
 
     FuzzyEngine* pEngine = (FuzzyEngine*)PyCapsule_GetPointer(py_engine, NULL);
@@ -722,12 +1237,26 @@ static PyObject* fuzzyEngine_fuzzyMatch(PyObject* self, PyObject* args, PyObject
         return Py_BuildValue("([],[])");
     }
 
+    FeCorpus* pCorpus = NULL;
+    if ( getCorpus(py_corpus, corpus_offset, source_size, &pCorpus) < 0 )
+        return NULL;
+
     pEngine->pPattern_ctxt = (PatternContext*)PyCapsule_GetPointer(py_patternCtxt, NULL);
     if ( !pEngine->pPattern_ctxt )
         return NULL;
 
     pEngine->is_name_only = is_name_only;
 
+    uint32_t function = GET_WEIGHT;
+    if ( py_dirPatternCtxt && py_dirPatternCtxt != Py_None )
+    {
+        pEngine->pDir_pattern_ctxt = (PatternContext*)PyCapsule_GetPointer(py_dirPatternCtxt, NULL);
+        if ( !pEngine->pDir_pattern_ctxt )
+            return NULL;
+
+        function = GET_WEIGHT_REFINE;
+    }
+
     uint32_t max_task_count  = MAX_TASK_COUNT(pEngine->cpu_count);
     uint32_t chunk_size = (source_size + max_task_count - 1) / max_task_count;
     uint32_t task_count = (source_size + chunk_size - 1) / chunk_size;
@@ -810,7 +1339,7 @@ static PyObject* fuzzyEngine_fuzzyMatch(PyObject* self, PyObject* args, PyObject
         uint32_t offset = i * chunk_size;
         uint32_t length = MIN(chunk_size, source_size - offset);
 
-        tasks[i].function = GET_WEIGHT;
+        tasks[i].function = function;
         tasks[i].offset = offset;
         tasks[i].length = length;
 
@@ -818,21 +1347,37 @@ static PyObject* fuzzyEngine_fuzzyMatch(PyObject* self, PyObject* args, PyObject
         for ( ; j < length; ++j )
         {
             FeString *s = pEngine->source + offset + j;
-            PyObject* item = PyList_GET_ITEM(py_source, offset + j);
-            if ( pyObject_ToStringAndSize(item, &s->str, &s->len) < 0 )
+            if ( pCorpus )
             {
-                free(pEngine->source);
-                free(tasks);
-                free(results);
-                fprintf(stderr, "pyObject_ToStringAndSize error!\n");
-                return NULL;
+                *s = pCorpus->strings[corpus_offset + offset + j];
+            }
+            else
+            {
+                PyObject* item = PyList_GET_ITEM(py_source, offset + j);
+                if ( pyObject_ToStringAndSize(item, &s->str, &s->len) < 0 )
+                {
+                    free(pEngine->source);
+                    free(tasks);
+                    free(results);
+                    fprintf(stderr, "pyObject_ToStringAndSize error!\n");
+                    return NULL;
+                }
+                s->signature = ~0ULL;
             }
         }
 
         QUEUE_PUT(pEngine->task_queue, tasks + i);
     }
 
-    QUEUE_JOIN(pEngine->task_queue);    /* blocks until all tasks have finished */
+    QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
+
+    if ( pEngine->aborted )
+    {
+        free(pEngine->source);
+        free(tasks);
+        free(results);
+        Py_RETURN_NONE;
+    }
 
     uint32_t results_count = 0;
     for ( i = 0; i < source_size; ++i )
@@ -857,9 +1402,22 @@ static PyObject* fuzzyEngine_fuzzyMatch(PyObject* self, PyObject* args, PyObject
 
     if ( sort_results )
     {
-        if ( task_count == 1 || results_count < 60000 )
+        if ( top_k > 0 && top_k < results_count )
+        {
+            if ( partialSort(pEngine, tasks, task_count, results, results_count, top_k) < 0 )
+            {
+                free(pEngine->source);
+                free(tasks);
+                free(results);
+                fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
+                return NULL;
+            }
+        }
+        else if ( task_count == 1 || results_count < 60000 )
         {
+            Py_BEGIN_ALLOW_THREADS
             qsort(results, results_count, sizeof(FeResult), compare);
+            Py_END_ALLOW_THREADS
         }
         else
         {
@@ -892,7 +1450,7 @@ static PyObject* fuzzyEngine_fuzzyMatch(PyObject* self, PyObject* args, PyObject
                 QUEUE_PUT(pEngine->task_queue, tasks + i);
             }
 
-            QUEUE_JOIN(pEngine->task_queue);    /* blocks until all tasks have finished */
+            QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
 
             MergeTaskItem* merge_tasks = NULL;
             merge_tasks = (MergeTaskItem*)malloc(task_count * sizeof(MergeTaskItem));
@@ -933,7 +1491,7 @@ static PyObject* fuzzyEngine_fuzzyMatch(PyObject* self, PyObject* args, PyObject
                     QUEUE_PUT(pEngine->task_queue, merge_tasks + i);
                 }
 
-                QUEUE_JOIN(pEngine->task_queue);    /* blocks until all tasks have finished */
+                QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
 
                 chunk_size <<= 1;
             }
@@ -1014,9 +1572,11 @@ static PyObject* fuzzyEngine_fuzzyMatch(PyObject* self, PyObject* args, PyObject
 }
 
 /**
- * fuzzyMatchEx(engine, source, pattern, is_name_only=False, sort_results=True, is_and_mode=False)
+ * fuzzyMatchEx(engine, source, pattern, is_name_only=False, sort_results=True, is_and_mode=False, corpus=None, offset=0)
  *
  * same as fuzzyMatch(), the only difference is the return value.
+ * `pattern` can also be a list of patterns, then the items of `source` must match all of them and the weight
+ *      is the sum of the weights, all the patterns are matched in one pass.
  * return a tuple, (a list of corresponding weight, a sorted list of index to items from `source` that match `pattern`).
  */
 static PyObject* fuzzyEngine_fuzzyMatchEx(PyObject* self, PyObject* args, PyObject* kwargs)
@@ -1027,10 +1587,14 @@ static PyObject* fuzzyEngine_fuzzyMatchEx(PyObject* self, PyObject* args, PyObje
     uint8_t is_name_only = 0;
     uint8_t sort_results = 1;
     uint8_t is_and_mode = 0;
-    static char* kwlist[] = {"engine", "source", "pattern", "is_name_only", "sort_results", "is_and_mode", NULL};
-
-    if ( !PyArg_ParseTupleAndKeywords(args, kwargs, "OOO|bbb:fuzzyMatch", kwlist, &py_engine,
-                                      &py_source, &py_patternCtxt, &is_name_only, &sort_results, &is_and_mode) )
+    PyObject* py_corpus = NULL;
+    uint32_t corpus_offset = 0;
+    static char* kwlist[] = {"engine", "source", "pattern", "is_name_only", "sort_results", "is_and_mode",
+                             "corpus", "offset", NULL};
+
+    if ( !PyArg_ParseTupleAndKeywords(args, kwargs, "OOO|bbbOI:fuzzyMatch", kwlist, &py_engine, &py_source,
+                                      &py_patternCtxt, &is_name_only, &sort_results, &is_and_mode,
+                                      &py_corpus, &corpus_offset) )
         return NULL;
 
     FuzzyEngine* pEngine = (FuzzyEngine*)PyCapsule_GetPointer(py_engine, NULL);
@@ -1049,10 +1613,48 @@ static PyObject* fuzzyEngine_fuzzyMatchEx(PyObject* self, PyObject* args, PyObje
         return Py_BuildValue("([],[])");
     }
 
-    pEngine->pPattern_ctxt = (PatternContext*)PyCapsule_GetPointer(py_patternCtxt, NULL);
-    if ( !pEngine->pPattern_ctxt )
+    FeCorpus* pCorpus = NULL;
+    if ( getCorpus(py_corpus, corpus_offset, source_size, &pCorpus) < 0 )
         return NULL;
 
+    PatternContext** pattern_ctxts = NULL;
+    if ( PyList_Check(py_patternCtxt) || PyTuple_Check(py_patternCtxt) )
+    {
+        uint32_t pattern_count = (uint32_t)PySequence_Size(py_patternCtxt);
+        if ( pattern_count == 0 )
+        {
+            PyErr_SetString(PyExc_ValueError, "parameter `pattern` must not be empty.");
+            return NULL;
+        }
+
+        pattern_ctxts = (PatternContext**)malloc(pattern_count * sizeof(PatternContext*));
+        if ( !pattern_ctxts )
+        {
+            fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
+            return NULL;
+        }
+
+        uint32_t k;
+        for ( k = 0; k < pattern_count; ++k )
+        {
+            /* PySequence_Fast_GET_ITEM() returns a borrowed reference */
+            pattern_ctxts[k] = (PatternContext*)PyCapsule_GetPointer(PySequence_Fast_GET_ITEM(py_patternCtxt, k), NULL);
+            if ( !pattern_ctxts[k] )
+            {
+                free(pattern_ctxts);
+                return NULL;
+            }
+        }
+        pEngine->pattern_ctxts = pattern_ctxts;
+        pEngine->pattern_count = pattern_count;
+    }
+    else
+    {
+        pEngine->pPattern_ctxt = (PatternContext*)PyCapsule_GetPointer(py_patternCtxt, NULL);
+        if ( !pEngine->pPattern_ctxt )
+            return NULL;
+    }
+
     pEngine->is_name_only = is_name_only;
 
     uint32_t max_task_count  = MAX_TASK_COUNT(pEngine->cpu_count);
@@ -1067,6 +1669,7 @@ static PyObject* fuzzyEngine_fuzzyMatchEx(PyObject* self, PyObject* args, PyObje
     pEngine->source = (FeString*)malloc(source_size * sizeof(FeString));
     if ( !pEngine->source )
     {
+        free(pattern_ctxts);
         fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
         return NULL;
     }
@@ -1075,6 +1678,7 @@ static PyObject* fuzzyEngine_fuzzyMatchEx(PyObject* self, PyObject* args, PyObje
     if ( !tasks )
     {
         free(pEngine->source);
+        free(pattern_ctxts);
         fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
         return NULL;
     }
@@ -1084,6 +1688,7 @@ static PyObject* fuzzyEngine_fuzzyMatchEx(PyObject* self, PyObject* args, PyObje
     {
         free(pEngine->source);
         free(tasks);
+        free(pattern_ctxts);
         fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
         return NULL;
     }
@@ -1102,6 +1707,7 @@ static PyObject* fuzzyEngine_fuzzyMatchEx(PyObject* self, PyObject* args, PyObje
             free(pEngine->source);
             free(tasks);
             free(results);
+            free(pattern_ctxts);
             fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
             return NULL;
         }
@@ -1121,6 +1727,7 @@ static PyObject* fuzzyEngine_fuzzyMatchEx(PyObject* self, PyObject* args, PyObje
                 free(tasks);
                 free(results);
                 free(pEngine->threads);
+                free(pattern_ctxts);
                 fprintf(stderr, "pthread_create error!\n");
                 return NULL;
             }
@@ -1137,7 +1744,7 @@ static PyObject* fuzzyEngine_fuzzyMatchEx(PyObject* self, PyObject* args, PyObje
         uint32_t offset = i * chunk_size;
         uint32_t length = MIN(chunk_size, source_size - offset);
 
-        tasks[i].function = GET_WEIGHT;
+        tasks[i].function = pattern_ctxts ? GET_WEIGHT_AND : GET_WEIGHT;
         tasks[i].offset = offset;
         tasks[i].length = length;
 
@@ -1145,21 +1752,40 @@ static PyObject* fuzzyEngine_fuzzyMatchEx(PyObject* self, PyObject* args, PyObje
         for ( ; j < length; ++j )
         {
             FeString *s = pEngine->source + offset + j;
-            PyObject* item = PyList_GET_ITEM(py_source, offset + j);
-            if ( pyObject_ToStringAndSize(item, &s->str, &s->len) < 0 )
+            if ( pCorpus )
             {
-                free(pEngine->source);
-                free(tasks);
-                free(results);
-                fprintf(stderr, "pyObject_ToStringAndSize error!\n");
-                return NULL;
+                *s = pCorpus->strings[corpus_offset + offset + j];
+            }
+            else
+            {
+                PyObject* item = PyList_GET_ITEM(py_source, offset + j);
+                if ( pyObject_ToStringAndSize(item, &s->str, &s->len) < 0 )
+                {
+                    free(pEngine->source);
+                    free(tasks);
+                    free(results);
+                    free(pattern_ctxts);
+                    fprintf(stderr, "pyObject_ToStringAndSize error!\n");
+                    return NULL;
+                }
+                s->signature = ~0ULL;
             }
         }
 
         QUEUE_PUT(pEngine->task_queue, tasks + i);
     }
 
-    QUEUE_JOIN(pEngine->task_queue);    /* blocks until all tasks have finished */
+    QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
+
+    free(pattern_ctxts);
+
+    if ( pEngine->aborted )
+    {
+        free(pEngine->source);
+        free(tasks);
+        free(results);
+        Py_RETURN_NONE;
+    }
 
     uint32_t results_count = 0;
     for ( i = 0; i < source_size; ++i )
@@ -1186,7 +1812,9 @@ static PyObject* fuzzyEngine_fuzzyMatchEx(PyObject* self, PyObject* args, PyObje
     {
         if ( task_count == 1 || results_count < 60000 )
         {
+            Py_BEGIN_ALLOW_THREADS
             qsort(results, results_count, sizeof(FeResult), compare);
+            Py_END_ALLOW_THREADS
         }
         else
         {
@@ -1219,7 +1847,7 @@ static PyObject* fuzzyEngine_fuzzyMatchEx(PyObject* self, PyObject* args, PyObje
                 QUEUE_PUT(pEngine->task_queue, tasks + i);
             }
 
-            QUEUE_JOIN(pEngine->task_queue);    /* blocks until all tasks have finished */
+            QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
 
             MergeTaskItem* merge_tasks = NULL;
             merge_tasks = (MergeTaskItem*)malloc(task_count * sizeof(MergeTaskItem));
@@ -1260,7 +1888,7 @@ static PyObject* fuzzyEngine_fuzzyMatchEx(PyObject* self, PyObject* args, PyObje
                     QUEUE_PUT(pEngine->task_queue, merge_tasks + i);
                 }
 
-                QUEUE_JOIN(pEngine->task_queue);    /* blocks until all tasks have finished */
+                QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
 
                 chunk_size <<= 1;
             }
@@ -1393,6 +2021,371 @@ static PyObject* fuzzyEngine_merge(PyObject* self, PyObject* args)
     }
     return Py_BuildValue("(NN)", createWeights(weights), text_list);
 }
+
+/**
+ * sort the items of `text_list` from index `start` unit by unit in descending order of `weights`,
+ * the items are only permuted, so their reference counts are not changed.
+ * return -1 if out of memory, otherwise return 0.
+ */
+static int32_t sortUnits(weight_t* weights, PyObject* text_list, uint32_t start, uint32_t unit)
+{
+    uint32_t size = (uint32_t)PyList_Size(text_list);
+    if ( start + unit >= size )
+    {
+        return 0;
+    }
+
+    /* the number of units */
+    uint32_t length = (size - start) / unit;
+    FeResult* results = (FeResult*)malloc(length * sizeof(FeResult));
+    if ( !results )
+    {
+        fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
+        return -1;
+    }
+
+    PyObject** items = (PyObject**)malloc(length * unit * sizeof(PyObject*));
+    if ( !items )
+    {
+        free(results);
+        fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
+        return -1;
+    }
+
+    uint32_t i;
+    for ( i = 0; i < length; ++i )
+    {
+        results[i].weight = weights[start + i * unit];
+        results[i].index = start + i * unit;
+    }
+
+    qsort(results, length, sizeof(FeResult), compare);
+
+    uint32_t k;
+    for ( i = 0; i < length; ++i )
+    {
+        for ( k = 0; k < unit; ++k )
+        {
+            /* borrowed references, the items are only permuted */
+            items[i * unit + k] = PyList_GET_ITEM(text_list, results[i].index + k);
+        }
+    }
+
+    for ( i = 0; i < length * unit; ++i )
+    {
+        weights[start + i] = results[i / unit].weight;
+        PyList_SET_ITEM(text_list, start + i, items[i]);
+    }
+
+    free(items);
+    free(results);
+
+    return 0;
+}
+
+/**
+ * sortRemainder(result, start, unit=1)
+ * `result` is the return value of fuzzyEngine_fuzzyMatch or fuzzyEngine_fuzzyMatchPart called with `top_k`,
+ * sort the items of `result` from index `start` in place, `start` is usually the `top_k` passed in.
+ * `unit` is optional, it is the `unit` passed to fuzzyEngine_fuzzyMatchPart, the items are sorted unit by unit,
+ * and `start` is `top_k * unit` in this case.
+ */
+static PyObject* fuzzyEngine_sortRemainder(PyObject* self, PyObject* args)
+{
+    PyObject* weight_list = NULL;
+    PyObject* text_list = NULL;
+    uint32_t start = 0;
+    uint32_t unit = 1;
+    if ( !PyArg_ParseTuple(args, "(OO)I|I:sortRemainder", &weight_list, &text_list, &start, &unit) )
+        return NULL;
+
+    if ( unit == 0 )
+    {
+        PyErr_SetString(PyExc_ValueError, "parameter `unit` must be greater than 0.");
+        return NULL;
+    }
+
+    if ( start + unit >= (uint32_t)PyList_Size(text_list) )
+    {
+        Py_RETURN_NONE;
+    }
+
+    weight_t* weights = (weight_t*)PyCapsule_GetPointer(weight_list, NULL);
+    if ( !weights )
+        return NULL;
+
+    if ( sortUnits(weights, text_list, start, unit) < 0 )
+        return PyErr_NoMemory();
+
+    Py_RETURN_NONE;
+}
+
+/**
+ * an accumulator collects the results of the chunks of a list that is searched chunk by chunk,
+ * e.g., while the list is still being read. `text_list` only grows, the first `top_k` units of
+ * it are kept sorted, and the units after them are sorted only when sortAccumulator() is called,
+ * so that accumulating a chunk costs time proportional to the size of the chunk instead of
+ * the size of all the results accumulated so far.
+ */
+typedef struct FeAccumulator
+{
+    weight_t* weights;
+    uint32_t  size;
+    uint32_t  capacity;
+    uint32_t  top_k;
+    uint32_t  unit;
+    /* the number of items at the front of text_list that are sorted */
+    uint32_t  sorted_count;
+    PyObject* text_list;
+}FeAccumulator;
+
+static void delAccumulator(PyObject* obj)
+{
+    FeAccumulator* pAccumulator = (FeAccumulator*)PyCapsule_GetPointer(obj, NULL);
+    if ( !pAccumulator )
+        return;
+
+    Py_XDECREF(pAccumulator->text_list);
+    free(pAccumulator->weights);
+    free(pAccumulator);
+}
+
+static int32_t reserveAccumulator(FeAccumulator* pAccumulator, uint32_t size)
+{
+    if ( size <= pAccumulator->capacity )
+        return 0;
+
+    uint32_t capacity = pAccumulator->capacity << 1;
+    if ( capacity < size )
+        capacity = size;
+
+    weight_t* weights = (weight_t*)realloc(pAccumulator->weights, capacity * sizeof(weight_t));
+    if ( !weights )
+    {
+        fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
+        return -1;
+    }
+    pAccumulator->weights = weights;
+    pAccumulator->capacity = capacity;
+
+    return 0;
+}
+
+/**
+ * createAccumulator(result, top_k, unit=1)
+ *
+ * `result` is the return value of fuzzyEngine_fuzzyMatch or fuzzyEngine_fuzzyMatchPart,
+ * which is called with `top_k` and `unit`, or sorted completely.
+ * return an accumulator object that holds a copy of `result`, see accumulate().
+ */
+static PyObject* fuzzyEngine_createAccumulator(PyObject* self, PyObject* args)
+{
+    PyObject* weight_list = NULL;
+    PyObject* text_list = NULL;
+    uint32_t top_k = 0;
+    uint32_t unit = 1;
+    if ( !PyArg_ParseTuple(args, "(OO)I|I:createAccumulator", &weight_list, &text_list, &top_k, &unit) )
+        return NULL;
+
+    if ( unit == 0 )
+    {
+        PyErr_SetString(PyExc_ValueError, "parameter `unit` must be greater than 0.");
+        return NULL;
+    }
+
+    uint32_t size = (uint32_t)PyList_Size(text_list);
+    weight_t* weights = NULL;
+    if ( size > 0 )
+    {
+        weights = (weight_t*)PyCapsule_GetPointer(weight_list, NULL);
+        if ( !weights )
+            return NULL;
+    }
+
+    FeAccumulator* pAccumulator = (FeAccumulator*)calloc(1, sizeof(FeAccumulator));
+    if ( !pAccumulator )
+    {
+        fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
+        return NULL;
+    }
+
+    pAccumulator->top_k = top_k;
+    pAccumulator->unit = unit;
+    if ( reserveAccumulator(pAccumulator, size > 4096 ? size : 4096) < 0 )
+    {
+        free(pAccumulator);
+        return PyErr_NoMemory();
+    }
+
+    pAccumulator->text_list = PyList_GetSlice(text_list, 0, size);
+    if ( !pAccumulator->text_list )
+    {
+        free(pAccumulator->weights);
+        free(pAccumulator);
+        return NULL;
+    }
+
+    if ( size > 0 )
+    {
+        memcpy(pAccumulator->weights, weights, size * sizeof(weight_t));
+    }
+    pAccumulator->size = size;
+    pAccumulator->sorted_count = top_k * unit < size ? top_k * unit : size;
+
+    return PyCapsule_New(pAccumulator, NULL, delAccumulator);
+}
+
+/**
+ * accumulate(accumulator, result)
+ *
+ * `result` is the return value of fuzzyEngine_fuzzyMatch or fuzzyEngine_fuzzyMatchPart,
+ * which is called with the `top_k` and `unit` passed to createAccumulator(), or sorted completely.
+ * the items of `result` are appended to the accumulator, and the first `top_k` units of them
+ * are merged with the first `top_k` units of the accumulator.
+ * return the list of all the items accumulated, the first `top_k` units of which are sorted,
+ * it is the same list every time, call sortAccumulator() before the items after them are used.
+ */
+static PyObject* fuzzyEngine_accumulate(PyObject* self, PyObject* args)
+{
+    PyObject* py_accumulator = NULL;
+    PyObject* weight_list = NULL;
+    PyObject* text_list = NULL;
+    if ( !PyArg_ParseTuple(args, "O(OO):accumulate", &py_accumulator, &weight_list, &text_list) )
+        return NULL;
+
+    FeAccumulator* pAccumulator = (FeAccumulator*)PyCapsule_GetPointer(py_accumulator, NULL);
+    if ( !pAccumulator )
+        return NULL;
+
+    uint32_t size = (uint32_t)PyList_Size(text_list);
+    if ( size == 0 )
+    {
+        Py_INCREF(pAccumulator->text_list);
+        return pAccumulator->text_list;
+    }
+
+    weight_t* weights = (weight_t*)PyCapsule_GetPointer(weight_list, NULL);
+    if ( !weights )
+        return NULL;
+
+    if ( reserveAccumulator(pAccumulator, pAccumulator->size + size) < 0 )
+        return PyErr_NoMemory();
+
+    PyObject* acc_list = pAccumulator->text_list;
+    if ( PyList_SetSlice(acc_list, pAccumulator->size, pAccumulator->size, text_list) < 0 )
+        return NULL;
+
+    weight_t* acc_weights = pAccumulator->weights;
+    memcpy(acc_weights + pAccumulator->size, weights, size * sizeof(weight_t));
+
+    uint32_t unit = pAccumulator->unit;
+    uint32_t top_k = pAccumulator->top_k;
+    /* the number of units accumulated before and the number of units of `result` */
+    uint32_t n = pAccumulator->size / unit;
+    uint32_t m = size / unit;
+    /* the number of sorted units at the front of the accumulated ones and `result`, and after merging */
+    uint32_t k = top_k < n ? top_k : n;
+    uint32_t kc = top_k < m ? top_k : m;
+    uint32_t k2 = top_k < n + m ? top_k : n + m;
+
+    pAccumulator->size += size;
+    pAccumulator->sorted_count = k2 == n + m ? pAccumulator->size : k2 * unit;
+
+    if ( kc == 0 )
+    {
+        Py_INCREF(acc_list);
+        return acc_list;
+    }
+
+    weight_t* merged_weights = (weight_t*)malloc((k + kc) * sizeof(weight_t));
+    if ( !merged_weights )
+    {
+        fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
+        return PyErr_NoMemory();
+    }
+
+    PyObject** items = (PyObject**)malloc((k + kc) * unit * sizeof(PyObject*));
+    if ( !items )
+    {
+        free(merged_weights);
+        fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
+        return PyErr_NoMemory();
+    }
+
+    /* merge units [0, k) and units [n, n + kc) */
+    uint32_t i = 0;
+    uint32_t j = 0;
+    uint32_t t = 0;
+    uint32_t q;
+    while ( i < k || j < kc )
+    {
+        uint32_t src;
+        if ( j == kc || (i < k && acc_weights[i * unit] > acc_weights[(n + j) * unit]) )
+        {
+            src = i++;
+        }
+        else
+        {
+            src = n + j++;
+        }
+
+        merged_weights[t] = acc_weights[src * unit];
+        for ( q = 0; q < unit; ++q )
+        {
+            /* borrowed references, the items are only permuted */
+            items[t * unit + q] = PyList_GET_ITEM(acc_list, src * unit + q);
+        }
+        ++t;
+    }
+
+    /**
+     * the first k2 units go to the front, and the others go to the tail of the
+     * positions of the merged units, i.e., units [n + k2 - k, n + kc)
+     */
+    for ( t = 0; t < k + kc; ++t )
+    {
+        uint32_t dst = t < k2 ? t : n + (k2 - k) + (t - k2);
+        for ( q = 0; q < unit; ++q )
+        {
+            acc_weights[dst * unit + q] = merged_weights[t];
+            PyList_SET_ITEM(acc_list, dst * unit + q, items[t * unit + q]);
+        }
+    }
+
+    free(items);
+    free(merged_weights);
+
+    Py_INCREF(acc_list);
+    return acc_list;
+}
+
+/**
+ * sortAccumulator(accumulator)
+ *
+ * sort the items accumulated that are left unsorted by accumulate().
+ */
+static PyObject* fuzzyEngine_sortAccumulator(PyObject* self, PyObject* args)
+{
+    PyObject* py_accumulator = NULL;
+    if ( !PyArg_ParseTuple(args, "O:sortAccumulator", &py_accumulator) )
+        return NULL;
+
+    FeAccumulator* pAccumulator = (FeAccumulator*)PyCapsule_GetPointer(py_accumulator, NULL);
+    if ( !pAccumulator )
+        return NULL;
+
+    if ( pAccumulator->sorted_count < pAccumulator->size )
+    {
+        if ( sortUnits(pAccumulator->weights, pAccumulator->text_list,
+                       pAccumulator->sorted_count, pAccumulator->unit) < 0 )
+            return PyErr_NoMemory();
+
+        pAccumulator->sorted_count = pAccumulator->size;
+    }
+
+    Py_RETURN_NONE;
+}
+
 /**
  * getHighlights(engine, source, pattern, is_name_only=False)
  *
@@ -1498,7 +2491,7 @@ static PyObject* fuzzyEngine_getHighlights(PyObject* self, PyObject* args, PyObj
         QUEUE_PUT(pEngine->task_queue, tasks + i);
     }
 
-    QUEUE_JOIN(pEngine->task_queue);    /* blocks until all tasks have finished */
+    QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
 
     PyObject* res = PyList_New(source_size);
     for ( i = 0; i < source_size; ++i )
@@ -1529,12 +2522,13 @@ static PyObject* fuzzyEngine_getHighlights(PyObject* self, PyObject* args, PyObj
 }
 
 /**
- * guessMatch(engine, source, filename, suffix, dirname, icon, sort_results=True)
+ * guessMatch(engine, source, filename, suffix, dirname, icon, sort_results=True, corpus=None, offset=0)
  *
  * e.g., /usr/src/example.tar.gz
  * `filename` is "example.tar"
  * `suffix` is ".gz"
  * `dirname` is "/usr/src"
+ * `corpus` and `offset` are optional, see fuzzyMatch().
  *
  * return a tuple, (a list of corresponding weight, a sorted list of items from `source` that match `pattern`).
  */
@@ -1547,10 +2541,14 @@ static PyObject* fuzzyEngine_guessMatch(PyObject* self, PyObject* args, PyObject
     const char* dirname = NULL;
     PyObject* py_icon = NULL;
     uint8_t sort_results = 1;
-    static char* kwlist[] = {"engine", "source", "filename", "suffix", "dirname", "icon", "sort_results", NULL};
-
-    if ( !PyArg_ParseTupleAndKeywords(args, kwargs, "OOsssO|b:guessMatch", kwlist, &py_engine,
-                                      &py_source, &filename, &suffix, &dirname, &py_icon, &sort_results) )
+    PyObject* py_corpus = NULL;
+    uint32_t corpus_offset = 0;
+    static char* kwlist[] = {"engine", "source", "filename", "suffix", "dirname", "icon", "sort_results",
+                             "corpus", "offset", NULL};
+
+    if ( !PyArg_ParseTupleAndKeywords(args, kwargs, "OOsssO|bOI:guessMatch", kwlist, &py_engine, &py_source,
+                                      &filename, &suffix, &dirname, &py_icon, &sort_results,
+                                      &py_corpus, &corpus_offset) )
         return NULL;
 
     FuzzyEngine* pEngine = (FuzzyEngine*)PyCapsule_GetPointer(py_engine, NULL);
@@ -1569,6 +2567,10 @@ static PyObject* fuzzyEngine_guessMatch(PyObject* self, PyObject* args, PyObject
         return Py_BuildValue("([],[])");
     }
 
+    FeCorpus* pCorpus = NULL;
+    if ( getCorpus(py_corpus, corpus_offset, source_size, &pCorpus) < 0 )
+        return NULL;
+
     pEngine->filename = filename;
     pEngine->suffix = suffix;
     pEngine->dirname = dirname;
@@ -1673,15 +2675,22 @@ static PyObject* fuzzyEngine_guessMatch(PyObject* self, PyObject* args, PyObject
         uint32_t j = 0;
         for ( ; j < length; ++j )
         {
-            FeString *s = pEngine->source + offset + j;
-            PyObject* item = PyList_GET_ITEM(py_source, offset + j);
-            if ( pyObject_ToStringAndSize(item, &s->str, &s->len) < 0 )
-            {
-                free(pEngine->source);
-                free(tasks);
-                free(results);
-                fprintf(stderr, "pyObject_ToStringAndSize error!\n");
-                return NULL;
+            FeString *s = pEngine->source + offset + j;
+            if ( pCorpus )
+            {
+                *s = pCorpus->strings[corpus_offset + offset + j];
+            }
+            else
+            {
+                PyObject* item = PyList_GET_ITEM(py_source, offset + j);
+                if ( pyObject_ToStringAndSize(item, &s->str, &s->len) < 0 )
+                {
+                    free(pEngine->source);
+                    free(tasks);
+                    free(results);
+                    fprintf(stderr, "pyObject_ToStringAndSize error!\n");
+                    return NULL;
+                }
             }
 
             if ( icon_len > 0 )
@@ -1694,13 +2703,15 @@ static PyObject* fuzzyEngine_guessMatch(PyObject* self, PyObject* args, PyObject
         QUEUE_PUT(pEngine->task_queue, tasks + i);
     }
 
-    QUEUE_JOIN(pEngine->task_queue);    /* blocks until all tasks have finished */
+    QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
 
     if ( sort_results )
     {
         if ( task_count == 1 || source_size < 60000 )
         {
+            Py_BEGIN_ALLOW_THREADS
             qsort(results, source_size, sizeof(FeResult), compare2);
+            Py_END_ALLOW_THREADS
         }
         else
         {
@@ -1733,7 +2744,7 @@ static PyObject* fuzzyEngine_guessMatch(PyObject* self, PyObject* args, PyObject
                 QUEUE_PUT(pEngine->task_queue, tasks + i);
             }
 
-            QUEUE_JOIN(pEngine->task_queue);    /* blocks until all tasks have finished */
+            QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
 
             MergeTaskItem* merge_tasks = NULL;
             merge_tasks = (MergeTaskItem*)malloc(task_count * sizeof(MergeTaskItem));
@@ -1774,7 +2785,7 @@ static PyObject* fuzzyEngine_guessMatch(PyObject* self, PyObject* args, PyObject
                     QUEUE_PUT(pEngine->task_queue, merge_tasks + i);
                 }
 
-                QUEUE_JOIN(pEngine->task_queue);    /* blocks until all tasks have finished */
+                QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
 
                 chunk_size <<= 1;
             }
@@ -1861,6 +2872,13 @@ enum
     Category_File,
     Category_Gtags,
     Category_Line,
+    Category_Mru,
+    Category_Buffer,
+    Category_Window,
+    Category_BufTag,
+    Category_Function,
+    Category_QuickFix,
+    Category_Help,
 };
 
 typedef struct RgParameter
@@ -1874,6 +2892,8 @@ typedef struct RgParameter
 typedef struct Parameter
 {
     uint32_t mode;
+    /* the number of characters before the file name, e.g., the devicon */
+    uint32_t prefix_len;
 }Parameter;
 
 typedef struct GtagsParameter
@@ -1915,13 +2935,17 @@ static PyObject* fuzzyEngine_createRgParameter(PyObject* self, PyObject* args)
 }
 
 /**
- * createParameter(mode)
+ * createParameter(mode, prefix_len=0)
+ *
+ * `prefix_len` is optional, it is only used by Category_File, Category_Mru, Category_Buffer
+ * and Category_Window, it is the number of characters, not bytes, of the prefix to skip.
  */
 static PyObject* fuzzyEngine_createParameter(PyObject* self, PyObject* args)
 {
     uint32_t mode = 0;
+    uint32_t prefix_len = 0;
 
-    if ( !PyArg_ParseTuple(args, "I:createParameter", &mode) )
+    if ( !PyArg_ParseTuple(args, "I|I:createParameter", &mode, &prefix_len) )
         return NULL;
 
     Parameter* param = (Parameter*)malloc(sizeof(Parameter));
@@ -1931,6 +2955,7 @@ static PyObject* fuzzyEngine_createParameter(PyObject* self, PyObject* args)
     }
 
     param->mode = mode;
+    param->prefix_len = prefix_len;
 
     return PyCapsule_New(param, NULL, delParamObj);
 }
@@ -2038,19 +3063,32 @@ static void tag_getDigest(char** str, uint32_t* length, Parameter* param)
     *length = 0;
 }
 
-static void file_getDigest(char** str, uint32_t* length, Parameter* param)
+/* skip the first `count` characters of `str`, which is utf-8 encoded */
+static void skipChars(char** str, uint32_t* length, uint32_t count)
 {
     char* s = *str;
-    char *p = s + *length - 1;
-    for ( ; p >= s; --p )
+    char* end = s + *length;
+    char* p = s;
+    for ( ; count > 0 && p < end; --count )
     {
-        if ( *p == '/' || *p == '\\' )
-        {
-            *str = p + 1;
-            *length -= (uint32_t)(*str - s);
-            return;
-        }
+        ++p;
+        /* continuation bytes of a multibyte character */
+        while ( p < end && ((uint8_t)*p & 0xC0) == 0x80 )
+            ++p;
     }
+    *str = p;
+    *length -= (uint32_t)(p - s);
+}
+
+/**
+ * the line can be prefixed by a devicon, e.g., Category_Mru with --no-split-path
+ */
+static void file_getDigest(char** str, uint32_t* length, Parameter* param)
+{
+    skipChars(str, length, param->prefix_len);
+    uint32_t dir_len = getDirnameLength(*str, *length);
+    *str += dir_len;
+    *length -= dir_len;
 }
 
 static void gtags_getDigest(char** str, uint32_t* length, GtagsParameter* param)
@@ -2117,11 +3155,193 @@ static void line_getDigest(char** str, uint32_t* length, Parameter* param)
     }
 }
 
+/* return the position of the first ` "` in `str`, or NULL if there is none */
+static char* findQuote(char* str, uint32_t length)
+{
+    char* p = str;
+    for ( ; p + 1 < str + length; ++p )
+    {
+        if ( p[0] == ' ' && p[1] == '"' )
+            return p;
+    }
+    return NULL;
+}
+
+/**
+ * e.g., `name.c      "dir/"`, the line can be prefixed by a devicon,
+ * used by Category_Buffer as well.
+ * mode 0: the whole line after the prefix
+ * mode 1: the file name
+ */
+static void mru_getDigest(char** str, uint32_t* length, Parameter* param)
+{
+    char* s = *str;
+    if ( *length == 0 )
+        return;
+
+    if ( param->mode == 0 )
+    {
+        skipChars(str, length, param->prefix_len);
+        return;
+    }
+
+    char* end = findQuote(s, *length);    /* what if there is " in file name? */
+    if ( !end )
+        end = s + *length - 1;
+
+    skipChars(str, length, param->prefix_len);
+    if ( end <= *str )
+    {
+        *length = 0;
+        return;
+    }
+
+    while ( end > *str && (end[-1] == ' ' || end[-1] == '\t') )
+        --end;
+    *length = (uint32_t)(end - *str);
+}
+
+/**
+ * e.g., ` 1  1 %+-  name.c      "dir/"`
+ * mode 0: the whole line after the prefix
+ * mode 1: the file name followed by the padding
+ */
+static void window_getDigest(char** str, uint32_t* length, Parameter* param)
+{
+    if ( *length == 0 )
+        return;
+
+    char* last = *str + *length - 1;
+    skipChars(str, length, param->prefix_len);
+    if ( param->mode == 0 )
+        return;
+
+    char* end = findQuote(*str, *length);
+    if ( !end )
+        end = last;
+
+    *length = end > *str ? (uint32_t)(end - *str) : 0;
+}
+
+/**
+ * e.g., `tagname    \tkind:line`
+ * mode 0: the whole line
+ * mode 1: the tagname
+ */
+static void bufTag_getDigest(char** str, uint32_t* length, Parameter* param)
+{
+    if ( param->mode == 0 )
+        return;
+
+    char* s = *str;
+    char* p = s;
+    for ( ; p < s + *length; ++p )
+    {
+        if ( *p == '\t' )
+        {
+            while ( p > s && p[-1] == ' ' )
+                --p;
+            *length = (uint32_t)(p - s);
+            return;
+        }
+    }
+}
+
+/**
+ * e.g., `f\tvoid foo()\t[file:line buf_number]`
+ * mode 0: the line without the kind
+ * mode 1: the code
+ */
+static void function_getDigest(char** str, uint32_t* length, Parameter* param)
+{
+    char* s = *str;
+    uint32_t len = *length;
+
+    if ( param->mode == 1 )
+    {
+        char* p = s + len - 1;
+        for ( ; p >= s; --p )
+        {
+            if ( *p == '\t' )
+            {
+                len = (uint32_t)(p - s);
+                break;
+            }
+        }
+    }
+
+    if ( len < 2 )
+    {
+        *length = 0;
+        return;
+    }
+
+    *str = s + 2;
+    *length = len - 2;
+}
+
+/**
+ * e.g., `file:line:col:text`, used by LocList as well
+ * mode 0: the whole line
+ * mode 1: the text
+ */
+static void quickFix_getDigest(char** str, uint32_t* length, Parameter* param)
+{
+    if ( param->mode == 0 )
+        return;
+
+    char* s = *str;
+    uint32_t len = *length;
+    uint8_t colon = 0;
+    char* p = s;
+    for ( ; p < s + len; ++p )
+    {
+        if ( *p == ':' )
+        {
+            ++colon;
+            if ( colon == 3 )
+            {
+                *str = p + 1;
+                *length -= (uint32_t)(*str - s);
+                return;
+            }
+        }
+    }
+    /* if there are less than 3 colons, the text is invalid */
+    *length = 0;
+}
+
+/**
+ * e.g., `tagname      file.txt`
+ * mode 0: the whole line
+ * mode 1: the tagname
+ */
+static void help_getDigest(char** str, uint32_t* length, Parameter* param)
+{
+    if ( param->mode == 0 )
+        return;
+
+    char* s = *str;
+    char* end = s + *length;
+    char* p = s;
+    while ( p < end && (*p == ' ' || *p == '\t') )
+        ++p;
+    *str = p;
+    while ( p < end && *p != ' ' && *p != '\t' )
+        ++p;
+    *length = (uint32_t)(p - *str);
+}
+
 /**
- * fuzzyMatchPart(engine, source, pattern, category, param, is_name_only=False, sort_results=True)
+ * fuzzyMatchPart(engine, source, pattern, category, param, is_name_only=False, sort_results=True, corpus=None, offset=0,
+ *                top_k=0, unit=1)
  *
  * `is_name_only` is optional, it defaults to `False`, which indicates using the full path matching algorithm.
  * `sort_results` is optional, it defineds to `True`, which indicates whether to sort the results.
+ * `corpus`, `offset` and `top_k` are optional, see fuzzyMatch().
+ * `unit` is optional, it specifies how many lines of `source` are considered as a unit, e.g., BufTag with
+ *      preview code, only the first line of each unit is matched, the other lines go along with it in the result,
+ *      each of them has the weight of the unit. `top_k` is the number of units in this case.
  *
  * return a tuple, (a list of corresponding weight, a sorted list of items from `source` that match `pattern`).
  */
@@ -2134,11 +3354,23 @@ static PyObject* fuzzyEngine_fuzzyMatchPart(PyObject* self, PyObject* args, PyOb
     uint32_t category;
     uint8_t is_name_only = 0;
     uint8_t sort_results = 1;
-    static char* kwlist[] = {"engine", "source", "pattern", "category", "param", "is_name_only", "sort_results", NULL};
+    PyObject* py_corpus = NULL;
+    uint32_t corpus_offset = 0;
+    uint32_t top_k = 0;
+    uint32_t unit = 1;
+    static char* kwlist[] = {"engine", "source", "pattern", "category", "param", "is_name_only", "sort_results",
+                             "corpus", "offset", "top_k", "unit", NULL};
+
+    if ( !PyArg_ParseTupleAndKeywords(args, kwargs, "OOOIO|bbOIII:fuzzyMatch", kwlist, &py_engine, &py_source,
+                                      &py_patternCtxt, &category, &py_param, &is_name_only, &sort_results,
+                                      &py_corpus, &corpus_offset, &top_k, &unit) )
+        return NULL;
 
-    if ( !PyArg_ParseTupleAndKeywords(args, kwargs, "OOOIO|bb:fuzzyMatch", kwlist, &py_engine, &py_source,
-                                      &py_patternCtxt, &category, &py_param, &is_name_only, &sort_results) )
+    if ( unit == 0 )
+    {
+        PyErr_SetString(PyExc_ValueError, "parameter `unit` must be greater than 0.");
         return NULL;
+    }
 
     FuzzyEngine* pEngine = (FuzzyEngine*)PyCapsule_GetPointer(py_engine, NULL);
     if ( !pEngine )
@@ -2150,12 +3382,17 @@ static PyObject* fuzzyEngine_fuzzyMatchPart(PyObject* self, PyObject* args, PyOb
         return NULL;
     }
 
-    uint32_t source_size = (uint32_t)PyList_Size(py_source);
+    /* the number of units, an incomplete unit at the end is ignored */
+    uint32_t source_size = (uint32_t)PyList_Size(py_source) / unit;
     if ( source_size == 0 )
     {
         return Py_BuildValue("([],[])");
     }
 
+    FeCorpus* pCorpus = NULL;
+    if ( getCorpus(py_corpus, corpus_offset, source_size * unit, &pCorpus) < 0 )
+        return NULL;
+
     pEngine->pPattern_ctxt = (PatternContext*)PyCapsule_GetPointer(py_patternCtxt, NULL);
     if ( !pEngine->pPattern_ctxt )
         return NULL;
@@ -2252,14 +3489,22 @@ static PyObject* fuzzyEngine_fuzzyMatchPart(PyObject* self, PyObject* args, PyOb
         for ( ; j < length; ++j )
         {
             FeString *s = pEngine->source + offset + j;
-            PyObject* item = PyList_GET_ITEM(py_source, offset + j);
-            if ( pyObject_ToStringAndSize(item, &s->str, &s->len) < 0 )
+            if ( pCorpus )
             {
-                free(pEngine->source);
-                free(tasks);
-                free(results);
-                fprintf(stderr, "pyObject_ToStringAndSize error!\n");
-                return NULL;
+                *s = pCorpus->strings[corpus_offset + (offset + j) * unit];
+            }
+            else
+            {
+                PyObject* item = PyList_GET_ITEM(py_source, (offset + j) * unit);
+                if ( pyObject_ToStringAndSize(item, &s->str, &s->len) < 0 )
+                {
+                    free(pEngine->source);
+                    free(tasks);
+                    free(results);
+                    fprintf(stderr, "pyObject_ToStringAndSize error!\n");
+                    return NULL;
+                }
+                s->signature = ~0ULL;
             }
 
             switch ( category )
@@ -2301,13 +3546,40 @@ static PyObject* fuzzyEngine_fuzzyMatchPart(PyObject* self, PyObject* args, PyOb
             case Category_Line:
                 line_getDigest(&s->str, &s->len, (Parameter*)PyCapsule_GetPointer(py_param, NULL));
                 break;
+            case Category_Mru:
+            case Category_Buffer:
+                mru_getDigest(&s->str, &s->len, (Parameter*)PyCapsule_GetPointer(py_param, NULL));
+                break;
+            case Category_Window:
+                window_getDigest(&s->str, &s->len, (Parameter*)PyCapsule_GetPointer(py_param, NULL));
+                break;
+            case Category_BufTag:
+                bufTag_getDigest(&s->str, &s->len, (Parameter*)PyCapsule_GetPointer(py_param, NULL));
+                break;
+            case Category_Function:
+                function_getDigest(&s->str, &s->len, (Parameter*)PyCapsule_GetPointer(py_param, NULL));
+                break;
+            case Category_QuickFix:
+                quickFix_getDigest(&s->str, &s->len, (Parameter*)PyCapsule_GetPointer(py_param, NULL));
+                break;
+            case Category_Help:
+                help_getDigest(&s->str, &s->len, (Parameter*)PyCapsule_GetPointer(py_param, NULL));
+                break;
             }
         }
 
         QUEUE_PUT(pEngine->task_queue, tasks + i);
     }
 
-    QUEUE_JOIN(pEngine->task_queue);    /* blocks until all tasks have finished */
+    QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
+
+    if ( pEngine->aborted )
+    {
+        free(pEngine->source);
+        free(tasks);
+        free(results);
+        Py_RETURN_NONE;
+    }
 
     uint32_t results_count = 0;
     for ( i = 0; i < source_size; ++i )
@@ -2332,9 +3604,22 @@ static PyObject* fuzzyEngine_fuzzyMatchPart(PyObject* self, PyObject* args, PyOb
 
     if ( sort_results )
     {
-        if ( task_count == 1 || results_count < 60000 )
+        if ( top_k > 0 && top_k < results_count )
+        {
+            if ( partialSort(pEngine, tasks, task_count, results, results_count, top_k) < 0 )
+            {
+                free(pEngine->source);
+                free(tasks);
+                free(results);
+                fprintf(stderr, "Out of memory at %s:%d\n", __FILE__, __LINE__);
+                return NULL;
+            }
+        }
+        else if ( task_count == 1 || results_count < 60000 )
         {
+            Py_BEGIN_ALLOW_THREADS
             qsort(results, results_count, sizeof(FeResult), compare);
+            Py_END_ALLOW_THREADS
         }
         else
         {
@@ -2367,7 +3652,7 @@ static PyObject* fuzzyEngine_fuzzyMatchPart(PyObject* self, PyObject* args, PyOb
                 QUEUE_PUT(pEngine->task_queue, tasks + i);
             }
 
-            QUEUE_JOIN(pEngine->task_queue);    /* blocks until all tasks have finished */
+            QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
 
             MergeTaskItem* merge_tasks = NULL;
             merge_tasks = (MergeTaskItem*)malloc(task_count * sizeof(MergeTaskItem));
@@ -2408,7 +3693,7 @@ static PyObject* fuzzyEngine_fuzzyMatchPart(PyObject* self, PyObject* args, PyOb
                     QUEUE_PUT(pEngine->task_queue, merge_tasks + i);
                 }
 
-                QUEUE_JOIN(pEngine->task_queue);    /* blocks until all tasks have finished */
+                QUEUE_JOIN_ALLOW_THREADS(pEngine->task_queue);    /* blocks until all tasks have finished */
 
                 chunk_size <<= 1;
             }
@@ -2418,7 +3703,7 @@ static PyObject* fuzzyEngine_fuzzyMatchPart(PyObject* self, PyObject* args, PyOb
         }
     }
 
-    weight_t* weights = (weight_t*)malloc(results_count * sizeof(weight_t));
+    weight_t* weights = (weight_t*)malloc(results_count * unit * sizeof(weight_t));
     if ( !weights )
     {
         free(pEngine->source);
@@ -2428,8 +3713,20 @@ static PyObject* fuzzyEngine_fuzzyMatchPart(PyObject* self, PyObject* args, PyOb
         return NULL;
     }
 
-    PyObject* text_list = PyList_New(results_count);
-    if ( task_count == 1 || results_count < 40000 )
+    PyObject* text_list = PyList_New(results_count * unit);
+    if ( unit > 1 )
+    {
+        for ( i = 0; i < results_count; ++i )
+        {
+            uint32_t k = 0;
+            for ( ; k < unit; ++k )
+            {
+                weights[i * unit + k] = results[i].weight;
+                PyList_SET_ITEM(text_list, i * unit + k, PySequence_ITEM(py_source, results[i].index * unit + k));
+            }
+        }
+    }
+    else if ( task_count == 1 || results_count < 40000 )
     {
         for ( i = 0; i < results_count; ++i )
         {
@@ -2492,6 +3789,8 @@ static PyMethodDef fuzzyEngine_Methods[] =
 {
     { "createFuzzyEngine", (PyCFunction)fuzzyEngine_createFuzzyEngine, METH_VARARGS | METH_KEYWORDS, "" },
     { "closeFuzzyEngine", (PyCFunction)fuzzyEngine_closeFuzzyEngine, METH_VARARGS, "" },
+    { "abort", (PyCFunction)fuzzyEngine_abort, METH_VARARGS, "" },
+    { "clearAbort", (PyCFunction)fuzzyEngine_clearAbort, METH_VARARGS, "" },
     { "initPattern", (PyCFunction)fuzzyEngine_initPattern, METH_VARARGS, "initialize the pattern." },
     { "fuzzyMatch", (PyCFunction)fuzzyEngine_fuzzyMatch, METH_VARARGS | METH_KEYWORDS, "" },
     { "fuzzyMatchEx", (PyCFunction)fuzzyEngine_fuzzyMatchEx, METH_VARARGS | METH_KEYWORDS, "" },
@@ -2499,9 +3798,15 @@ static PyMethodDef fuzzyEngine_Methods[] =
     { "getHighlights", (PyCFunction)fuzzyEngine_getHighlights, METH_VARARGS | METH_KEYWORDS, "" },
     { "guessMatch", (PyCFunction)fuzzyEngine_guessMatch, METH_VARARGS | METH_KEYWORDS, "" },
     { "merge", (PyCFunction)fuzzyEngine_merge, METH_VARARGS, "" },
+    { "sortRemainder", (PyCFunction)fuzzyEngine_sortRemainder, METH_VARARGS, "" },
+    { "createAccumulator", (PyCFunction)fuzzyEngine_createAccumulator, METH_VARARGS, "" },
+    { "accumulate", (PyCFunction)fuzzyEngine_accumulate, METH_VARARGS, "" },
+    { "sortAccumulator", (PyCFunction)fuzzyEngine_sortAccumulator, METH_VARARGS, "" },
     { "createRgParameter", (PyCFunction)fuzzyEngine_createRgParameter, METH_VARARGS, "" },
     { "createParameter", (PyCFunction)fuzzyEngine_createParameter, METH_VARARGS, "" },
     { "createGtagsParameter", (PyCFunction)fuzzyEngine_createGtagsParameter, METH_VARARGS, "" },
+    { "createCorpus", (PyCFunction)fuzzyEngine_createCorpus, METH_NOARGS, "" },
+    { "appendCorpus", (PyCFunction)fuzzyEngine_appendCorpus, METH_VARARGS | METH_KEYWORDS, "" },
     { NULL, NULL, 0, NULL }
 };
 
@@ -2524,6 +3829,12 @@ PyMODINIT_FUNC PyInit_fuzzyEngine(void)
     if ( !module )
         return NULL;
 
+    if ( PyModule_AddStringConstant(module, "__version__", FUZZY_MATCH_C_VERSION) )
+    {
+        Py_DECREF(module);
+        return NULL;
+    }
+
     if ( PyModule_AddObject(module, "Category_Rg", Py_BuildValue("I", Category_Rg)) )
     {
         Py_DECREF(module);
@@ -2554,6 +3865,48 @@ PyMODINIT_FUNC PyInit_fuzzyEngine(void)
         return NULL;
     }
 
+    if ( PyModule_AddObject(module, "Category_Mru", Py_BuildValue("I", Category_Mru)) )
+    {
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    if ( PyModule_AddObject(module, "Category_Buffer", Py_BuildValue("I", Category_Buffer)) )
+    {
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    if ( PyModule_AddObject(module, "Category_Window", Py_BuildValue("I", Category_Window)) )
+    {
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    if ( PyModule_AddObject(module, "Category_BufTag", Py_BuildValue("I", Category_BufTag)) )
+    {
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    if ( PyModule_AddObject(module, "Category_Function", Py_BuildValue("I", Category_Function)) )
+    {
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    if ( PyModule_AddObject(module, "Category_QuickFix", Py_BuildValue("I", Category_QuickFix)) )
+    {
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    if ( PyModule_AddObject(module, "Category_Help", Py_BuildValue("I", Category_Help)) )
+    {
+        Py_DECREF(module);
+        return NULL;
+    }
+
     return module;
 }
 
@@ -2567,6 +3920,12 @@ PyMODINIT_FUNC initfuzzyEngine(void)
     if ( !module )
         return;
 
+    if ( PyModule_AddStringConstant(module, "__version__", FUZZY_MATCH_C_VERSION) )
+    {
+        Py_DECREF(module);
+        return;
+    }
+
     if ( PyModule_AddObject(module, "Category_Rg", Py_BuildValue("I", Category_Rg)) )
     {
         Py_DECREF(module);
@@ -2597,6 +3956,48 @@ PyMODINIT_FUNC initfuzzyEngine(void)
         return;
     }
 
+    if ( PyModule_AddObject(module, "Category_Mru", Py_BuildValue("I", Category_Mru)) )
+    {
+        Py_DECREF(module);
+        return;
+    }
+
+    if ( PyModule_AddObject(module, "Category_Buffer", Py_BuildValue("I", Category_Buffer)) )
+    {
+        Py_DECREF(module);
+        return;
+    }
+
+    if ( PyModule_AddObject(module, "Category_Window", Py_BuildValue("I", Category_Window)) )
+    {
+        Py_DECREF(module);
+        return;
+    }
+
+    if ( PyModule_AddObject(module, "Category_BufTag", Py_BuildValue("I", Category_BufTag)) )
+    {
+        Py_DECREF(module);
+        return;
+    }
+
+    if ( PyModule_AddObject(module, "Category_Function", Py_BuildValue("I", Category_Function)) )
+    {
+        Py_DECREF(module);
+        return;
+    }
+
+    if ( PyModule_AddObject(module, "Category_QuickFix", Py_BuildValue("I", Category_QuickFix)) )
+    {
+        Py_DECREF(module);
+        return;
+    }
+
+    if ( PyModule_AddObject(module, "Category_Help", Py_BuildValue("I", Category_Help)) )
+    {
+        Py_DECREF(module);
+        return;
+    }
+
 }
 
 #endif
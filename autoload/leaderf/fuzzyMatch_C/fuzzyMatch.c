@@ -132,6 +132,18 @@ static uint8_t MultiplyDeBruijnBitPosition[64] =
 
 #define FM_CTZ(x) MultiplyDeBruijnBitPosition[((uint64_t)((x) & -(int64_t)(x)) * deBruijn) >> 58]
 
+/**
+ * the case of ASCII letters and of the bytes that the non-ASCII characters of the pattern are
+ * converted to, see toWideByte(), so that both are matched by the same smartcase rule.
+ * the other bytes are not converted, so that the result can be compared with a char.
+ */
+#define FM_ISUPPER(c) (((c) >= 'A' && (c) <= 'Z') || ((uint8_t)(c) >= 0x80 && (uint8_t)(c) < 0xC0))
+#define FM_ISLOWER(c) (((c) >= 'a' && (c) <= 'z') || ((uint8_t)(c) >= 0xC0 && (uint8_t)(c) < 0xFF))
+#define FM_TOLOWER(c) ((c) >= 'A' && (c) <= 'Z' ? (char)((c) + 32) \
+                       : (uint8_t)(c) >= 0x80 && (uint8_t)(c) < 0xC0 ? (char)((uint8_t)(c) + 0x40) : (char)(c))
+#define FM_TOUPPER(c) ((c) >= 'a' && (c) <= 'z' ? (char)((c) - 32) \
+                       : (uint8_t)(c) >= 0xC0 && (uint8_t)(c) < 0xFF ? (char)((uint8_t)(c) - 0x40) : (char)(c))
+
 static uint16_t valTable[64] =
 {
     0,   1,   4,   7,   13,  19,  25,  31,
@@ -160,37 +172,266 @@ typedef struct ValueElements
     uint16_t end;
 }ValueElements;
 
-PatternContext* initPattern(const char* pattern, uint16_t pattern_len)
+/**
+ * return a signature of the ASCII characters in `text`, a bit is set for each character(case insensitive),
+ * letters and digits have their own bits, the other characters share the rest 28 bits.
+ * if `text` matches a pattern, all the bits set in the signature of the pattern are set in the
+ * signature of `text`.
+ */
+uint64_t getSignature(const char* text, uint32_t text_len)
 {
-    PatternContext* pPattern_ctxt = (PatternContext*)malloc(sizeof(PatternContext));
-    if ( !pPattern_ctxt )
+    uint64_t signature = 0;
+    uint32_t i;
+    for ( i = 0; i < text_len; ++i )
     {
-        fprintf(stderr, "Out of memory in initPattern()!\n");
-        return NULL;
+        uint8_t c = (uint8_t)text[i];
+        if ( c >= 0x80 )
+            continue;
+        else if ( c >= 'a' && c <= 'z' )
+            signature |= 1ULL << (c - 'a');
+        else if ( c >= 'A' && c <= 'Z' )
+            signature |= 1ULL << (c - 'A');
+        else if ( c >= '0' && c <= '9' )
+            signature |= 1ULL << (c - '0' + 26);
+        else
+            signature |= 1ULL << (c % 28 + 36);
     }
+
+    return signature;
+}
+
+/**
+ * decode the UTF-8 sequence at the beginning of `str`, return its length in bytes.
+ * an invalid byte is decoded as a sequence of length 1.
+ */
+static uint16_t decodeUtf8(const uint8_t* str, uint16_t len, uint32_t* code_point)
+{
+    uint8_t c = str[0];
+    uint16_t n;
+    uint32_t cp;
+    if ( c < 0x80 )
+    {
+        *code_point = c;
+        return 1;
+    }
+    else if ( c >= 0xC2 && c <= 0xDF )
+    {
+        n = 2;
+        cp = c & 0x1F;
+    }
+    else if ( c >= 0xE0 && c <= 0xEF )
+    {
+        n = 3;
+        cp = c & 0x0F;
+    }
+    else if ( c >= 0xF0 && c <= 0xF4 )
+    {
+        n = 4;
+        cp = c & 0x07;
+    }
+    else
+    {
+        *code_point = c;
+        return 1;
+    }
+
+    if ( n > len )
+    {
+        *code_point = c;
+        return 1;
+    }
+
+    uint16_t i;
+    for ( i = 1; i < n; ++i )
+    {
+        if ( (str[i] & 0xC0) != 0x80 )
+        {
+            *code_point = c;
+            return 1;
+        }
+        cp = (cp << 6) | (str[i] & 0x3F);
+    }
+
+    *code_point = cp;
+    return n;
+}
+
+/* convert the uppercase letters of Latin-1, Latin Extended-A, Greek, Cyrillic and fullwidth Latin to lowercase */
+static uint32_t toLowerWide(uint32_t c)
+{
+    if ( (c >= 0xC0 && c <= 0xDE && c != 0xD7)
+         || (c >= 0x391 && c <= 0x3AB && c != 0x3A2)
+         || (c >= 0x410 && c <= 0x42F)
+         || (c >= 0xFF21 && c <= 0xFF3A) )
+        return c + 0x20;
+    else if ( c >= 0x400 && c <= 0x40F )
+        return c + 0x50;
+    else if ( ((c >= 0x100 && c <= 0x137) || (c >= 0x14A && c <= 0x177)) && (c & 1) == 0 )
+        return c + 1;
+    else if ( c >= 0x139 && c <= 0x148 && (c & 1) == 1 )
+        return c + 1;
+    else
+        return c;
+}
+
+/**
+ * convert the non-ASCII character `cp` to a byte, 0xC0 + its index in `wide_chars` if it is in lowercase,
+ * or 0x80 + the index of its lowercase if it is in uppercase, see isupper(). so the bytes are
+ * compared by the same smartcase rule as ASCII letters. return 0xFF if it is not in `wide_chars`.
+ */
+static uint8_t toWideByte(uint32_t cp, const uint32_t* wide_chars, uint8_t wide_char_count)
+{
+    uint32_t lower = toLowerWide(cp);
+    uint8_t k;
+    for ( k = 0; k < wide_char_count; ++k )
+    {
+        if ( wide_chars[k] == lower )
+            return (uint8_t)((lower == cp ? 0xC0 : 0x80) + k);
+    }
+
+    return 0xFF;
+}
+
+/**
+ * convert `text` to a string that contains one byte for each character, ASCII characters are kept,
+ * non-ASCII characters are converted by toWideByte().
+ * if `offsets` is not NULL, offsets[i] is set to the byte offset in `text` of the i-th character and
+ * offsets[return value] is set to `text_len`.
+ * return the length of the converted string.
+ */
+static uint16_t transcode(const char* text, uint16_t text_len, PatternContext* pPattern_ctxt,
+                          char* buffer, uint16_t* offsets)
+{
+    const uint8_t* str = (const uint8_t*)text;
+    uint16_t i = 0;
+    uint16_t n = 0;
+    while ( i < text_len )
+    {
+        if ( offsets )
+            offsets[n] = i;
+
+        if ( str[i] < 0x80 )
+        {
+            buffer[n++] = (char)str[i++];
+            continue;
+        }
+
+        uint32_t cp;
+        i += decodeUtf8(str + i, text_len - i, &cp);
+        buffer[n++] = (char)toWideByte(cp, pPattern_ctxt->wide_chars, pPattern_ctxt->wide_char_count);
+    }
+
+    if ( offsets )
+        offsets[n] = text_len;
+
+    return n;
+}
+
+static void initPatternMask(PatternContext* pPattern_ctxt, const char* pattern, uint16_t pattern_len)
+{
     pPattern_ctxt->pattern = pattern;
     pPattern_ctxt->pattern_len = pattern_len;
+    pPattern_ctxt->signature = getSignature(pattern, pattern_len);
+    pPattern_ctxt->wide_char_count = 0;
+    pPattern_ctxt->chunks = NULL;
+    pPattern_ctxt->chunk_count = 0;
     memset(pPattern_ctxt->pattern_mask, -1, sizeof(pPattern_ctxt->pattern_mask));
 
     uint16_t i;
-    for ( i = 0; i < pattern_len; ++i )
+    /* the bits of pattern_mask are only used for the patterns that are not split */
+    for ( i = 0; i < pattern_len && i < 64; ++i )
     {
         pPattern_ctxt->pattern_mask[(uint8_t)pattern[i]] ^= (1LL << i);
-        if ( islower(pattern[i]) && pPattern_ctxt->pattern_mask[(uint8_t)toupper(pattern[i])] != -1 )
+        if ( FM_ISLOWER(pattern[i]) && pPattern_ctxt->pattern_mask[(uint8_t)FM_TOUPPER(pattern[i])] != -1 )
         {
-            pPattern_ctxt->pattern_mask[(uint8_t)toupper(pattern[i])] ^= (1LL << i);
+            pPattern_ctxt->pattern_mask[(uint8_t)FM_TOUPPER(pattern[i])] ^= (1LL << i);
         }
     }
     pPattern_ctxt->is_lower = 1;
 
     for ( i = 0; i < pattern_len; ++i )
     {
-        if ( isupper(pattern[i]) )
+        if ( FM_ISUPPER(pattern[i]) )
         {
             pPattern_ctxt->is_lower = 0;
             break;
         }
     }
+}
+
+PatternContext* initPattern(const char* pattern, uint16_t pattern_len)
+{
+    /* the converted pattern is never longer than `pattern` */
+    uint16_t max_chunks = 0;
+    if ( pattern_len > MAX_CHUNK_LEN )
+    {
+        max_chunks = (pattern_len + MAX_CHUNK_LEN - 1) / MAX_CHUNK_LEN;
+        if ( max_chunks > MAX_PATTERN_CHUNKS )
+            max_chunks = MAX_PATTERN_CHUNKS;
+    }
+
+    /* the chunks and the converted pattern are stored right after the PatternContext */
+    PatternContext* pPattern_ctxt = (PatternContext*)malloc((1 + max_chunks) * sizeof(PatternContext) + pattern_len + 1);
+    if ( !pPattern_ctxt )
+    {
+        fprintf(stderr, "Out of memory in initPattern()!\n");
+        return NULL;
+    }
+
+    PatternContext* chunks = pPattern_ctxt + 1;
+    char* buffer = (char*)(chunks + max_chunks);
+    uint32_t wide_chars[MAX_WIDE_CHARS];
+    uint8_t wide_char_count = 0;
+    const uint8_t* str = (const uint8_t*)pattern;
+    uint16_t n = 0;
+    uint16_t k = 0;
+    pPattern_ctxt->wide_char_count = 0;
+    while ( k < pattern_len )
+    {
+        if ( str[k] < 0x80 )
+        {
+            buffer[n++] = (char)str[k++];
+            continue;
+        }
+
+        uint32_t cp;
+        k += decodeUtf8(str + k, pattern_len - k, &cp);
+
+        /* if there are too many distinct non-ASCII characters, which rarely happens, it is 0xFF */
+        uint8_t c = toWideByte(cp, wide_chars, wide_char_count);
+        if ( c == 0xFF && wide_char_count < MAX_WIDE_CHARS )
+        {
+            wide_chars[wide_char_count++] = toLowerWide(cp);
+            c = toWideByte(cp, wide_chars, wide_char_count);
+        }
+        buffer[n++] = (char)c;
+    }
+
+    if ( n > MAX_PATTERN_CHUNKS * MAX_CHUNK_LEN )
+    {
+        n = MAX_PATTERN_CHUNKS * MAX_CHUNK_LEN;
+    }
+    buffer[n] = '\0';
+
+    initPatternMask(pPattern_ctxt, buffer, n);
+    pPattern_ctxt->wide_char_count = wide_char_count;
+    memcpy(pPattern_ctxt->wide_chars, wide_chars, wide_char_count * sizeof(uint32_t));
+
+    if ( n > MAX_CHUNK_LEN )
+    {
+        /* split the pattern into chunks of nearly the same length */
+        uint16_t chunk_count = (n + MAX_CHUNK_LEN - 1) / MAX_CHUNK_LEN;
+        uint16_t offset = 0;
+        uint16_t i;
+        for ( i = 0; i < chunk_count; ++i )
+        {
+            uint16_t len = (n - offset) / (chunk_count - i);
+            initPatternMask(chunks + i, buffer + offset, len);
+            offset += len;
+        }
+        pPattern_ctxt->chunks = chunks;
+        pPattern_ctxt->chunk_count = chunk_count;
+    }
 
     return pPattern_ctxt;
 }
@@ -205,7 +446,7 @@ ValueElements* evaluate_nameOnly(TextContext* pText_ctxt,
     uint16_t j = pText_ctxt->offset;
 
     const char* pattern = pPattern_ctxt->pattern;
-    uint16_t base_offset = pattern[k] * col_num;
+    uint16_t base_offset = (uint8_t)pattern[k] * col_num;
     uint64_t x = text_mask[base_offset + (j >> 6)] >> (j & 63);
     uint16_t i = 0;
 
@@ -280,9 +521,9 @@ ValueElements* evaluate_nameOnly(TextContext* pText_ctxt,
          * NOT text = 'xxABCd', pattern = 'abc'; text[i] == 'C'
          * 'Cd' is considered as a word
          */
-        else if ( isupper(text[i-1]) && pattern_mask[(uint8_t)tolower(c)] != -1
+        else if ( isupper(text[i-1]) && pattern_mask[(uint8_t)FM_TOLOWER(c)] != -1
                   && (i+1 == text_len || !islower(text[i+1])) )
-            d = (d << 1) | (pattern_mask[(uint8_t)tolower(c)] >> k);
+            d = (d << 1) | (pattern_mask[(uint8_t)FM_TOLOWER(c)] >> k);
         else
             d = ~0;
 
@@ -408,7 +649,7 @@ ValueElements* evaluate(TextContext* pText_ctxt,
     uint16_t j = pText_ctxt->offset;
 
     const char* pattern = pPattern_ctxt->pattern;
-    uint16_t base_offset = pattern[k] * col_num;
+    uint16_t base_offset = (uint8_t)pattern[k] * col_num;
     uint64_t x = text_mask[base_offset + (j >> 6)] >> (j & 63);
     uint16_t i = 0;
 
@@ -489,10 +730,10 @@ ValueElements* evaluate(TextContext* pText_ctxt,
          * NOT text = 'xxABCd', pattern = 'abc'; text[i] == 'C'
          * 'Cd' is considered as a word
          */
-        /* else if ( isupper(text[i-1]) && pattern_mask[(uint8_t)tolower(c)] != -1 */
+        /* else if ( isupper(text[i-1]) && pattern_mask[(uint8_t)FM_TOLOWER(c)] != -1 */
         /*           && (i+1 == text_len || !islower(text[i+1])) )                 */
-        else if ( pattern_mask[(uint8_t)tolower(c)] != -1 )
-            d = (d << 1) | (pattern_mask[(uint8_t)tolower(c)] >> k);
+        else if ( pattern_mask[(uint8_t)FM_TOLOWER(c)] != -1 )
+            d = (d << 1) | (pattern_mask[(uint8_t)FM_TOLOWER(c)] >> k);
         else
             d = ~0;
 
@@ -619,9 +860,9 @@ ValueElements* evaluate(TextContext* pText_ctxt,
     return val + k;
 }
 
-float getWeight(const char* text, uint16_t text_len,
-                PatternContext* pPattern_ctxt,
-                uint8_t is_name_only)
+static float _getWeight(const char* text, uint16_t text_len,
+                        PatternContext* pPattern_ctxt,
+                        uint8_t is_name_only)
 {
     if ( !text || !pPattern_ctxt )
         return MIN_WEIGHT;
@@ -648,7 +889,7 @@ float getWeight(const char* text, uint16_t text_len,
 
     if ( pattern_len == 1 )
     {
-        if ( isupper(first_char) )
+        if ( FM_ISUPPER(first_char) )
         {
             int16_t first_char_pos = -1;
             int16_t i;
@@ -671,7 +912,7 @@ float getWeight(const char* text, uint16_t text_len,
             int16_t i;
             for ( i = 0; i < text_len; ++i )
             {
-                if ( tolower(text[i]) == first_char )
+                if ( FM_TOLOWER(text[i]) == first_char )
                 {
                     if ( first_char_pos == -1 )
                         first_char_pos = i;
@@ -693,7 +934,7 @@ float getWeight(const char* text, uint16_t text_len,
         int16_t i;
         for ( i = 0; i < text_len; ++i )
         {
-            if ( tolower(text[i]) == first_char )
+            if ( FM_TOLOWER(text[i]) == first_char )
             {
                 first_char_pos = i;
                 break;
@@ -705,7 +946,7 @@ float getWeight(const char* text, uint16_t text_len,
         int16_t last_char_pos = -1;
         for ( i = text_len - 1; i >= first_char_pos; --i )
         {
-            if ( tolower(text[i]) == last_char )
+            if ( FM_TOLOWER(text[i]) == last_char )
             {
                 last_char_pos = i;
                 break;
@@ -725,7 +966,7 @@ float getWeight(const char* text, uint16_t text_len,
         char c;
         for ( i = first_char_pos; i <= last_char_pos; ++i )
         {
-            c = tolower(text[i]);
+            c = FM_TOLOWER(text[i]);
             /* c in pattern */
             if ( pattern_mask[(uint8_t)c] != -1 )
             {
@@ -738,7 +979,7 @@ float getWeight(const char* text, uint16_t text_len,
     else
     {
         int16_t first_char_pos = -1;
-        if ( isupper(first_char) )
+        if ( FM_ISUPPER(first_char) )
         {
             int16_t i;
             for ( i = 0; i < text_len; ++i )
@@ -755,7 +996,7 @@ float getWeight(const char* text, uint16_t text_len,
             int16_t i;
             for ( i = 0; i < text_len; ++i )
             {
-                if ( tolower(text[i]) == first_char )
+                if ( FM_TOLOWER(text[i]) == first_char )
                 {
                     first_char_pos = i;
                     break;
@@ -766,7 +1007,7 @@ float getWeight(const char* text, uint16_t text_len,
             return MIN_WEIGHT;
 
         int16_t last_char_pos = -1;
-        if ( isupper(last_char) )
+        if ( FM_ISUPPER(last_char) )
         {
             int16_t i;
             for ( i = text_len - 1; i >= first_char_pos; --i )
@@ -783,7 +1024,7 @@ float getWeight(const char* text, uint16_t text_len,
             int16_t i;
             for ( i = text_len - 1; i >= first_char_pos; --i )
             {
-                if ( tolower(text[i]) == last_char )
+                if ( FM_TOLOWER(text[i]) == last_char )
                 {
                     last_char_pos = i;
                     break;
@@ -806,14 +1047,14 @@ float getWeight(const char* text, uint16_t text_len,
         for ( i = first_char_pos; i <= last_char_pos; ++i )
         {
             c = text[i];
-            if ( isupper(c) )
+            if ( FM_ISUPPER(c) )
             {
                 /* c in pattern */
                 if ( pattern_mask[(uint8_t)c] != -1 )
                     text_mask[(uint8_t)c * col_num + (i >> 6)] |= 1ULL << (i & 63);
-                if ( pattern_mask[(uint8_t)tolower(c)] != -1 )
-                    text_mask[(uint8_t)tolower(c) * col_num + (i >> 6)] |= 1ULL << (i & 63);
-                if ( j < pattern_len && c == toupper(pattern[j]) )
+                if ( pattern_mask[(uint8_t)FM_TOLOWER(c)] != -1 )
+                    text_mask[(uint8_t)FM_TOLOWER(c) * col_num + (i >> 6)] |= 1ULL << (i & 63);
+                if ( j < pattern_len && c == FM_TOUPPER(pattern[j]) )
                     ++j;
             }
             else
@@ -882,7 +1123,7 @@ HighlightGroup* evaluateHighlights_nameOnly(TextContext* pText_ctxt,
     uint16_t col_num = pText_ctxt->col_num;
 
     const char* pattern = pPattern_ctxt->pattern;
-    uint16_t base_offset = pattern[k] * col_num;
+    uint16_t base_offset = (uint8_t)pattern[k] * col_num;
     uint64_t x = text_mask[base_offset + (j >> 6)] >> (j & 63);
     uint16_t i = 0;
 
@@ -963,9 +1204,9 @@ HighlightGroup* evaluateHighlights_nameOnly(TextContext* pText_ctxt,
          * NOT text = 'xxABCd', pattern = 'abc'; text[i] == 'C'
          * 'Cd' is considered as a word
          */
-        else if ( isupper(text[i-1]) && pattern_mask[(uint8_t)tolower(c)] != -1
+        else if ( isupper(text[i-1]) && pattern_mask[(uint8_t)FM_TOLOWER(c)] != -1
                   && (i+1 == text_len || !islower(text[i+1])) )
-            d = (d << 1) | (pattern_mask[(uint8_t)tolower(c)] >> k);
+            d = (d << 1) | (pattern_mask[(uint8_t)FM_TOLOWER(c)] >> k);
         else
             d = ~0;
 
@@ -1104,7 +1345,7 @@ HighlightGroup* evaluateHighlights(TextContext* pText_ctxt,
     uint16_t col_num = pText_ctxt->col_num;
 
     const char* pattern = pPattern_ctxt->pattern;
-    uint16_t base_offset = pattern[k] * col_num;
+    uint16_t base_offset = (uint8_t)pattern[k] * col_num;
     uint64_t x = text_mask[base_offset + (j >> 6)] >> (j & 63);
     uint16_t i = 0;
 
@@ -1191,10 +1432,10 @@ HighlightGroup* evaluateHighlights(TextContext* pText_ctxt,
          * NOT text = 'xxABCd', pattern = 'abc'; text[i] == 'C'
          * 'Cd' is considered as a word
          */
-        /* else if ( isupper(text[i-1]) && pattern_mask[(uint8_t)tolower(c)] != -1 */
+        /* else if ( isupper(text[i-1]) && pattern_mask[(uint8_t)FM_TOLOWER(c)] != -1 */
         /*           && (i+1 == text_len || !islower(text[i+1])) )                 */
-        else if ( pattern_mask[(uint8_t)tolower(c)] != -1 )
-            d = (d << 1) | (pattern_mask[(uint8_t)tolower(c)] >> k);
+        else if ( pattern_mask[(uint8_t)FM_TOLOWER(c)] != -1 )
+            d = (d << 1) | (pattern_mask[(uint8_t)FM_TOLOWER(c)] >> k);
         else
             d = ~0;
 
@@ -1335,10 +1576,10 @@ HighlightGroup* evaluateHighlights(TextContext* pText_ctxt,
  * is the length of the highlight in bytes.
  * e.g., [ [2,3], [6,2], [10,4], ... ]
  */
-HighlightGroup* getHighlights(const char* text,
-                              uint16_t text_len,
-                              PatternContext* pPattern_ctxt,
-                              uint8_t is_name_only)
+static HighlightGroup* _getHighlights(const char* text,
+                                      uint16_t text_len,
+                                      PatternContext* pPattern_ctxt,
+                                      uint8_t is_name_only)
 {
     if ( !text || !pPattern_ctxt )
         return NULL;
@@ -1359,7 +1600,7 @@ HighlightGroup* getHighlights(const char* text,
 
     if ( pattern_len == 1 )
     {
-        if ( isupper(first_char) )
+        if ( FM_ISUPPER(first_char) )
         {
             int16_t first_char_pos = -1;
             int16_t i;
@@ -1394,7 +1635,7 @@ HighlightGroup* getHighlights(const char* text,
             int16_t i;
             for ( i = 0; i < text_len; ++i )
             {
-                if ( tolower(text[i]) == first_char )
+                if ( FM_TOLOWER(text[i]) == first_char )
                 {
                     if ( first_char_pos == -1 )
                         first_char_pos = i;
@@ -1431,7 +1672,7 @@ HighlightGroup* getHighlights(const char* text,
         int16_t i;
         for ( i = 0; i < text_len; ++i )
         {
-            if ( tolower(text[i]) == first_char )
+            if ( FM_TOLOWER(text[i]) == first_char )
             {
                 first_char_pos = i;
                 break;
@@ -1441,7 +1682,7 @@ HighlightGroup* getHighlights(const char* text,
         int16_t last_char_pos = -1;
         for ( i = text_len - 1; i >= first_char_pos; --i )
         {
-            if ( tolower(text[i]) == last_char )
+            if ( FM_TOLOWER(text[i]) == last_char )
             {
                 last_char_pos = i;
                 break;
@@ -1459,7 +1700,7 @@ HighlightGroup* getHighlights(const char* text,
         char c;
         for ( i = first_char_pos; i <= last_char_pos; ++i )
         {
-            c = tolower(text[i]);
+            c = FM_TOLOWER(text[i]);
             /* c in pattern */
             if ( pattern_mask[(uint8_t)c] != -1 )
                 text_mask[(uint8_t)c * col_num + (i >> 6)] |= 1ULL << (i & 63);
@@ -1468,7 +1709,7 @@ HighlightGroup* getHighlights(const char* text,
     else
     {
         int16_t first_char_pos = -1;
-        if ( isupper(first_char) )
+        if ( FM_ISUPPER(first_char) )
         {
             int16_t i;
             for ( i = 0; i < text_len; ++i )
@@ -1485,7 +1726,7 @@ HighlightGroup* getHighlights(const char* text,
             int16_t i;
             for ( i = 0; i < text_len; ++i )
             {
-                if ( tolower(text[i]) == first_char )
+                if ( FM_TOLOWER(text[i]) == first_char )
                 {
                     first_char_pos = i;
                     break;
@@ -1494,7 +1735,7 @@ HighlightGroup* getHighlights(const char* text,
         }
 
         int16_t last_char_pos = -1;
-        if ( isupper(last_char) )
+        if ( FM_ISUPPER(last_char) )
         {
             int16_t i;
             for ( i = text_len - 1; i >= first_char_pos; --i )
@@ -1511,7 +1752,7 @@ HighlightGroup* getHighlights(const char* text,
             int16_t i;
             for ( i = text_len - 1; i >= first_char_pos; --i )
             {
-                if ( tolower(text[i]) == last_char )
+                if ( FM_TOLOWER(text[i]) == last_char )
                 {
                     last_char_pos = i;
                     break;
@@ -1533,13 +1774,13 @@ HighlightGroup* getHighlights(const char* text,
         for ( i = first_char_pos; i <= last_char_pos; ++i )
         {
             c = text[i];
-            if ( isupper(c) )
+            if ( FM_ISUPPER(c) )
             {
                 /* c in pattern */
                 if ( pattern_mask[(uint8_t)c] != -1 )
                     text_mask[(uint8_t)c * col_num + (i >> 6)] |= 1ULL << (i & 63);
-                if ( pattern_mask[(uint8_t)tolower(c)] != -1 )
-                    text_mask[(uint8_t)tolower(c) * col_num + (i >> 6)] |= 1ULL << (i & 63);
+                if ( pattern_mask[(uint8_t)FM_TOLOWER(c)] != -1 )
+                    text_mask[(uint8_t)FM_TOLOWER(c) * col_num + (i >> 6)] |= 1ULL << (i & 63);
             }
             else
             {
@@ -1590,6 +1831,250 @@ HighlightGroup* getHighlights(const char* text,
  * `basename` is "example.tar.gz"
  * `filename` is "example.tar", `suffix` is ".gz"
  */
+/* whether character `t` of a text matches character `p` of a pattern */
+#define FM_MATCH_CHAR(t, p) ((t) == (p) || (FM_ISLOWER(p) && FM_TOLOWER(t) == (p)))
+
+/**
+ * compute the latest position at which each chunk of a long pattern can start to match `text`,
+ * so that the rest of the pattern can still be matched after it.
+ * return 0 if `text` does not match the pattern, otherwise return 1.
+ */
+static uint8_t getChunkLimits(const char* text, uint16_t text_len, PatternContext* pPattern_ctxt, uint16_t limits[])
+{
+    int32_t pos = text_len;
+    int32_t i;
+    for ( i = pPattern_ctxt->chunk_count - 1; i >= 0; --i )
+    {
+        PatternContext* pChunk = pPattern_ctxt->chunks + i;
+        int32_t k;
+        for ( k = pChunk->pattern_len - 1; k >= 0; --k )
+        {
+            char p = pChunk->pattern[k];
+            do
+            {
+                --pos;
+            }
+            while ( pos >= 0 && !FM_MATCH_CHAR(text[pos], p) );
+
+            if ( pos < 0 )
+                return 0;
+        }
+        limits[i] = (uint16_t)pos;
+    }
+
+    return 1;
+}
+
+/**
+ * each chunk is matched in the part of `text` between the end of the match of the previous chunk
+ * and the latest position that the next chunk can start at, so a chunk never takes away the
+ * characters that the following chunks need.
+ * if `pGroup` is not NULL, the highlights are stored in it, it must have room for pattern_len
+ * positions, see getHighlightsOf().
+ */
+static float matchChunks(const char* text, uint16_t text_len, PatternContext* pPattern_ctxt,
+                         uint8_t is_name_only, HighlightGroup* pGroup)
+{
+    /* maximum number of int16_t is (1 << 15) - 1 */
+    if ( text_len >= (1 << 15) )
+    {
+        text_len = (1 << 15) - 1;
+    }
+
+    uint16_t limits[MAX_PATTERN_CHUNKS];
+    if ( !getChunkLimits(text, text_len, pPattern_ctxt, limits) )
+        return MIN_WEIGHT;
+
+    uint16_t chunk_count = pPattern_ctxt->chunk_count;
+    uint16_t start = 0;
+    float weight = 0;
+    uint16_t i;
+    for ( i = 0; i < chunk_count; ++i )
+    {
+        PatternContext* pChunk = pPattern_ctxt->chunks + i;
+        uint16_t end = i + 1 < chunk_count ? limits[i + 1] : text_len;
+        float w = _getWeight(text + start, end - start, pChunk, is_name_only);
+        if ( w == MIN_WEIGHT )
+            return MIN_WEIGHT;
+
+        weight += w;
+
+        if ( i + 1 == chunk_count && !pGroup )
+            break;
+
+        HighlightGroup* pChunkGroup = _getHighlights(text + start, end - start, pChunk, is_name_only);
+        if ( !pChunkGroup )
+            return MIN_WEIGHT;
+
+        uint16_t match_end = 0;
+        uint16_t j;
+        for ( j = 0; j < pChunkGroup->end_index; ++j )
+        {
+            HighlightPos* pos = pChunkGroup->positions + j;
+            uint16_t col = start + pos->col;
+            if ( col - 1 + pos->len > match_end )
+                match_end = col - 1 + pos->len;
+
+            if ( !pGroup )
+                continue;
+
+            if ( pGroup->end_index > 0 )
+            {
+                HighlightPos* last = pGroup->positions + pGroup->end_index - 1;
+                if ( last->col + last->len == col )
+                {
+                    last->len += pos->len;
+                    continue;
+                }
+            }
+
+            /* each character of the pattern takes at most one position */
+            pGroup->positions[pGroup->end_index].col = col;
+            pGroup->positions[pGroup->end_index].len = pos->len;
+            ++pGroup->end_index;
+        }
+        free(pChunkGroup);
+
+        start = match_end;
+    }
+
+    return weight;
+}
+
+static float getWeightOf(const char* text, uint16_t text_len, PatternContext* pPattern_ctxt, uint8_t is_name_only)
+{
+    if ( pPattern_ctxt->chunk_count > 0 )
+        return matchChunks(text, text_len, pPattern_ctxt, is_name_only, NULL);
+    else
+        return _getWeight(text, text_len, pPattern_ctxt, is_name_only);
+}
+
+static HighlightGroup* getHighlightsOf(const char* text, uint16_t text_len,
+                                       PatternContext* pPattern_ctxt, uint8_t is_name_only)
+{
+    if ( pPattern_ctxt->chunk_count == 0 )
+        return _getHighlights(text, text_len, pPattern_ctxt, is_name_only);
+
+    /* the positions of all the chunks are kept in one group, they are at most pattern_len */
+    size_t capacity = sizeof(((HighlightGroup*)0)->positions)/sizeof(HighlightPos);
+    size_t size = sizeof(HighlightGroup);
+    if ( pPattern_ctxt->pattern_len > capacity )
+        size += (pPattern_ctxt->pattern_len - capacity) * sizeof(HighlightPos);
+
+    HighlightGroup* pGroup = (HighlightGroup*)malloc(size);
+    if ( !pGroup )
+    {
+        fprintf(stderr, "Out of memory in getHighlights()!\n");
+        return NULL;
+    }
+    pGroup->end_index = 0;
+
+    pGroup->score = matchChunks(text, text_len, pPattern_ctxt, is_name_only, pGroup);
+    if ( pGroup->score == MIN_WEIGHT || pGroup->end_index == 0 )
+    {
+        free(pGroup);
+        return NULL;
+    }
+
+    HighlightPos* last = pGroup->positions + pGroup->end_index - 1;
+    pGroup->beg = pGroup->positions[0].col - 1;
+    pGroup->end = last->col - 1 + last->len;
+
+    return pGroup;
+}
+
+/* the buffer on the stack is used to convert texts that are not longer than this */
+#define WIDE_BUFFER_SIZE 1024
+
+/* return 1 if `text` contains non-ASCII characters */
+static uint8_t hasWideChar(const char* text, uint16_t text_len)
+{
+    uint16_t i;
+    for ( i = 0; i < text_len; ++i )
+    {
+        if ( (uint8_t)text[i] >= 0x80 )
+            return 1;
+    }
+
+    return 0;
+}
+
+float getWeight(const char* text, uint16_t text_len,
+                PatternContext* pPattern_ctxt,
+                uint8_t is_name_only)
+{
+    if ( !text || !pPattern_ctxt )
+        return MIN_WEIGHT;
+
+    if ( pPattern_ctxt->wide_char_count == 0 )
+        return getWeightOf(text, text_len, pPattern_ctxt, is_name_only);
+
+    if ( !hasWideChar(text, text_len) )
+        return MIN_WEIGHT;
+
+    char buf[WIDE_BUFFER_SIZE];
+    char* buffer = buf;
+    if ( text_len > WIDE_BUFFER_SIZE )
+    {
+        buffer = (char*)malloc(text_len);
+        if ( !buffer )
+        {
+            fprintf(stderr, "Out of memory in getWeight()!\n");
+            return MIN_WEIGHT;
+        }
+    }
+
+    uint16_t len = transcode(text, text_len, pPattern_ctxt, buffer, NULL);
+    float weight = getWeightOf(buffer, len, pPattern_ctxt, is_name_only);
+
+    if ( buffer != buf )
+        free(buffer);
+
+    return weight;
+}
+
+/**
+ * the highlights are computed on the converted text, the positions of them are
+ * converted to the byte offsets in `text`.
+ */
+HighlightGroup* getHighlights(const char* text,
+                              uint16_t text_len,
+                              PatternContext* pPattern_ctxt,
+                              uint8_t is_name_only)
+{
+    if ( !text || !pPattern_ctxt )
+        return NULL;
+
+    if ( pPattern_ctxt->wide_char_count == 0 )
+        return getHighlightsOf(text, text_len, pPattern_ctxt, is_name_only);
+
+    uint16_t* offsets = (uint16_t*)malloc((text_len + 1) * sizeof(uint16_t) + text_len);
+    if ( !offsets )
+    {
+        fprintf(stderr, "Out of memory in getHighlights()!\n");
+        return NULL;
+    }
+    char* buffer = (char*)(offsets + text_len + 1);
+
+    uint16_t len = transcode(text, text_len, pPattern_ctxt, buffer, offsets);
+    HighlightGroup* pGroup = getHighlightsOf(buffer, len, pPattern_ctxt, is_name_only);
+    if ( pGroup )
+    {
+        uint16_t i;
+        for ( i = 0; i < pGroup->end_index; ++i )
+        {
+            uint16_t beg = offsets[pGroup->positions[i].col - 1];
+            uint16_t end = offsets[pGroup->positions[i].col - 1 + pGroup->positions[i].len];
+            pGroup->positions[i].col = beg + 1;
+            pGroup->positions[i].len = end - beg;
+        }
+    }
+
+    free(offsets);
+
+    return pGroup;
+}
+
 uint32_t getPathWeight(const char* filename,
                        const char* suffix,
                        const char* dirname,
@@ -1855,6 +2340,12 @@ PyMODINIT_FUNC PyInit_fuzzyMatchC(void)
     if ( !module )
         return NULL;
 
+    if ( PyModule_AddStringConstant(module, "__version__", FUZZY_MATCH_C_VERSION) )
+    {
+        Py_DECREF(module);
+        return NULL;
+    }
+
     if ( PyModule_AddObject(module, "MIN_WEIGHT", Py_BuildValue("f", (float)MIN_WEIGHT)) )
     {
         Py_DECREF(module);
@@ -1873,6 +2364,12 @@ PyMODINIT_FUNC initfuzzyMatchC(void)
     if ( !module )
         return;
 
+    if ( PyModule_AddStringConstant(module, "__version__", FUZZY_MATCH_C_VERSION) )
+    {
+        Py_DECREF(module);
+        return;
+    }
+
     if ( PyModule_AddObject(module, "MIN_WEIGHT", Py_BuildValue("f", (float)MIN_WEIGHT)) )
     {
         Py_DECREF(module);
@@ -21,12 +21,38 @@
 
 #define MIN_WEIGHT (-10000.0f)
 
+/**
+ * the version of fuzzyEngine and fuzzyMatchC, i.e., their `__version__`, it is the same as
+ * the version in setup.py. LeaderF does not use a build of another version, see manager.py.
+ */
+#define FUZZY_MATCH_C_VERSION "2.2"
+
+/**
+ * byte 0xC0 + i represents the i-th non-ASCII character of the pattern in lowercase, byte 0x80 + i
+ * represents its uppercase, 0xFF represents the others, see transcode() in fuzzyMatch.c.
+ */
+#define MAX_WIDE_CHARS 63
+
+/**
+ * a pattern longer than MAX_CHUNK_LEN is split into at most MAX_PATTERN_CHUNKS chunks,
+ * the characters after them are ignored.
+ */
+#define MAX_CHUNK_LEN 60
+#define MAX_PATTERN_CHUNKS 64
+
 typedef struct PatternContext
 {
     const char* pattern;
     int64_t pattern_mask[256];
+    uint64_t signature;
     uint16_t pattern_len;
     uint8_t is_lower;
+    /* number of distinct non-ASCII characters in the pattern, in lowercase */
+    uint8_t wide_char_count;
+    uint32_t wide_chars[MAX_WIDE_CHARS];
+    /* the chunks of a long pattern, which are matched one after another */
+    struct PatternContext* chunks;
+    uint16_t chunk_count;
 }PatternContext;
 
 typedef struct HighlightPos
@@ -40,8 +66,9 @@ typedef struct HighlightGroup
     float score;
     uint16_t beg;
     uint16_t end;
-    HighlightPos positions[64];
     uint16_t end_index;
+    /* it is the last member, the group of a long pattern is allocated with more positions */
+    HighlightPos positions[64];
 }HighlightGroup;
 
 #ifdef __cplusplus
@@ -50,6 +77,8 @@ extern "C" {
 
 PatternContext* initPattern(const char* pattern, uint16_t pattern_len);
 
+uint64_t getSignature(const char* text, uint32_t text_len);
+
 float getWeight(const char* text, uint16_t text_len, PatternContext* pPattern_ctxt, uint8_t is_name_only);
 
 HighlightGroup* getHighlights(const char* text, uint16_t text_len, PatternContext* pPattern_ctxt, uint8_t is_name_only);
@@ -30,8 +30,9 @@ module2 = Extension("fuzzyEngine",
                     sources = ["fuzzyMatch.c", "fuzzyEngine.c"])
 
 
+# it must be the same as FUZZY_MATCH_C_VERSION in fuzzyMatch.h
 setup(name = "fuzzyEngine",
-      version = "2.0",
+      version = "2.2",
       description = "fuzzy match algorithm written in C.",
       author = "Yggdroot",
       author_email = "archofortune@gmail.com",
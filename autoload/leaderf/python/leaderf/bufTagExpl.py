@@ -398,6 +398,15 @@ class BufTagExplManager(Manager):
 
     def _regexFilter(self, iterable):
         if self._supports_preview:
+            search = self._getRegexMatcher()
+            if search is not None:
+                result = []
+                for i, line in enumerate(iterable[::2]):
+                    if search(self._getDigest(line, 1).strip()):
+                        result.append(line)
+                        result.append(iterable[2*i+1])
+                return result
+
             try:
                 if ('-2' == lfEval("g:LfNoErrMsgMatch('', '%s')" % escQuote(self._cli.pattern))):
                     return iter([])
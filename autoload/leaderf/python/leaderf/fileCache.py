@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import sys
+import json
+import time
+import mmap
+import locale
+from .utils import *
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+
+#*****************************************************
+# FileCache
+#*****************************************************
+class FileCache(object):
+    """
+    the cache of the file lists of the directories, each list is kept in a file
+    of `cache_dir`, and a sqlite database indexes them by the directory, so that
+    looking up a directory does not read or rewrite an index file.
+    at most g:Lf_NumberOfCache lists are kept, the least recently used ones are
+    removed first. nothing is cached if sqlite3 is not available.
+    """
+    def __init__(self, cache_dir):
+        self._cache_dir = cache_dir
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(os.path.join(self._cache_dir, 'cacheIndex.db'),
+                                         check_same_thread=False)
+            if sys.version_info < (3, 0):
+                self._conn.text_factory = str
+            with self._conn:
+                self._conn.execute("CREATE TABLE IF NOT EXISTS caches ("
+                                   "dir TEXT PRIMARY KEY, name TEXT NOT NULL, last_used REAL NOT NULL)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS caches_last_used ON caches (last_used)")
+            self._importIndex()
+
+        return self._conn
+
+    def _importIndex(self):
+        """
+        import the entries of the text index used by the older versions.
+        """
+        index = os.path.join(self._cache_dir, 'cacheIndex')
+        if not os.path.exists(index):
+            return
+
+        try:
+            with lfOpen(index, 'r', errors='ignore') as f:
+                # e.g., line = "1496669495.329 cache_1496669495.329 /foo/bar/"
+                entries = [line.split(None, 2) for line in f]
+            with self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO caches (last_used, name, dir) VALUES (?, ?, ?)",
+                                       [(float(e[0]), e[1], e[2].strip()) for e in entries if len(e) == 3])
+            os.remove(index)
+        except (IOError, OSError, ValueError):
+            pass
+
+    def _getFile(self, name):
+        return os.path.join(self._cache_dir, name)
+
+    def lookup(self, dir, prefix=False):
+        """
+        return (path, file), `file` is the file that keeps the file list of `path`.
+        `path` is `dir` if `prefix` is False, otherwise it is the nearest ancestor of
+        `dir`, including `dir` itself, that is cached.
+        return None if it is not cached.
+        `dir` ends with os.sep.
+        """
+        if sqlite3 is None:
+            return None
+
+        try:
+            conn = self._connect()
+            if prefix:
+                # only the ancestors of `dir` are looked up by the primary key
+                candidates = []
+                i = dir.find(os.sep)
+                while i >= 0:
+                    candidates.append(dir[:i+1])
+                    i = dir.find(os.sep, i + 1)
+                row = conn.execute("SELECT dir, name FROM caches WHERE dir IN (%s) "
+                                   "ORDER BY length(dir) DESC LIMIT 1" % ','.join('?' * len(candidates)),
+                                   candidates).fetchone()
+            else:
+                row = conn.execute("SELECT dir, name FROM caches WHERE dir = ?", (dir,)).fetchone()
+
+            if row is None:
+                return None
+
+            with conn:
+                conn.execute("UPDATE caches SET last_used = ? WHERE dir = ?", (time.time(), row[0]))
+            return (row[0], self._getFile(row[1]))
+        except sqlite3.Error:
+            return None
+
+    def _writeFile(self, file, write):
+        # write to a temporary file first, so that the file is never half written
+        tmp_file = file + '.tmp%d' % os.getpid()
+        with lfOpen(tmp_file, 'w', errors='ignore') as f:
+            write(f)
+        if hasattr(os, 'replace'):
+            os.replace(tmp_file, file)
+        else:
+            if os.path.exists(file):
+                os.remove(file)
+            os.rename(tmp_file, file)
+
+    def store(self, dir, lines, mtimes=None):
+        """
+        keep `lines`, the file list of `dir`, and `mtimes`, the mtimes of the
+        directories listed, see FileIndexer.getMtimes().
+        """
+        if sqlite3 is None:
+            return
+
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT name FROM caches WHERE dir = ?", (dir,)).fetchone()
+            now = time.time()
+            name = row[0] if row else 'cache_%.3f' % now
+
+            cache_file = self._getFile(name)
+            self._writeFile(cache_file, lambda f: f.writelines(line + '\n' for line in lines))
+            if mtimes is None:
+                self._removeFile(name + '.mtimes')
+            else:
+                self._writeFile(cache_file + '.mtimes', lambda f: json.dump(mtimes, f))
+
+            limit = int(lfEval("g:Lf_NumberOfCache"))
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO caches (dir, name, last_used) VALUES (?, ?, ?)",
+                             (dir, name, now))
+                evicted = conn.execute("SELECT dir, name FROM caches ORDER BY last_used DESC "
+                                       "LIMIT -1 OFFSET ?", (max(limit, 1),)).fetchall()
+                conn.executemany("DELETE FROM caches WHERE dir = ?", [(e[0],) for e in evicted])
+
+            for _, name in evicted:
+                self._removeFile(name)
+        except (sqlite3.Error, IOError, OSError):
+            pass
+
+    def remove(self, dir):
+        if sqlite3 is None:
+            return
+
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT name FROM caches WHERE dir = ?", (dir,)).fetchone()
+            if row is None:
+                return
+
+            with conn:
+                conn.execute("DELETE FROM caches WHERE dir = ?", (dir,))
+            self._removeFile(row[0])
+        except sqlite3.Error:
+            pass
+
+    def readLines(self, file, dir=None, relative=False):
+        """
+        return the file list kept in `file`, the lines are as they are kept if `dir` is None,
+        otherwise they are relative to `dir` if `relative` is True, or absolute paths if not.
+        the text is decoded straight from the memory map of `file`, the paths are converted
+        on the whole text and it is split only once, so only one list of lines is built.
+        return None if `file` is removed or can not be read.
+        """
+        try:
+            with open(file, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # an empty file can not be mapped
+            return []
+        except (IOError, OSError):
+            return None
+
+        try:
+            if sys.version_info >= (3, 0):
+                # the same encoding as lfOpen() writes it with
+                text = str(data, locale.getpreferredencoding(False), 'ignore')
+            else:
+                text = data[:]
+        finally:
+            data.close()
+
+        if dir is None:
+            return text.splitlines()
+
+        prefix = dir if dir.endswith(os.sep) else dir + os.sep
+        i = text.find('\n')
+        if os.path.isabs(text if i < 0 else text[:i]) != relative:
+            return text.splitlines()
+
+        if relative and '\r' not in text:
+            # all the lines start with `prefix`, so splitting the text by it strips them at once
+            lines = ('\n' + text).split('\n' + prefix)
+            del lines[0]
+            if lines:
+                lines[-1] = lines[-1].rstrip('\n')
+            # a line that does not start with `prefix` is joined to the previous one
+            if len(lines) == text.count('\n') + (0 if text.endswith('\n') else 1):
+                return lines
+
+            prefix_len = len(prefix)
+            return [line[prefix_len:] if line.startswith(prefix) else line for line in text.splitlines()]
+
+        # e.g., "\n/foo/bar/baz.c" <=> "\nbaz.c" if `dir` is "/foo/bar/"
+        old, new = (prefix, '') if relative else ('', prefix)
+        lines = ('\n' + text).replace('\n' + old, '\n' + new).splitlines()
+        del lines[0]
+        if new and lines and lines[-1] == new:  # the newline at the end of the text
+            lines.pop()
+        return lines
+
+    def loadMtimes(self, file):
+        """
+        return the mtimes kept with the file list in `file`, or None.
+        """
+        try:
+            with lfOpen(file + '.mtimes', 'r', errors='ignore') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _removeFile(self, name):
+        for file in (self._getFile(name), self._getFile(name) + '.mtimes'):
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+
+
+#  vim: set ts=4 sw=4 tw=0 et :
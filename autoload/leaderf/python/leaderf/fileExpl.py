@@ -13,6 +13,9 @@ from .utils import *
 from .explorer import *
 from .manager import *
 from .asyncExecutor import AsyncExecutor
+from .fileIndexer import FileIndexer
+from .fileCache import FileCache
+from .fileWatcher import fileWatcher
 from .devicons import (
     webDevIconsGetFileTypeSymbol,
     removeDevIcons,
@@ -61,8 +64,8 @@ class FileExplorer(Explorer):
                                        '.LfCache',
                                        'python' + lfEval("g:Lf_PythonVersion"),
                                        'file')
-        self._cache_index = os.path.join(self._cache_dir, 'cacheIndex')
         self._external_cmd = None
+        self._indexer = None
         self._initCache()
         self._executor = []
         self._no_ignore = None
@@ -71,9 +74,7 @@ class FileExplorer(Explorer):
     def _initCache(self):
         if not os.path.exists(self._cache_dir):
             os.makedirs(self._cache_dir)
-        if not os.path.exists(self._cache_index):
-            with lfOpen(self._cache_index, 'w', errors='ignore'):
-                pass
+        self._file_cache = FileCache(self._cache_dir)
 
     def _getFiles(self, dir):
         start_time = time.time()
@@ -96,73 +97,27 @@ class FileExplorer(Explorer):
     @showRelativePath
     def _getFileList(self, dir):
         dir = dir if dir.endswith(os.sep) else dir + os.sep
-        with lfOpen(self._cache_index, 'r+', errors='ignore') as f:
-            lines = f.readlines()
-            path_length = 0
-            target = -1
-            for i, line in enumerate(lines):
-                path = line.split(None, 2)[2].strip()
-                if dir.startswith(path) and len(path) > path_length:
-                    path_length = len(path)
-                    target = i
-
-            if target != -1:
-                lines[target] = re.sub('^\S*',
-                                       '%.3f' % time.time(),
-                                       lines[target])
-                f.seek(0)
-                f.truncate(0)
-                f.writelines(lines)
-                with lfOpen(os.path.join(self._cache_dir,
-                                         lines[target].split(None, 2)[1]),
-                            'r', errors='ignore') as cache_file:
-                    if lines[target].split(None, 2)[2].strip() == dir:
-                        return cache_file.readlines()
-                    else:
-                        file_list = [line for line in cache_file.readlines()
-                                     if line.startswith(dir)]
-                        if file_list == []:
-                            file_list = self._getFiles(dir)
-                        return file_list
+        cache = self._file_cache.lookup(dir, prefix=True)
+        if cache is not None:
+            path, cache_file = cache
+            file_list = self._file_cache.readLines(cache_file)
+            if file_list is None:   # the file of the cache is removed, index the files again
+                self._file_cache.remove(path)
+            elif path == dir:
+                return file_list
             else:
-                start_time = time.time()
-                file_list = self._getFiles(dir)
-                delta_seconds = time.time() - start_time
-                if delta_seconds > float(lfEval("g:Lf_NeedCacheTime")):
-                    cache_file_name = ''
-                    if len(lines) < int(lfEval("g:Lf_NumberOfCache")):
-                        f.seek(0, 2)
-                        ts = time.time()
-                        line = '%.3f cache_%.3f %s\n' % (ts, ts, dir)
-                        f.write(line)
-                        cache_file_name = 'cache_%.3f' % ts
-                    else:
-                        for i, line in enumerate(lines):
-                            path = line.split(None, 2)[2].strip()
-                            if path.startswith(dir):
-                                cache_file_name = line.split(None, 2)[1].strip()
-                                line = '%.3f %s %s\n' % (time.time(),
-                                        cache_file_name, dir)
-                                break
-                        if cache_file_name == '':
-                            timestamp = lines[0].split(None, 2)[0]
-                            oldest = 0
-                            for i, line in enumerate(lines):
-                                if line.split(None, 2)[0] < timestamp:
-                                    timestamp = line.split(None, 2)[0]
-                                    oldest = i
-                            cache_file_name = lines[oldest].split(None, 2)[1].strip()
-                            lines[oldest] = '%.3f %s %s\n' % (time.time(),
-                                            cache_file_name, dir)
-                        f.seek(0)
-                        f.truncate(0)
-                        f.writelines(lines)
-                    with lfOpen(os.path.join(self._cache_dir, cache_file_name),
-                                'w', errors='ignore') as cache_file:
-                        for line in file_list:
-                            cache_file.write(line + '\n')
+                file_list = [line for line in file_list if line.startswith(dir)]
+                if file_list == []:
+                    file_list = self._getFiles(dir)
                 return file_list
 
+        start_time = time.time()
+        file_list = self._getFiles(dir)
+        delta_seconds = time.time() - start_time
+        if delta_seconds > float(lfEval("g:Lf_NeedCacheTime")):
+            self._file_cache.store(dir, file_list)
+        return file_list
+
     @showDevIcons
     def _readFromFileList(self, files):
         result = []
@@ -174,27 +129,9 @@ class FileExplorer(Explorer):
     def _refresh(self):
         dir = os.path.abspath(self._cur_dir)
         dir = dir if dir.endswith(os.sep) else dir + os.sep
-        with lfOpen(self._cache_index, 'r+', errors='ignore') as f:
-            lines = f.readlines()
-            path_length = 0
-            target = -1
-            for i, line in enumerate(lines):
-                path = line.split(None, 2)[2].strip()
-                if dir.startswith(path) and len(path) > path_length:
-                    path_length = len(path)
-                    target = i
-
-            if target != -1:
-                lines[target] = re.sub('^\S*', '%.3f' % time.time(), lines[target])
-                f.seek(0)
-                f.truncate(0)
-                f.writelines(lines)
-                cache_file_name = lines[target].split(None, 2)[1]
-                file_list = self._getFiles(dir)
-                with lfOpen(os.path.join(self._cache_dir, cache_file_name),
-                            'w', errors='ignore') as cache_file:
-                    for line in file_list:
-                        cache_file.write(line + '\n')
+        cache = self._file_cache.lookup(dir, prefix=True)
+        if cache is not None:
+            self._file_cache.store(cache[0], self._getFiles(cache[0]))
 
     def _exists(self, path, dir):
         """
@@ -236,6 +173,58 @@ class FileExplorer(Explorer):
             else:
                 return glob
 
+    def _getVersionControlTool(self, dir):
+        """
+        return "git" or "hg" if the files of `dir` are listed by it, otherwise return None
+        """
+        if lfEval("g:Lf_UseVersionControlTool") == '1':
+            if self._exists(dir, ".git") and lfEval("executable('git')") == '1':
+                return "git"
+            elif self._exists(dir, ".hg") and lfEval("executable('hg')") == '1':
+                return "hg"
+
+        return None
+
+    def _getExternalTool(self):
+        """
+        return "rg", "pt", "ag" or "find" if the files are listed by it when no
+        version control tool is used, otherwise return None
+        """
+        if lfEval("exists('g:Lf_DefaultExternalTool')") == '1':
+            default_tool = {"rg": 0, "pt": 0, "ag": 0, "find": 0}
+            tool = lfEval("g:Lf_DefaultExternalTool")
+            if tool and lfEval("executable('%s')" % tool) == '0':
+                raise Exception("executable '%s' can not be found!" % tool)
+            default_tool[tool] = 1
+        else:
+            default_tool = {"rg": 1, "pt": 1, "ag": 1, "find": 1}
+
+        if default_tool["rg"] and lfEval("executable('rg')") == '1':
+            return "rg"
+        elif default_tool["pt"] and lfEval("executable('pt')") == '1' and os.name != 'nt': # there is bug on Windows
+            return "pt"
+        elif default_tool["ag"] and lfEval("executable('ag')") == '1' and os.name != 'nt': # https://github.com/vim/vim/issues/3236
+            return "ag"
+        elif default_tool["find"] and lfEval("executable('find')") == '1' \
+                and lfEval("executable('sed')") == '1' and os.name != 'nt':
+            return "find"
+        else:
+            return None
+
+    def _isWatchable(self, dir, **kwargs):
+        """
+        return True if the file watcher lists the same files of `dir` as _buildCmd()
+        does, that is, the files are listed by FileIndexer or find, or by rg, pt or ag
+        with --no-ignore, none of which uses the ignore files of git or hg then.
+        """
+        if not fileWatcher.isEnabled() or lfEval("exists('g:Lf_ExternalCommand')") == '1':
+            return False
+
+        if self._getVersionControlTool(dir) is not None:
+            return False
+
+        return self._getExternalTool() in (None, "find") or "--no-ignore" in kwargs.get("arguments", {})
+
     def _buildCmd(self, dir, **kwargs):
         if self._cmd_work_dir:
             if os.name == 'nt':
@@ -256,8 +245,9 @@ class FileExplorer(Explorer):
             self._external_cmd = cmd
             return cmd
 
-        if lfEval("g:Lf_UseVersionControlTool") == '1':
-            if self._exists(dir, ".git") and lfEval("executable('git')") == '1':
+        vcs = self._getVersionControlTool(dir)
+        if vcs is not None:
+            if vcs == "git":
                 wildignore = lfEval("g:Lf_WildIgnore")
                 if ".git" in wildignore.get("dir", []):
                     wildignore.get("dir", []).remove(".git")
@@ -285,7 +275,7 @@ class FileExplorer(Explorer):
                     cmd = 'git ls-files %s "%s" && git ls-files --others %s %s "%s"' % (recurse_submodules, dir, no_ignore, ignore, dir)
                 self._external_cmd = cmd
                 return cmd
-            elif self._exists(dir, ".hg") and lfEval("executable('hg')") == '1':
+            else:
                 wildignore = lfEval("g:Lf_WildIgnore")
                 if ".hg" in wildignore.get("dir", []):
                     wildignore.get("dir", []).remove(".hg")
@@ -304,16 +294,8 @@ class FileExplorer(Explorer):
                 self._external_cmd = cmd
                 return cmd
 
-        if lfEval("exists('g:Lf_DefaultExternalTool')") == '1':
-            default_tool = {"rg": 0, "pt": 0, "ag": 0, "find": 0}
-            tool = lfEval("g:Lf_DefaultExternalTool")
-            if tool and lfEval("executable('%s')" % tool) == '0':
-                raise Exception("executable '%s' can not be found!" % tool)
-            default_tool[tool] = 1
-        else:
-            default_tool = {"rg": 1, "pt": 1, "ag": 1, "find": 1}
-
-        if default_tool["rg"] and lfEval("executable('rg')") == '1':
+        tool = self._getExternalTool()
+        if tool == "rg":
             wildignore = lfEval("g:Lf_WildIgnore")
             if os.name == 'nt': # https://github.com/BurntSushi/ripgrep/issues/500
                 color = ""
@@ -358,7 +340,7 @@ class FileExplorer(Explorer):
                 cmd = cd_cmd + 'rg --no-messages --files %s %s %s %s %s' % (color, ignore, followlinks, show_hidden, no_ignore)
             else:
                 cmd = 'rg --no-messages --files %s %s %s %s %s %s' % (color, ignore, followlinks, show_hidden, no_ignore, cur_dir)
-        elif default_tool["pt"] and lfEval("executable('pt')") == '1' and os.name != 'nt': # there is bug on Windows
+        elif tool == "pt":
             wildignore = lfEval("g:Lf_WildIgnore")
             ignore = ""
             for i in wildignore.get("dir", []):
@@ -387,7 +369,7 @@ class FileExplorer(Explorer):
                 cmd = cd_cmd + 'pt --nocolor %s %s %s %s -g=""' % (ignore, followlinks, show_hidden, no_ignore)
             else:
                 cmd = 'pt --nocolor %s %s %s %s -g="" "%s"' % (ignore, followlinks, show_hidden, no_ignore, dir)
-        elif default_tool["ag"] and lfEval("executable('ag')") == '1' and os.name != 'nt': # https://github.com/vim/vim/issues/3236
+        elif tool == "ag":
             wildignore = lfEval("g:Lf_WildIgnore")
             ignore = ""
             for i in wildignore.get("dir", []):
@@ -416,8 +398,7 @@ class FileExplorer(Explorer):
                 cmd = cd_cmd + 'ag --nocolor --silent %s %s %s %s -g ""' % (ignore, followlinks, show_hidden, no_ignore)
             else:
                 cmd = 'ag --nocolor --silent %s %s %s %s -g "" "%s"' % (ignore, followlinks, show_hidden, no_ignore, dir)
-        elif default_tool["find"] and lfEval("executable('find')") == '1' \
-                and lfEval("executable('sed')") == '1' and os.name != 'nt':
+        elif tool == "find":
             wildignore = lfEval("g:Lf_WildIgnore")
             ignore_dir = ""
             for d in wildignore.get("dir", []):
@@ -472,108 +453,89 @@ class FileExplorer(Explorer):
     @removeDevIcons
     def _writeCache(self, content):
         dir = self._cur_dir if self._cur_dir.endswith(os.sep) else self._cur_dir + os.sep
-        with lfOpen(self._cache_index, 'r+', errors='ignore') as f:
-            lines = f.readlines()
-            target = -1
-            for i, line in enumerate(lines):
-                if dir == line.split(None, 2)[2].strip():
-                    target = i
-                    break
-
-            if target != -1:    # already cached
-                if time.time() - self._cmd_start_time <= float(lfEval("g:Lf_NeedCacheTime")):
-                    os.remove(os.path.join(self._cache_dir, lines[target].split(None, 2)[1]))
-                    del lines[target]
-                    f.seek(0)
-                    f.truncate(0)
-                    f.writelines(lines)
-                    return
-
-                # update the time
-                lines[target] = re.sub('^\S*',
-                                       '%.3f' % time.time(),
-                                       lines[target])
-                f.seek(0)
-                f.truncate(0)
-                f.writelines(lines)
-                with lfOpen(os.path.join(self._cache_dir,
-                                         lines[target].split(None, 2)[1]),
-                            'w', errors='ignore') as cache_file:
-                    for line in content:
-                        cache_file.write(line + '\n')
-            else:
-                if time.time() - self._cmd_start_time <= float(lfEval("g:Lf_NeedCacheTime")):
-                    return
-
-                cache_file_name = ''
-                if len(lines) < int(lfEval("g:Lf_NumberOfCache")):
-                    f.seek(0, 2)
-                    ts = time.time()
-                    # e.g., line = "1496669495.329 cache_1496669495.329 /foo/bar"
-                    line = '%.3f cache_%.3f %s\n' % (ts, ts, dir)
-                    f.write(line)
-                    cache_file_name = 'cache_%.3f' % ts
-                else:
-                    timestamp = lines[0].split(None, 2)[0]
-                    oldest = 0
-                    for i, line in enumerate(lines):
-                        if line.split(None, 2)[0] < timestamp:
-                            timestamp = line.split(None, 2)[0]
-                            oldest = i
-                    cache_file_name = lines[oldest].split(None, 2)[1].strip()
-                    lines[oldest] = '%.3f %s %s\n' % (time.time(), cache_file_name, dir)
-
-                    f.seek(0)
-                    f.truncate(0)
-                    f.writelines(lines)
-
-                with lfOpen(os.path.join(self._cache_dir, cache_file_name),
-                            'w', errors='ignore') as cache_file:
-                    for line in content:
-                        cache_file.write(line + '\n')
+        if time.time() - self._cmd_start_time <= float(lfEval("g:Lf_NeedCacheTime")):
+            # it is fast enough without the cache
+            self._file_cache.remove(dir)
+        else:
+            mtimes = self._indexer.getMtimes() if self._indexer else None
+            self._file_cache.store(dir, content, mtimes)
+
+    def _refreshCache(self, indexer):
+        """
+        update the cached file list of self._cur_dir by indexer.refresh(),
+        return None if it is not cached or can not be updated this way.
+        """
+        dir = self._cur_dir if self._cur_dir.endswith(os.sep) else self._cur_dir + os.sep
+        cache = self._file_cache.lookup(dir)
+        if cache is None:
+            return None
+
+        mtimes = self._file_cache.loadMtimes(cache[1])
+        if mtimes is None:
+            return None
+
+        cached_lines = self._file_cache.readLines(cache[1])
+        if cached_lines is None:
+            self._file_cache.remove(dir)
+            return None
+
+        lines = indexer.refresh(cached_lines, mtimes)
+        # the same list is returned if nothing is changed, the cache is kept as it is
+        if lines is not None and lines is not cached_lines:
+            self._file_cache.store(dir, lines, indexer.getMtimes())
+        return lines
+
+    def _getFilesFromWatcher(self, dir):
+        """
+        return the files of `dir` kept by the watcher of its project root,
+        or None if the watcher has not indexed them yet.
+        """
+        dir = os.path.abspath(dir)
+        root = self._nearestAncestor(lfEval("g:Lf_RootMarkers"), dir) or dir
+        files = fileWatcher.watch(root).getFiles()
+        if files is None:
+            return None
+
+        prefix = os.path.join(dir, '')
+        if dir != root:
+            files = [f for f in files if f.startswith(prefix)]
+        if lfEval("g:Lf_ShowRelativePath") == '1':
+            prefix_len = len(prefix)
+            files = [f[prefix_len:] for f in files]
+        max_count = int(lfEval("g:Lf_MaxCount"))
+        if max_count > 0:
+            del files[max_count:]
+        if lfEval("get(g:, 'Lf_ShowDevIcons', 1)") == "1":
+            files = [format_line(f) for f in files]
+        return files
+
+    def watch(self, dir):
+        """
+        start watching the project root of `dir` in the background.
+        """
+        try:
+            if not self._isWatchable(dir):
+                return
+        except Exception:   # g:Lf_DefaultExternalTool is not executable
+            return
+
+        dir = os.path.abspath(dir)
+        fileWatcher.watch(self._nearestAncestor(lfEval("g:Lf_RootMarkers"), dir) or dir)
 
     @showDevIcons
     def _getFilesFromCache(self):
         dir = self._cur_dir if self._cur_dir.endswith(os.sep) else self._cur_dir + os.sep
-        with lfOpen(self._cache_index, 'r+', errors='ignore') as f:
-            lines = f.readlines()
-            target = -1
-            for i, line in enumerate(lines):
-                if dir == line.split(None, 2)[2].strip():
-                    target = i
-                    break
-
-            if target != -1:    # already cached
-                # update the time
-                lines[target] = re.sub('^\S*',
-                                       '%.3f' % time.time(),
-                                       lines[target])
-                f.seek(0)
-                f.truncate(0)
-                f.writelines(lines)
-                with lfOpen(os.path.join(self._cache_dir,
-                                         lines[target].split(None, 2)[1]),
-                            'r', errors='ignore') as cache_file:
-                    file_list = cache_file.readlines()
-                    if not file_list: # empty
-                        return None
-
-                    if lfEval("g:Lf_ShowRelativePath") == '1':
-                        if os.path.isabs(file_list[0]):
-                            # os.path.relpath() is too slow!
-                            cwd_length = len(lfEncode(dir))
-                            if not dir.endswith(os.sep):
-                                cwd_length += 1
-                            return [line[cwd_length:] for line in file_list]
-                        else:
-                            return file_list
-                    else:
-                        if os.path.isabs(file_list[0]):
-                            return file_list
-                        else:
-                            return [os.path.join(lfEncode(dir), file) for file in file_list]
-            else:
-                return None
+        cache = self._file_cache.lookup(dir)
+        if cache is None:
+            return None
+
+        file_list = self._file_cache.readLines(cache[1], lfEncode(dir),
+                                               lfEval("g:Lf_ShowRelativePath") == '1')
+        if file_list is None:
+            self._file_cache.remove(dir)
+            return None
+
+        return file_list if file_list else None
 
     def setContent(self, content):
         self._content = content
@@ -618,12 +580,19 @@ class FileExplorer(Explorer):
             lfCmd("let g:Lf_Debug_Cmd = '%s'" % escQuote(cmd))
 
             lfCmd("let g:Lf_FilesFromCache = 0")
+            if self._isWatchable(dir, **kwargs):
+                content = self._getFilesFromWatcher(dir)
+                if content is not None:
+                    self._content = content
+                    return self._content
+
             if lfEval("g:Lf_UseCache") == '1' and kwargs.get("refresh", False) == False:
                 lfCmd("let g:Lf_FilesFromCache = 1")
                 self._content = self._getFilesFromCache()
                 if self._content:
                     return self._content
 
+            self._indexer = None
             if cmd:
                 executor = AsyncExecutor()
                 self._executor.append(executor)
@@ -636,13 +605,32 @@ class FileExplorer(Explorer):
                         content = executor.execute(cmd, encoding=lfEval("&encoding"))
                 self._cmd_start_time = time.time()
                 return content
+            elif FileIndexer.isAvailable():
+                indexer = FileIndexer()
+                self._indexer = indexer
+                if kwargs.get("refresh", False) and lfEval("g:Lf_UseCache") == '1':
+                    # only the directories changed are listed again
+                    content = self._refreshCache(indexer)
+                    if content is not None:
+                        if lfEval("get(g:, 'Lf_ShowDevIcons', 1)") == "1":
+                            content = [format_line(line) for line in content]
+                        self._content = content
+                        return self._content
+
+                self._executor.append(indexer)
+                if lfEval("get(g:, 'Lf_ShowDevIcons', 1)") == "1":
+                    content = indexer.execute(dir, format_line=format_line)
+                else:
+                    content = indexer.execute(dir)
+                self._cmd_start_time = time.time()
+                return content
             else:
                 self._content = self._getFileList(dir)
 
         return self._content
 
     def getFreshContent(self, *args, **kwargs):
-        if self._external_cmd:
+        if self._external_cmd or FileIndexer.isAvailable():
             self._content = []
             kwargs["refresh"] = True
             return self.getContent(*args, **kwargs)
@@ -666,6 +654,31 @@ class FileExplorer(Explorer):
     def supportsNameOnly(self):
         return True
 
+    def _nearestAncestor(self, markers, path):
+        """
+        return the nearest ancestor path(including itself) of `path` that contains
+        one of files or directories in `markers`.
+        `markers` is a list of file or directory names.
+        """
+        if os.name == 'nt':
+            # e.g. C:\\
+            root = os.path.splitdrive(os.path.abspath(path))[0] + os.sep
+        else:
+            root = '/'
+
+        path = os.path.abspath(path)
+        while path != root:
+            for name in markers:
+                if os.path.exists(os.path.join(path, name)):
+                    return path
+            path = os.path.abspath(os.path.join(path, ".."))
+
+        for name in markers:
+            if os.path.exists(os.path.join(path, name)):
+                return path
+
+        return ""
+
     def cleanup(self):
         for exe in self._executor:
             exe.killProcess()
@@ -699,31 +712,6 @@ class FileExplManager(Manager):
         help.append('" ---------------------------------------------------------')
         return help
 
-    def _nearestAncestor(self, markers, path):
-        """
-        return the nearest ancestor path(including itself) of `path` that contains
-        one of files or directories in `markers`.
-        `markers` is a list of file or directory names.
-        """
-        if os.name == 'nt':
-            # e.g. C:\\
-            root = os.path.splitdrive(os.path.abspath(path))[0] + os.sep
-        else:
-            root = '/'
-
-        path = os.path.abspath(path)
-        while path != root:
-            for name in markers:
-                if os.path.exists(os.path.join(path, name)):
-                    return path
-            path = os.path.abspath(os.path.join(path, ".."))
-
-        for name in markers:
-            if os.path.exists(os.path.join(path, name)):
-                return path
-
-        return ""
-
     def _afterEnter(self):
         super(FileExplManager, self)._afterEnter()
         lfCmd("augroup Lf_File")
@@ -744,6 +732,9 @@ class FileExplManager(Manager):
             lfCmd("call timer_stop(%s)" % self._timer_id)
             self._timer_id = None
 
+    def watch(self):
+        self._getExplorer().watch(lfGetCwd())
+
     def _bangEnter(self):
         super(FileExplManager, self)._bangEnter()
         if lfEval("exists('*timer_start')") == '0':
@@ -780,14 +771,14 @@ class FileExplManager(Manager):
         cur_buf_name = lfDecode(vim.current.buffer.name)
         fall_back = False
         if 'a' in mode:
-            working_dir = self._nearestAncestor(root_markers, self._orig_cwd)
+            working_dir = self._getExplorer()._nearestAncestor(root_markers, self._orig_cwd)
             if working_dir: # there exists a root marker in nearest ancestor path
                 chdir(working_dir)
             else:
                 fall_back = True
         elif 'A' in mode:
             if cur_buf_name:
-                working_dir = self._nearestAncestor(root_markers, os.path.dirname(cur_buf_name))
+                working_dir = self._getExplorer()._nearestAncestor(root_markers, os.path.dirname(cur_buf_name))
             else:
                 working_dir = ""
             if working_dir: # there exists a root marker in nearest ancestor path
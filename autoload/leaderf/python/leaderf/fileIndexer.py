@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+import time
+import fnmatch
+import threading
+from .utils import *
+from .asyncExecutor import AsyncExecutor
+
+if sys.version_info >= (3, 0):
+    import queue as Queue
+else:
+    import Queue
+
+
+def compileWildIgnore(patterns):
+    """
+    compile the glob patterns into one regular expression,
+    return None if `patterns` is empty.
+    """
+    if not patterns:
+        return None
+
+    flags = re.IGNORECASE if os.name == 'nt' else 0  # the same as fnmatch.fnmatch()
+    return re.compile('|'.join('(?:%s)' % fnmatch.translate(p) for p in patterns), flags)
+
+
+#*****************************************************
+# FileIndexer
+#*****************************************************
+class FileIndexer(object):
+    """
+    A class to index the files of a directory with os.scandir() in a pool of
+    threads, then read the result asynchronously, as AsyncExecutor does.
+    It is used if no external tool is available to index the files.
+    """
+    def __init__(self, thread_count=8):
+        self._thread_count = thread_count
+        self._stopped = False
+        self._max_count = int(lfEval("g:Lf_MaxCount"))
+        self._options = None
+        self._mtimes = None
+
+    @staticmethod
+    def isAvailable():
+        return hasattr(os, "scandir")
+
+    def _readOptions(self, dir, relative=None):
+        # the options are read only here, lfEval() can not be called in the threads
+        if relative is None:
+            relative = lfEval("g:Lf_ShowRelativePath") == '1'
+        wildignore = lfEval("g:Lf_WildIgnore")
+        self._options = {
+                "dir": dir,
+                "ignore_dir": wildignore.get("dir", []),
+                "ignore_file": wildignore.get("file", []),
+                "follow_links": lfEval("g:Lf_FollowLinks") == '1',
+                "show_hidden": lfEval("g:Lf_ShowHidden") != '0',
+                "relative": relative,
+                }
+        self._ignore_dir = compileWildIgnore(self._options["ignore_dir"])
+        self._ignore_file = compileWildIgnore(self._options["ignore_file"])
+        if self._options["relative"]:
+            self._prefix_len = len(dir) if dir.endswith(os.sep) else len(dir) + 1
+        else:
+            self._prefix_len = 0
+
+    def _scan(self, path):
+        """
+        return (files, dirs), the files and the directories in `path` that are not
+        ignored, `files` are the lines to show.
+        """
+        show_hidden = self._options["show_hidden"]
+        follow_links = self._options["follow_links"]
+        ignore_dir = self._ignore_dir
+        ignore_file = self._ignore_file
+        prefix_len = self._prefix_len
+        files = []
+        dirs = []
+        try:
+            for entry in os.scandir(path):
+                name = entry.name
+                if not show_hidden and name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir():
+                        if ignore_dir is not None and ignore_dir.match(name):
+                            continue
+                        if not follow_links and entry.is_symlink():
+                            continue
+                        dirs.append(entry.path)
+                    elif ignore_file is None or not ignore_file.match(name):
+                        files.append(entry.path[prefix_len:])
+                except OSError:
+                    pass
+        except OSError:
+            pass
+
+        return (files, dirs)
+
+    def _getMtime(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def execute(self, dir, format_line=None):
+        self._readOptions(dir)
+        time_limit = float(lfEval("g:Lf_IndexTimeLimit"))
+        follow_links = self._options["follow_links"]
+
+        self._stopped = False
+        self._mtimes = None
+        tasks = Queue.Queue()
+        results = Queue.Queue()
+        lock = threading.Lock()
+        # the number of directories not scanned yet
+        pending = [1]
+        # the directories visited, only used if the symlinks are followed, to avoid loops
+        visited = set()
+        mtimes = {}
+        # the exception raised in a worker, it is raised again by read()
+        exc_info = []
+        start_time = time.time()
+
+        def scan(path):
+            # got before listing, so that a change made while listing is not missed
+            mtimes[path] = self._getMtime(path)
+            files, dirs = self._scan(path)
+            for d in dirs:
+                if follow_links:
+                    try:
+                        stat = os.stat(d)
+                    except OSError:
+                        continue
+                    with lock:
+                        if (stat.st_dev, stat.st_ino) in visited:
+                            continue
+                        visited.add((stat.st_dev, stat.st_ino))
+                with lock:
+                    pending[0] += 1
+                tasks.put(d)
+
+            if files:
+                results.put(files)
+
+        def worker():
+            while True:
+                path = tasks.get()
+                if path is None:
+                    break
+
+                try:
+                    if not self._stopped:
+                        if time.time() - start_time > time_limit:
+                            self._stopped = True
+                        else:
+                            scan(path)
+                except Exception:
+                    exc_info.append(sys.exc_info())
+                    self._stopped = True
+                finally:
+                    # read() would wait forever if the sentinel were not put
+                    with lock:
+                        pending[0] -= 1
+                        finished = pending[0] == 0
+                    if finished:
+                        for i in range(self._thread_count):
+                            tasks.put(None)
+                        results.put(None)
+
+        if follow_links:
+            try:
+                stat = os.stat(dir)
+                visited.add((stat.st_dev, stat.st_ino))
+            except OSError:
+                pass
+
+        tasks.put(dir)
+        for i in range(self._thread_count):
+            thread = threading.Thread(target=worker)
+            thread.daemon = True
+            thread.start()
+
+        def read():
+            try:
+                count = 0
+                for files in iter(results.get, None):
+                    for line in files:
+                        yield format_line(line) if format_line else line
+                        if self._max_count > 0:
+                            count += 1
+                            if count >= self._max_count:
+                                return
+                if exc_info:
+                    lfReraise(exc_info[0])
+                # the mtimes are useless if not all the directories are listed
+                if not self._stopped:
+                    self._mtimes = mtimes
+            finally:
+                self._stopped = True
+
+        return AsyncExecutor.Result(read())
+
+    def getMtimes(self):
+        """
+        return the mtimes of the directories listed by execute() and the options used,
+        or None if not all the files are indexed.
+        it is kept with the file list, so that refresh() can update the list later.
+        """
+        if self._mtimes is None:
+            return None
+
+        return {"options": self._options, "mtimes": self._mtimes}
+
+    def refresh(self, lines, mtimes):
+        """
+        update `lines`, the file list indexed by execute() before, `mtimes` is what
+        getMtimes() returned then. only the directories whose mtime is changed are
+        listed again, since adding, removing or renaming a file changes the mtime
+        of its directory.
+        return the new list, or None if it can not be updated this way, e.g., the
+        options are changed.
+        """
+        dir = mtimes["options"]["dir"]
+        self._readOptions(dir)
+        # the symlinks may make a loop that can not be found without walking through it
+        if mtimes["options"] != self._options or self._options["follow_links"]:
+            return None
+
+        old_mtimes = mtimes["mtimes"]
+        self._mtimes = {}
+        changed = set()
+        for path, mtime in old_mtimes.items():
+            if self._getMtime(path) == mtime:
+                self._mtimes[path] = mtime
+            else:   # changed or removed
+                changed.add(path)
+
+        if not changed:
+            return lines
+
+        relative = self._options["relative"]
+        def getDir(line):
+            d = os.path.dirname(line)
+            if relative:
+                return os.path.join(dir, d) if d else dir
+            else:
+                return d
+
+        lines = [line for line in lines if getDir(line) not in changed]
+        # the changed directories are listed again, and the new ones are walked through
+        stack = list(changed)
+        while stack:
+            path = stack.pop()
+            mtime = self._getMtime(path)
+            if mtime is None:   # removed
+                continue
+
+            self._mtimes[path] = mtime
+            files, dirs = self._scan(path)
+            lines.extend(files)
+            stack.extend(d for d in dirs if d not in old_mtimes and d not in self._mtimes)
+
+        return lines
+
+    def killProcess(self):
+        """
+        stop indexing, it has the same name as AsyncExecutor.killProcess().
+        """
+        self._stopped = True
+
+
+#  vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+from .utils import *
+from .fileIndexer import FileIndexer
+
+# see /usr/include/linux/inotify.h
+IN_MOVED_FROM   = 0x00000040
+IN_MOVED_TO     = 0x00000080
+IN_CREATE       = 0x00000100
+IN_DELETE       = 0x00000200
+IN_DELETE_SELF  = 0x00000400
+IN_Q_OVERFLOW   = 0x00004000
+IN_IGNORED      = 0x00008000
+IN_ONLYDIR      = 0x01000000
+IN_NONBLOCK     = 0x00000800
+IN_CLOEXEC      = 0x00080000
+
+_EVENT_HEADER = struct.Struct('iIII')   # wd, mask, cookie, len
+
+
+def _loadLibc():
+    if not sys.platform.startswith('linux'):
+        return None
+
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (ImportError, OSError, AttributeError):
+        return None
+
+_libc = _loadLibc()
+
+
+#*****************************************************
+# Inotify
+#*****************************************************
+class Inotify(object):
+    """
+    a minimal binding of the inotify API of Linux.
+    """
+    def __init__(self):
+        import ctypes
+        self._get_errno = ctypes.get_errno
+        self._fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            self._raise()
+
+    @staticmethod
+    def isAvailable():
+        return _libc is not None
+
+    def _raise(self):
+        err = self._get_errno()
+        raise OSError(err, os.strerror(err))
+
+    def addWatch(self, path):
+        mask = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_ONLYDIR
+        if not isinstance(path, bytes):
+            path = os.fsencode(path)
+        wd = _libc.inotify_add_watch(self._fd, path, mask)
+        if wd < 0:
+            self._raise()
+        return wd
+
+    def removeWatch(self, wd):
+        _libc.inotify_rm_watch(self._fd, wd)
+
+    def read(self, timeout):
+        """
+        return a list of (wd, mask) of the events that occur in `timeout` seconds.
+        """
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return []
+
+        events = []
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    break
+                raise
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                events.append((wd, mask))
+                offset += _EVENT_HEADER.size + length
+
+        return events
+
+    def close(self):
+        os.close(self._fd)
+
+
+#*****************************************************
+# DirectoryWatcher
+#*****************************************************
+class DirectoryWatcher(FileIndexer):
+    """
+    keep the file list of `root` in memory and up to date in a background thread.
+    the directories are watched by inotify, if it is not available or no more
+    watches can be added (see /proc/sys/fs/inotify/max_user_watches), their mtimes
+    are polled instead.
+    the lines are absolute paths, the options are the same as FileIndexer's.
+    """
+    def __init__(self, root):
+        super(DirectoryWatcher, self).__init__()
+        self._root = root
+        self._readOptions(root, relative=False)
+        self._time_limit = float(lfEval("g:Lf_IndexTimeLimit"))
+        self._lock = threading.Lock()
+        self._dirs = {}     # path -> (files, dirs), the files and subdirectories of path
+        self._mtimes = {}   # path -> mtime, used when polling
+        self._wds = {}      # watch descriptor -> path
+        self._paths = {}    # path -> watch descriptor
+        self._files = None  # the lines of all the directories
+        self._ready = False
+        self._inotify = None
+        self._thread = None
+
+    def getRoot(self):
+        return self._root
+
+    def getOptions(self):
+        return self._options
+
+    def isPolling(self):
+        return self._inotify is None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+
+    def getFiles(self):
+        """
+        return a list of all the files, or None if the first indexing is not done.
+        """
+        with self._lock:
+            if not self._ready:
+                return None
+            if self._files is None:
+                self._files = [f for files, _ in self._dirs.values() for f in files]
+            return list(self._files)
+
+    def _run(self):
+        if Inotify.isAvailable():
+            try:
+                self._inotify = Inotify()
+            except OSError:
+                self._inotify = None
+
+        try:
+            start_time = time.time()
+            self._walk(self._root, start_time)
+            if self._stopped:
+                return
+
+            with self._lock:
+                self._ready = True
+
+            while not self._stopped:
+                if self._inotify is not None:
+                    self._waitForEvents()
+                else:
+                    self._poll()
+        finally:
+            self._stopped = True
+            self._stopWatching()
+            # the list is not kept up to date any more, e.g., an exception is raised
+            with self._lock:
+                ready = self._ready
+                self._ready = False
+            if ready:
+                fileWatcher.remove(self)
+
+    def _walk(self, path, start_time=None):
+        stack = [path]
+        while stack and not self._stopped:
+            if start_time is not None and time.time() - start_time > self._time_limit:
+                # it is too large to be kept in memory
+                self._stopped = True
+                break
+
+            path = stack.pop()
+            # watched before listing, so that a change made while listing is not missed
+            self._addWatch(path)
+            mtime = self._getMtime(path)
+            if mtime is None:
+                continue
+
+            files, dirs = self._scan(path)
+            with self._lock:
+                self._dirs[path] = (files, dirs)
+                self._mtimes[path] = mtime
+                self._files = None
+            stack.extend(dirs)
+
+    def _drop(self, path):
+        stack = [path]
+        while stack:
+            path = stack.pop()
+            with self._lock:
+                entry = self._dirs.pop(path, None)
+                self._mtimes.pop(path, None)
+                self._files = None
+
+            wd = self._paths.pop(path, None)
+            if wd is not None and self._wds.get(wd) == path:
+                del self._wds[wd]
+                self._inotify.removeWatch(wd)
+            if entry is not None:
+                stack.extend(entry[1])
+
+    def _rescan(self, path):
+        mtime = self._getMtime(path)
+        if mtime is None:   # removed
+            self._drop(path)
+            return
+
+        files, dirs = self._scan(path)
+        with self._lock:
+            old_dirs = self._dirs[path][1]
+            self._dirs[path] = (files, dirs)
+            self._mtimes[path] = mtime
+            self._files = None
+
+        new_dirs = set(dirs)
+        for d in old_dirs:
+            if d not in new_dirs:
+                self._drop(d)
+        for d in dirs:
+            if d not in self._dirs:
+                self._walk(d)
+
+    def _update(self, dirty):
+        # the parents first, the removed subdirectories need not be listed
+        for path in sorted(dirty, key=len):
+            if path in self._dirs and not self._stopped:
+                self._rescan(path)
+
+    def _addWatch(self, path):
+        if self._inotify is None:
+            return
+
+        try:
+            wd = self._inotify.addWatch(path)
+        except OSError as e:
+            if e.errno in (errno.ENOSPC, errno.ENOMEM):
+                # out of watches, the mtimes of all the directories are kept, so just poll them
+                self._stopWatching()
+            return
+
+        # the same watch descriptor is returned for a directory moved inside the root
+        old_path = self._wds.get(wd)
+        if old_path is not None and old_path != path:
+            self._paths.pop(old_path, None)
+        self._wds[wd] = path
+        self._paths[path] = wd
+
+    def _stopWatching(self):
+        if self._inotify is not None:
+            try:
+                self._inotify.close()
+            except OSError:
+                pass
+            self._inotify = None
+        self._wds = {}
+        self._paths = {}
+
+    def _waitForEvents(self):
+        try:
+            events = self._inotify.read(0.5)
+            if events:
+                # a burst of changes, e.g., `git checkout`, is handled at one time
+                time.sleep(0.05)
+                events.extend(self._inotify.read(0))
+        except OSError:
+            self._stopWatching()
+            return
+
+        dirty = set()
+        for wd, mask in events:
+            if mask & IN_Q_OVERFLOW:
+                # some events are lost, so list all the directories again
+                dirty.update(self._dirs)
+            elif mask & IN_IGNORED:
+                path = self._wds.pop(wd, None)
+                if path is not None and self._paths.get(path) == wd:
+                    del self._paths[path]
+            else:
+                path = self._wds.get(wd)
+                if path is not None:
+                    dirty.add(path)
+
+        self._update(dirty)
+
+    def _poll(self):
+        start_time = time.time()
+        dirty = [path for path, mtime in list(self._mtimes.items()) if self._getMtime(path) != mtime]
+        self._update(dirty)
+
+        # the more directories, the less often they are polled
+        interval = max(2.0, (time.time() - start_time) * 20)
+        while not self._stopped and time.time() - start_time < interval:
+            time.sleep(0.5)
+
+    def killProcess(self):
+        self.stop()
+
+
+#*****************************************************
+# FileWatcher
+#*****************************************************
+class FileWatcher(object):
+    """
+    the watchers of the project roots, see g:Lf_UseFileWatcher.
+    the watcher of the least recently used root is stopped if there are too many.
+    """
+    def __init__(self):
+        self._max_roots = 4
+        self._watchers = []
+        # remove() is called in the threads of the watchers
+        self._lock = threading.Lock()
+
+    def isEnabled(self):
+        # the symlinks may make a loop that can not be watched
+        return (lfEval("get(g:, 'Lf_UseFileWatcher', 0)") == '1' and FileIndexer.isAvailable()
+                and lfEval("g:Lf_FollowLinks") == '0')
+
+    def watch(self, root):
+        """
+        return the watcher of `root`, it is started if `root` is not watched yet,
+        or is restarted if the options are changed.
+        """
+        watcher = DirectoryWatcher(root)
+        with self._lock:
+            for i, w in enumerate(self._watchers):
+                if w.getRoot() == root:
+                    del self._watchers[i]
+                    if w.getOptions() == watcher.getOptions():
+                        watcher = w
+                    else:
+                        w.stop()
+                    break
+
+            self._watchers.insert(0, watcher)
+            watcher.start()
+            for w in self._watchers[self._max_roots:]:
+                w.stop()
+            del self._watchers[self._max_roots:]
+
+        return watcher
+
+    def remove(self, watcher):
+        """
+        forget `watcher` whose thread has exited, so that its root is watched again
+        by the next watch().
+        """
+        with self._lock:
+            if watcher in self._watchers:
+                self._watchers.remove(watcher)
+
+    def stop(self):
+        with self._lock:
+            for w in self._watchers:
+                w.stop()
+            self._watchers = []
+
+
+#*****************************************************
+# fileWatcher is a singleton
+#*****************************************************
+fileWatcher = FileWatcher()
+
+__all__ = ['fileWatcher']
+
+#  vim: set ts=4 sw=4 tw=0 et :
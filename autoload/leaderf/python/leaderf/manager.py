@@ -12,32 +12,50 @@ import threading
 import multiprocessing
 from functools import partial
 from functools import wraps
+from collections import OrderedDict
 from .instance import LfInstance
 from .cli import LfCli
 from .utils import *
 from .fuzzyMatch import FuzzyMatch
 from .asyncExecutor import AsyncExecutor
+from .stepController import stepController
+from .processMatcher import processMatcher
 from .devicons import (
     webDevIconsGetFileTypeSymbol,
+    webDevIconsString,
     removeDevIcons
 )
 
+# the version of fuzzyMatch_C that is required, see FUZZY_MATCH_C_VERSION in fuzzyMatch.h.
+# a build of another version lacks the functions used or matches differently,
+# so it is not used, the pure-Python FuzzyMatch is used instead until it is rebuilt.
+FUZZY_MATCH_C_VERSION = "2.2"
+
+def isCurrentBuild(module):
+    if getattr(module, "__version__", None) == FUZZY_MATCH_C_VERSION:
+        return True
+
+    lfCmd("echohl WarningMsg | echom 'LeaderF: %s is out of date, "
+          "please rebuild it by :LeaderfInstallCExtension' | echohl None" % module.__name__)
+    return False
+
 is_fuzzyEngine_C = False
 try:
     import fuzzyEngine
-    is_fuzzyEngine_C = True
-    cpu_count = multiprocessing.cpu_count()
-    lfCmd("let g:Lf_fuzzyEngine_C = 1")
+    if isCurrentBuild(fuzzyEngine):
+        is_fuzzyEngine_C = True
+        cpu_count = multiprocessing.cpu_count()
 except ImportError:
-    lfCmd("let g:Lf_fuzzyEngine_C = 0")
+    pass
+lfCmd("let g:Lf_fuzzyEngine_C = %d" % is_fuzzyEngine_C)
 
 is_fuzzyMatch_C = False
 try:
     import fuzzyMatchC
-    is_fuzzyMatch_C = True
-    lfCmd("let g:Lf_fuzzyMatch_C = 1")
+    is_fuzzyMatch_C = isCurrentBuild(fuzzyMatchC)
 except ImportError:
-    lfCmd("let g:Lf_fuzzyMatch_C = 0")
+    pass
+lfCmd("let g:Lf_fuzzyMatch_C = %d" % is_fuzzyMatch_C)
 
 if sys.version_info >= (3, 0):
     def isAscii(str):
@@ -55,6 +73,18 @@ else:
             return False
 
 
+def isCMatchable(str, encoding):
+    """
+    return True if `str` can be matched by fuzzyEngine or fuzzyMatchC, which
+    match non-ASCII characters as UTF-8 only since FUZZY_MATCH_C_VERSION.
+    """
+    if isAscii(str):
+        return True
+
+    # an older build is not used at all, see isCurrentBuild()
+    return encoding == "utf-8" and (is_fuzzyEngine_C or is_fuzzyMatch_C)
+
+
 def modifiableController(func):
     @wraps(func)
     def deco(self, *args, **kwargs):
@@ -115,6 +145,24 @@ class Manager(object):
         self._orig_line = ''
         self._ctrlp_pressed = False
         self._fuzzy_engine = None
+        self._background_engine = None
+        self._background_job = None
+        self._resuming_search = False
+        self._filter_elapsed = None
+        self._corpus = None
+        self._corpus_content = None
+        self._corpus_size = 0
+        self._digests = {}
+        self._digests_content = None
+        self._narrow_stack = []
+        self._narrow_pattern = None
+        self._narrow_cache = OrderedDict()
+        self._narrow_cache_size = 0
+        self._unsorted_result = None
+        self._accumulator = None
+        self._regex_matcher = (None, None)
+        self._search_aborted = False
+        self._previous_result = None
         self._result_content = []
         self._reader_thread = None
         self._timer_id = None
@@ -295,14 +343,23 @@ class Manager(object):
         self._getInstance().helpLength = self._help_length
         self.clearSelections()
         self._getExplorer().cleanup()
+        self._stopBackgroundJob()
+        # the saved states keep highlight methods bound to the engine
+        self._clearNarrowStates()
+        self._clearNarrowCache()
         if self._fuzzy_engine:
             fuzzyEngine.closeFuzzyEngine(self._fuzzy_engine)
             self._fuzzy_engine = None
 
+        if self._background_engine:
+            fuzzyEngine.closeFuzzyEngine(self._background_engine)
+            self._background_engine = None
+
         if self._reader_thread and self._reader_thread.is_alive():
             self._stop_reader_thread = True
 
         self._closePreviewPopup()
+        stepController.save()
 
         if self._getInstance().getWinPos() == 'popup':
             for i in self._match_ids:
@@ -1036,6 +1093,19 @@ class Manager(object):
         return exit_loop
 
     def _search(self, content, is_continue=False, step=0):
+        if self._search_aborted:
+            # the previous search was aborted by a keystroke, the lines it consumed
+            # have not been filtered with the current pattern yet
+            self._search_aborted = False
+            is_continue = False
+
+        if not self._resuming_search:
+            # the search left running in the background is for an old pattern
+            self._stopBackgroundJob()
+
+        if not is_continue and self._cli.pattern and self._restoreCachedState():
+            return
+
         if not is_continue:
             self.clearSelections()
             self._clearHighlights()
@@ -1043,6 +1113,7 @@ class Manager(object):
             self._cli.highlightMatches()
 
         if not self._cli.pattern:   # e.g., when <BS> or <Del> is typed
+            self._clearNarrowStates()
             if self._empty_query and self._getExplorer().getStlCategory() in ["File"]:
                 self._guessSearch(self._content)
             else:
@@ -1051,16 +1122,176 @@ class Manager(object):
                 self._result_content = []
             return
 
+        # in regex mode, only the result can be narrowed down if the pattern is extended
+        if not self._cli.isFuzzy and not is_continue and not self._cli.isPrefix:
+            self._index = 0
+
+        if not is_continue:
+            if self._index == 0:
+                self._clearNarrowStates()
+            elif self._narrow_pattern:
+                self._pushNarrowState()
+
         if self._cli.isFuzzy:
             self._fuzzySearch(content, is_continue, step)
         else:
             self._regexSearch(content, is_continue, step)
 
+        if not self._search_aborted:
+            self._narrow_pattern = self._cli.pattern
+            self._cacheNarrowState()
+
+        if self._getExplorer().getStlCategory() not in ["File"]:
+            self._previewResult(False)
+
+    def _getNarrowState(self):
+        return {
+            "pattern": self._narrow_pattern,
+            "is_fuzzy": self._cli.isFuzzy,
+            "is_full_path": self._cli.isFullPath,
+            "content": self._content,
+            "content_len": len(self._content),
+            "index": self._index,
+            "cb_content": self._cb_content,
+            "result_content": self._result_content,
+            "previous_result": self._previous_result,
+            "unsorted_result": self._unsorted_result,
+            "accumulator": self._accumulator,
+            # the highlight method may be bound to the fuzzy engine
+            "fuzzy_engine": self._fuzzy_engine,
+            "highlight_method": self._highlight_method,
+            }
+
+    def _pushNarrowState(self):
+        """
+        save the state of filtering for the current pattern before it is narrowed
+        down by a longer pattern, so that it can be restored on <Shorten>.
+        lines that do not match the current pattern can not match the longer one,
+        so only self._result_content and the lines not filtered yet are searched.
+        """
+        self._narrow_stack.append(self._getNarrowState())
+
+    def _clearNarrowStates(self):
+        self._narrow_stack = []
+        self._narrow_pattern = None
+
+    def _clearNarrowCache(self):
+        self._narrow_cache = OrderedDict()
+        self._narrow_cache_size = 0
+
+    def _getNarrowCacheKey(self, pattern):
+        # pattern is a list in AND mode or refinement
+        if isinstance(pattern, list):
+            pattern = tuple(pattern)
+        return (pattern, self._cli.isFuzzy, self._cli.isFullPath)
+
+    def _cacheNarrowState(self):
+        """
+        keep the state of filtering for the current pattern in an LRU cache, so that it
+        can be restored whenever the pattern is typed again, e.g., after <C-U> or <Up>.
+        the cache is limited by the number of lines it keeps, see g:Lf_SearchCacheSize.
+        """
+        limit = int(lfEval("get(g:, 'Lf_SearchCacheSize', 2000000)"))
+        key = self._getNarrowCacheKey(self._narrow_pattern)
+        state = self._narrow_cache.pop(key, None)
+        if state is not None:
+            self._narrow_cache_size -= state["size"]
+
+        state = self._getNarrowState()
+        state["size"] = len(self._result_content) + len(self._cb_content)
+        if state["size"] <= limit:
+            self._narrow_cache[key] = state
+            self._narrow_cache_size += state["size"]
+
+        # the states for another content can never be restored
+        for key, state in list(self._narrow_cache.items()):
+            if state["content"] is not self._content:
+                del self._narrow_cache[key]
+                self._narrow_cache_size -= state["size"]
+
+        while self._narrow_cache_size > limit:
+            _, state = self._narrow_cache.popitem(last=False)
+            self._narrow_cache_size -= state["size"]
+
+    def _isNarrowStateValid(self, state):
+        # self._content is replaced, or some lines are removed from it,
+        # or the fuzzy engine the highlight method is bound to is closed
+        return (state["is_fuzzy"] == self._cli.isFuzzy and state["is_full_path"] == self._cli.isFullPath
+                and state["content"] is self._content and state["content_len"] <= len(self._content)
+                and state["fuzzy_engine"] is self._fuzzy_engine)
+
+    def _restoreNarrowState(self):
+        """
+        restore the state of filtering saved for the current pattern,
+        return True if it is restored, otherwise return False.
+        """
+        pattern = self._cli.pattern
+        state = None
+        while self._narrow_stack:
+            state = self._narrow_stack.pop()
+            if state["pattern"] == pattern:
+                break
+        else:
+            self._clearNarrowStates()
+            return self._restoreCachedState()
+
+        if not self._isNarrowStateValid(state):
+            self._clearNarrowStates()
+            return False
+
+        self._applyNarrowState(state)
+        return True
+
+    def _restoreCachedState(self):
+        """
+        restore the state of filtering cached for the current pattern,
+        return True if it is restored, otherwise return False.
+        """
+        key = self._getNarrowCacheKey(self._cli.pattern)
+        state = self._narrow_cache.pop(key, None)
+        if state is None:
+            return False
+
+        if not self._isNarrowStateValid(state):
+            self._narrow_cache_size -= state["size"]
+            return False
+
+        self._narrow_cache[key] = state
+        # the lists of the state may be changed in place when the search goes on,
+        # so the same state in the stack must not be restored after that
+        self._clearNarrowStates()
+        self._applyNarrowState(state)
+        return True
+
+    def _applyNarrowState(self, state):
+        self._stopBackgroundJob()
+        self._index = state["index"]
+        self._cb_content = state["cb_content"]
+        self._result_content = state["result_content"]
+        self._previous_result = state["previous_result"]
+        self._unsorted_result = state["unsorted_result"]
+        self._accumulator = state["accumulator"]
+        self._narrow_pattern = state["pattern"]
+        self._search_aborted = False
+
+        self.clearSelections()
+        self._clearHighlights()
+        self._clearHighlightsPos()
+        self._cli.highlightMatches()
+
+        self._getInstance().setBuffer(self._result_content[:self._initial_count])
+        self._getInstance().setStlResultsCount(len(self._result_content), True)
+
+        self._highlight_method = state["highlight_method"]
+        if self._cli.isFuzzy:
+            self._highlight_method()
+
         if self._getExplorer().getStlCategory() not in ["File"]:
             self._previewResult(False)
 
     def _filter(self, step, filter_method, content, is_continue,
-                use_fuzzy_engine=False, return_index=False):
+                use_fuzzy_engine=False, return_index=False, top_k=0, engine=None,
+                process_filter=None):
         """ Construct a list from result of filter_method(content).
 
         Args:
@@ -1068,19 +1299,39 @@ class Manager(object):
             filter_method: A function to apply `content` as parameter and
                 return an iterable.
             content: The list to be filtered.
+            top_k: If greater than 0, only the first `top_k` lines of the
+                result are sorted by fuzzyEngine, see _sortRemainder().
+            engine: The name of the filter. If it is not None, `step` is adapted
+                to how fast the filter is, see stepController.
+            process_filter: If it is not None, it is used instead of `filter_method`
+                to filter the lines of `content` by processMatcher.
+
+        Returns None if fuzzyEngine is aborted by a keystroke or is still running
+        in the background, the state of filtering is left as it was before the call.
         """
+        saved_state = (self._index, self._cb_content, self._result_content,
+                       self._previous_result, self._unsorted_result, self._accumulator)
+        if not is_continue:
+            self._unsorted_result = None
+            self._accumulator = None
+
         unit = self._getUnit()
+        if engine is not None:
+            step = stepController.getStep(self._getExplorer().getStlCategory(), engine, step, unit)
         step = step // unit * unit
         length = len(content)
+        # the offset of cur_content in content if cur_content is a slice of content, otherwise -1
+        offset = -1
         if self._index == 0:
             self._cb_content = []
             self._result_content = []
             self._index = min(step, length)
             cur_content = content[:self._index]
+            offset = 0
         else:
             if not is_continue and self._result_content:
                 if self._cb_content:
-                    self._cb_content += self._result_content
+                    self._cb_content = self._cb_content + self._result_content
                 else:
                     self._cb_content = self._result_content
 
@@ -1088,16 +1339,21 @@ class Manager(object):
                 cur_content = self._cb_content[:step]
                 self._cb_content = self._cb_content[step:]
             else:
+                if not self._cb_content:
+                    offset = self._index
                 cur_content = self._cb_content
                 left = step - len(self._cb_content)
                 self._cb_content = []
                 if self._index < length:
                     end = min(self._index + left, length)
-                    cur_content += content[self._index:end]
+                    cur_content = cur_content + content[self._index:end]
                     self._index = end
 
+        start_time = time.time()
+        self._filter_elapsed = None
         if self._cli.isAndMode:
             result, highlight_methods = filter_method(cur_content)
+            self._updateStepRate(engine, len(cur_content), start_time)
             if is_continue:
                 self._previous_result = (self._previous_result[0] + result[0],
                                          self._previous_result[1] + result[1])
@@ -1108,26 +1364,253 @@ class Manager(object):
         elif use_fuzzy_engine:
             if return_index:
                 mode = 0 if self._cli.isFullPath else 1
-                tmp_content = [self._getDigest(line, mode) for line in cur_content]
-                result = filter_method(source=tmp_content)
-                result = (result[0], [cur_content[i] for i in result[1]])
+                if offset >= 0:
+                    tmp_content = self._syncDigests(content, mode)[offset:offset + len(cur_content)]
+                else:
+                    tmp_content = [self._getDigest(line, mode) for line in cur_content]
+                result = self._runAbortable(filter_method, is_continue, source=tmp_content)
+                if result is not None:
+                    result = (result[0], [cur_content[i] for i in result[1]])
             else:
-                result = filter_method(source=cur_content)
+                kwargs = {"top_k": top_k} if top_k > 0 else {}
+                if offset >= 0:
+                    self._syncCorpus(content)
+                    result = self._runAbortable(filter_method, is_continue, source=cur_content,
+                                                corpus=self._corpus, offset=offset, **kwargs)
+                else:
+                    result = self._runAbortable(filter_method, is_continue, source=cur_content, **kwargs)
+
+                if result is not None and not is_continue and kwargs and len(result[1]) > top_k * unit:
+                    self._unsorted_result = (result, top_k * unit, unit)
+
+            if result is None:
+                (self._index, self._cb_content, self._result_content, self._previous_result,
+                 self._unsorted_result, self._accumulator) = saved_state
+                self._search_aborted = True
+                return None
 
             if is_continue:
-                result = fuzzyEngine.merge(self._previous_result, result)
+                if top_k > 0:
+                    # the results of the chunks are accumulated by fuzzyEngine,
+                    # only the first `top_k` lines are merged every time
+                    if self._accumulator is None:
+                        self._accumulator = fuzzyEngine.createAccumulator(self._previous_result, top_k, unit)
+                        self._unsorted_result = None
+                    result = (None, fuzzyEngine.accumulate(self._accumulator, result))
+                else:
+                    # fuzzyEngine.merge() requires both results to be fully sorted
+                    self._sortRemainder()
+                    result = fuzzyEngine.merge(self._previous_result, result)
 
             self._previous_result = result
         else:
-            result = list(filter_method(cur_content))
+            result = None
+            if process_filter is not None and offset >= 0:
+                mode = 0 if self._cli.isFullPath else 1
+                key = (self._getExplorer().getStlCategory(), mode)
+                try:
+                    processMatcher.sync(self._syncDigests(content, mode), key)
+                    pairs = process_filter(key=key, start=offset, end=offset + len(cur_content))
+                    result = [(weight, cur_content[i - offset]) for weight, i in pairs]
+                except Exception:
+                    # e.g., a worker process is killed
+                    processMatcher.stop()
+
+            if result is None:
+                result = list(filter_method(cur_content))
             if is_continue:
-                self._previous_result += result
+                self._previous_result = self._previous_result + result
                 result = self._previous_result
             else:
                 self._previous_result = result
 
+        self._updateStepRate(engine, len(cur_content), start_time)
         return result
 
+    def _updateStepRate(self, engine, count, start_time):
+        if engine is not None:
+            # the result of a search done in the background is taken at once
+            if self._filter_elapsed is not None:
+                elapsed = self._filter_elapsed
+            else:
+                elapsed = time.time() - start_time
+            stepController.update(self._getExplorer().getStlCategory(), engine, count, elapsed)
+
+    def _getJobKey(self, kwargs):
+        """
+        return what identifies a search run by _runAbortable().
+        the source is a new slice of the same lines on every keystroke and comparing
+        it takes as long as a search, so only its length and the identities of its
+        first and last lines are compared.
+        """
+        key = [self._getNarrowCacheKey(self._cli.pattern)]
+        for name, value in sorted(kwargs.items()):
+            if name == "source":
+                value = (len(value), id(value[0]), id(value[-1])) if value else 0
+            elif name == "corpus":
+                value = id(value)
+            key.append((name, value))
+        return tuple(key)
+
+    def _runAbortable(self, filter_method, is_continue, **kwargs):
+        """
+        run `filter_method` of fuzzyEngine in another thread when the source is large.
+        a new search is left running in the background and None is returned at once,
+        so that typing is never blocked by it, _workInIdle() takes the result when it is done.
+        a continued search is aborted if a key is typed before it finishes.
+        return None if it is aborted or not finished.
+        """
+        job = self._background_job
+        if job is not None:
+            self._background_job = None
+            if job["key"] == self._getJobKey(kwargs):
+                job["thread"].join()
+                if job["exc_info"]:
+                    lfReraise(job["exc_info"][0])
+                # the time the job took, not the time waiting for it, see _updateStepRate()
+                self._filter_elapsed = job["elapsed"][0]
+                return job["result"][0]
+
+            self._stopBackgroundJob(job)
+            # e.g., more lines are read since the job started, run it again without
+            # waiting for the idle time, otherwise it may be restarted over and over
+            if self._resuming_search:
+                return filter_method(**kwargs)
+
+        if (len(kwargs["source"]) < 100000 or self._current_mode != 'INPUT'
+                or lfEval("get(g:, 'Lf_NoAsync', 0)") == '1'):
+            return filter_method(**kwargs)
+
+        if is_continue:
+            engine = self._fuzzy_engine
+        else:
+            if self._background_engine is None:
+                self._background_engine = fuzzyEngine.createFuzzyEngine(cpu_count, False)
+            engine = self._background_engine
+
+        result = []
+        exc_info = []
+        elapsed = []
+        def run():
+            try:
+                start_time = time.time()
+                result.append(filter_method(engine=engine, **kwargs))
+                elapsed.append(time.time() - start_time)
+            except Exception:
+                exc_info.append(sys.exc_info())
+
+        # cleared here rather than by the search, so that an abort made before
+        # the search starts in the thread is not lost
+        fuzzyEngine.clearAbort(engine)
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        if not is_continue:
+            thread.join(0.01)
+            if thread.is_alive():
+                self._background_job = {
+                        "thread": thread,
+                        "engine": engine,
+                        "key": self._getJobKey(kwargs),
+                        # keeps the objects whose ids are in the key alive
+                        "kwargs": kwargs,
+                        "result": result,
+                        "exc_info": exc_info,
+                        "elapsed": elapsed,
+                        }
+                return None
+
+        while thread.is_alive():
+            thread.join(0.01)
+            # the GIL is released by fuzzyEngine while searching
+            if thread.is_alive() and lfEval("getchar(1) isnot 0") == '1':
+                fuzzyEngine.abort(engine)
+        fuzzyEngine.clearAbort(engine)
+
+        if exc_info:
+            lfReraise(exc_info[0])
+
+        return result[0]
+
+    def _stopBackgroundJob(self, job=None):
+        if job is None:
+            job = self._background_job
+            self._background_job = None
+
+        if job is not None:
+            fuzzyEngine.abort(job["engine"])
+            job["thread"].join()
+            fuzzyEngine.clearAbort(job["engine"])
+
+    def _resumeSearch(self):
+        """
+        take the result of the search left running in the background by _runAbortable().
+        """
+        self._background_job["thread"].join()
+        # the engine that has done the search gets the highlights of its result,
+        # the other one is idle now and is used by the next search in the background
+        self._fuzzy_engine, self._background_engine = self._background_engine, self._fuzzy_engine
+        self._resuming_search = True
+        try:
+            self._search(self._content)
+        finally:
+            self._resuming_search = False
+
+    def _sortRemainder(self):
+        """
+        sort the lines of self._result_content that are left unsorted by `top_k`,
+        it must be called before the lines after the first `top_k` lines are used.
+        """
+        if self._unsorted_result is not None:
+            fuzzyEngine.sortRemainder(*self._unsorted_result)
+            self._unsorted_result = None
+
+        if self._accumulator is not None:
+            fuzzyEngine.sortAccumulator(self._accumulator)
+
+    def _syncCorpus(self, content):
+        """
+        make the corpus of fuzzyEngine contain all the lines of `content`,
+        which is self._content or the beginning part of it.
+        """
+        # self._content is replaced, or some lines are removed from it
+        if (self._corpus is None or self._corpus_content is not self._content
+                or self._corpus_size > len(self._content)):
+            self._corpus = fuzzyEngine.createCorpus()
+            self._corpus_content = self._content
+            self._corpus_size = 0
+
+        if len(content) > self._corpus_size:
+            self._corpus_size = fuzzyEngine.appendCorpus(self._corpus, content, self._corpus_size)
+
+    def _resetCorpus(self):
+        self._corpus = None
+        self._corpus_content = None
+        self._corpus_size = 0
+
+    def _syncDigests(self, content, mode):
+        """
+        make self._digests[mode] contain the digests of all the lines of `content`,
+        which is self._content or the beginning part of it, and return it.
+        the digests are computed only once for each line, not on every search.
+        """
+        # self._content is replaced, or some lines are removed from it
+        if (self._digests_content is not self._content
+                or any(len(d) > len(self._content) for d in self._digests.values())):
+            self._digests = {}
+            self._digests_content = self._content
+
+        digests = self._digests.setdefault(mode, [])
+        if len(content) > len(digests):
+            getDigest = self._getDigest
+            digests.extend([getDigest(line, mode) for line in content[len(digests):]])
+
+        return digests
+
+    def _resetDigests(self):
+        self._digests = {}
+        self._digests_content = None
+
     def _fuzzyFilter(self, is_full_path, get_weight, iterable):
         """
         return a list, each item is a pair (weight, line)
@@ -1163,12 +1646,16 @@ class Manager(object):
 
     def _andModeFilter(self, iterable):
         encoding = lfEval("&encoding")
+        if (self._fuzzy_engine and self._getUnit() == 1 # currently, only BufTag's _getUnit() is 2
+                and all(isCMatchable(p, encoding) for p in self._cli.pattern)):
+            return self._andModeEngineFilter(iterable)
+
         use_fuzzy_engine = False
         cur_content = iterable
         weight_lists = []
         highlight_methods = []
         for p in self._cli.pattern:
-            if self._fuzzy_engine and isAscii(p) and self._getUnit() == 1: # currently, only BufTag's _getUnit() is 2
+            if self._fuzzy_engine and isCMatchable(p, encoding) and self._getUnit() == 1: # currently, only BufTag's _getUnit() is 2
                 use_fuzzy_engine = True
                 pattern = fuzzyEngine.initPattern(p)
                 if self._getExplorer().getStlCategory() == "File" and self._cli.isFullPath:
@@ -1186,7 +1673,7 @@ class Manager(object):
                 getHighlights = partial(fuzzyEngine.getHighlights, engine=self._fuzzy_engine,
                                         pattern=pattern, is_name_only=not self._cli.isFullPath)
                 highlight_method = partial(self._highlight, self._cli.isFullPath, getHighlights, True, clear=False)
-            elif is_fuzzyMatch_C and isAscii(p):
+            elif is_fuzzyMatch_C and isCMatchable(p, encoding):
                 pattern = fuzzyMatchC.initPattern(p)
                 if self._getExplorer().getStlCategory() == "File" and self._cli.isFullPath:
                     getWeight = partial(fuzzyMatchC.getWeight, pattern=pattern, is_name_only=False)
@@ -1244,15 +1731,44 @@ class Manager(object):
 
         return ((weights, result_content), highlight_methods)
 
+    def _andModeEngineFilter(self, iterable):
+        """
+        match all the sub-patterns in one pass of fuzzyEngine
+        """
+        if self._getExplorer().getStlCategory() == "File" and self._cli.isFullPath:
+            is_name_only = False
+        elif self._getExplorer().getStlCategory() in ["Self", "Buffer", "Mru", "BufTag",
+                "Function", "History", "Cmd_History", "Search_History", "Tag", "Rg", "Filetype",
+                "Command", "Window", "QuickFix", "LocList"]:
+            is_name_only = True
+        else:
+            is_name_only = not self._cli.isFullPath
+
+        patterns = [fuzzyEngine.initPattern(p) for p in self._cli.pattern]
+        mode = 0 if self._cli.isFullPath else 1
+        tmp_content = [self._getDigest(line, mode) for line in iterable]
+        weights, indices = fuzzyEngine.fuzzyMatchEx(engine=self._fuzzy_engine, source=tmp_content,
+                                                    pattern=patterns, is_name_only=is_name_only,
+                                                    sort_results=False, is_and_mode=True)
+
+        highlight_methods = []
+        for pattern in patterns:
+            getHighlights = partial(fuzzyEngine.getHighlights, engine=self._fuzzy_engine,
+                                    pattern=pattern, is_name_only=not self._cli.isFullPath)
+            highlight_methods.append(partial(self._highlight, self._cli.isFullPath, getHighlights, True, clear=False))
+
+        return ((weights, [iterable[i] for i in indices]), highlight_methods)
+
     def _fuzzySearch(self, content, is_continue, step):
         encoding = lfEval("&encoding")
         use_fuzzy_engine = False
         use_fuzzy_match_c = False
+        process_filter = None
         if self._cli.isAndMode:
             filter_method = self._andModeFilter
         elif self._cli.isRefinement:
             if self._cli.pattern[1] == '':      # e.g. abc;
-                if self._fuzzy_engine and isAscii(self._cli.pattern[0]):
+                if self._fuzzy_engine and isCMatchable(self._cli.pattern[0], encoding):
                     use_fuzzy_engine = True
                     return_index = True
                     pattern = fuzzyEngine.initPattern(self._cli.pattern[0])
@@ -1261,7 +1777,7 @@ class Manager(object):
                     getHighlights = partial(fuzzyEngine.getHighlights, engine=self._fuzzy_engine,
                                             pattern=pattern, is_name_only=True)
                     highlight_method = partial(self._highlight, True, getHighlights, True)
-                elif is_fuzzyMatch_C and isAscii(self._cli.pattern[0]):
+                elif is_fuzzyMatch_C and isCMatchable(self._cli.pattern[0], encoding):
                     use_fuzzy_match_c = True
                     pattern = fuzzyMatchC.initPattern(self._cli.pattern[0])
                     getWeight = partial(fuzzyMatchC.getWeight, pattern=pattern, is_name_only=True)
@@ -1275,7 +1791,7 @@ class Manager(object):
                     filter_method = partial(self._fuzzyFilter, False, getWeight)
                     highlight_method = partial(self._highlight, False, getHighlights)
             elif self._cli.pattern[0] == '':    # e.g. ;abc
-                if self._fuzzy_engine and isAscii(self._cli.pattern[1]):
+                if self._fuzzy_engine and isCMatchable(self._cli.pattern[1], encoding):
                     use_fuzzy_engine = True
                     return_index = True
                     pattern = fuzzyEngine.initPattern(self._cli.pattern[1])
@@ -1284,7 +1800,7 @@ class Manager(object):
                     getHighlights = partial(fuzzyEngine.getHighlights, engine=self._fuzzy_engine,
                                             pattern=pattern, is_name_only=False)
                     highlight_method = partial(self._highlight, True, getHighlights, True)
-                elif is_fuzzyMatch_C and isAscii(self._cli.pattern[1]):
+                elif is_fuzzyMatch_C and isCMatchable(self._cli.pattern[1], encoding):
                     use_fuzzy_match_c = True
                     pattern = fuzzyMatchC.initPattern(self._cli.pattern[1])
                     getWeight = partial(fuzzyMatchC.getWeight, pattern=pattern, is_name_only=False)
@@ -1298,34 +1814,46 @@ class Manager(object):
                     filter_method = partial(self._fuzzyFilter, True, getWeight)
                     highlight_method = partial(self._highlight, True, getHighlights)
             else:   # e.g. abc;def
-                if is_fuzzyMatch_C and isAscii(self._cli.pattern[0]):
-                    is_ascii_0 = True
+                if is_fuzzyMatch_C and isCMatchable(self._cli.pattern[0], encoding):
+                    use_c_0 = True
                     pattern_0 = fuzzyMatchC.initPattern(self._cli.pattern[0])
                     getWeight_0 = partial(fuzzyMatchC.getWeight, pattern=pattern_0, is_name_only=True)
                     getHighlights_0 = partial(fuzzyMatchC.getHighlights, pattern=pattern_0, is_name_only=True)
                 else:
-                    is_ascii_0 = False
+                    use_c_0 = False
                     fuzzy_match_0 = FuzzyMatch(self._cli.pattern[0], encoding)
                     getWeight_0 = fuzzy_match_0.getWeight
                     getHighlights_0 = fuzzy_match_0.getHighlights
 
-                if is_fuzzyMatch_C and isAscii(self._cli.pattern[1]):
-                    is_ascii_1 = True
+                if is_fuzzyMatch_C and isCMatchable(self._cli.pattern[1], encoding):
+                    use_c_1 = True
                     pattern_1 = fuzzyMatchC.initPattern(self._cli.pattern[1])
                     getWeight_1 = partial(fuzzyMatchC.getWeight, pattern=pattern_1, is_name_only=False)
                     getHighlights_1 = partial(fuzzyMatchC.getHighlights, pattern=pattern_1, is_name_only=False)
                 else:
-                    is_ascii_1 = False
+                    use_c_1 = False
                     fuzzy_match_1 = FuzzyMatch(self._cli.pattern[1], encoding)
                     getWeight_1 = fuzzy_match_1.getWeight
                     getHighlights_1 = fuzzy_match_1.getHighlights
 
-                    use_fuzzy_match_c = is_ascii_0 and is_ascii_1
+                    use_fuzzy_match_c = use_c_0 and use_c_1
 
-                filter_method = partial(self._refineFilter, getWeight_0, getWeight_1)
+                if (self._fuzzy_engine and self._getExplorer().getStlCategory() == "File"
+                        and isCMatchable(self._cli.pattern[0], encoding)
+                        and isCMatchable(self._cli.pattern[1], encoding)):
+                    use_fuzzy_engine = True
+                    return_index = False
+                    filter_method = partial(fuzzyEngine.fuzzyMatch, engine=self._fuzzy_engine,
+                                            pattern=fuzzyEngine.initPattern(self._cli.pattern[0]),
+                                            dir_pattern=fuzzyEngine.initPattern(self._cli.pattern[1]),
+                                            sort_results=True)
+                else:
+                    filter_method = partial(self._refineFilter, getWeight_0, getWeight_1)
                 highlight_method = partial(self._highlightRefine, getHighlights_0, getHighlights_1)
         else:
-            if self._fuzzy_engine and isAscii(self._cli.pattern) and self._getUnit() == 1: # currently, only BufTag's _getUnit() is 2
+            # currently, only BufTag's _getUnit() is 2, fuzzyMatchPart() supports it
+            if (self._fuzzy_engine and isCMatchable(self._cli.pattern, encoding)
+                    and (self._getUnit() == 1 or self._getExplorer().getStlCategory() == "BufTag")):
                 use_fuzzy_engine = True
                 pattern = fuzzyEngine.initPattern(self._cli.pattern)
                 if self._getExplorer().getStlCategory() == "File":
@@ -1371,9 +1899,41 @@ class Manager(object):
                     filter_method = partial(fuzzyEngine.fuzzyMatchPart, engine=self._fuzzy_engine,
                                             pattern=pattern, category=fuzzyEngine.Category_Line,
                                             param=fuzzyEngine.createParameter(1), is_name_only=True, sort_results=True)
-                elif self._getExplorer().getStlCategory() in ["Self", "Buffer", "Mru", "BufTag",
-                        "Function", "History", "Cmd_History", "Search_History", "Filetype",
-                        "Command", "Window", "QuickFix", "LocList"]:
+                elif self._getExplorer().getStlCategory() in ["Mru", "Buffer", "Window", "BufTag",
+                        "Function", "QuickFix", "LocList", "Help"]:
+                    return_index = False
+                    category = self._getExplorer().getStlCategory()
+                    mode = 0 if self._cli.isFullPath else 1
+                    if category in ["Mru", "Buffer", "Window"]:
+                        prefix_len = self._getExplorer().getPrefixLength()
+                        # fuzzyEngine counts the prefix in characters, python2 counts it in bytes
+                        if self._getExplorer().show_icon and sys.version_info < (3, 0):
+                            icon = webDevIconsString()
+                            prefix_len -= len(icon) - len(icon.decode("utf-8", "ignore"))
+                    else:
+                        prefix_len = 0
+
+                    if category == "Mru" and mode == 1 and "--no-split-path" in self._arguments:
+                        category_id = fuzzyEngine.Category_File
+                    else:
+                        category_id = {
+                                "Mru": fuzzyEngine.Category_Mru,
+                                "Buffer": fuzzyEngine.Category_Buffer,
+                                "Window": fuzzyEngine.Category_Window,
+                                "BufTag": fuzzyEngine.Category_BufTag,
+                                "Function": fuzzyEngine.Category_Function,
+                                "QuickFix": fuzzyEngine.Category_QuickFix,
+                                "LocList": fuzzyEngine.Category_QuickFix,
+                                "Help": fuzzyEngine.Category_Help,
+                                }[category]
+
+                    filter_method = partial(fuzzyEngine.fuzzyMatchPart, engine=self._fuzzy_engine,
+                                            pattern=pattern, category=category_id,
+                                            param=fuzzyEngine.createParameter(mode, prefix_len),
+                                            is_name_only=category != "Help" or not self._cli.isFullPath,
+                                            sort_results=True, unit=self._getUnit())
+                elif self._getExplorer().getStlCategory() in ["Self", "History", "Cmd_History",
+                        "Search_History", "Filetype", "Command"]:
                     return_index = True
                     filter_method = partial(fuzzyEngine.fuzzyMatchEx, engine=self._fuzzy_engine, pattern=pattern,
                                             is_name_only=True, sort_results=True)
@@ -1385,7 +1945,7 @@ class Manager(object):
                 getHighlights = partial(fuzzyEngine.getHighlights, engine=self._fuzzy_engine,
                                         pattern=pattern, is_name_only=not self._cli.isFullPath)
                 highlight_method = partial(self._highlight, self._cli.isFullPath, getHighlights, True)
-            elif is_fuzzyMatch_C and isAscii(self._cli.pattern):
+            elif is_fuzzyMatch_C and isCMatchable(self._cli.pattern, encoding):
                 use_fuzzy_match_c = True
                 pattern = fuzzyMatchC.initPattern(self._cli.pattern)
                 if self._getExplorer().getStlCategory() == "File" and self._cli.isFullPath:
@@ -1400,30 +1960,33 @@ class Manager(object):
             else:
                 fuzzy_match = FuzzyMatch(self._cli.pattern, encoding)
                 if self._getExplorer().getStlCategory() == "File" and self._cli.isFullPath:
-                    filter_method = partial(self._fuzzyFilter,
-                                            self._cli.isFullPath,
-                                            fuzzy_match.getWeight2)
+                    weight_method = "getWeight2"
                 elif self._getExplorer().getStlCategory() in ["Self", "Buffer", "Mru", "BufTag",
                         "Function", "History", "Cmd_History", "Search_History", "Rg", "Filetype",
                         "Command", "Window", "QuickFix", "LocList"]:
-                    filter_method = partial(self._fuzzyFilter,
-                                            self._cli.isFullPath,
-                                            fuzzy_match.getWeight3)
+                    weight_method = "getWeight3"
                 else:
-                    filter_method = partial(self._fuzzyFilter,
-                                            self._cli.isFullPath,
-                                            fuzzy_match.getWeight)
+                    weight_method = "getWeight"
+
+                filter_method = partial(self._fuzzyFilter,
+                                        self._cli.isFullPath,
+                                        getattr(fuzzy_match, weight_method))
+                if self._getUnit() == 1 and processMatcher.isEnabled():
+                    process_filter = partial(processMatcher.filter, pattern=self._cli.pattern,
+                                             encoding=encoding, method=weight_method)
 
                 highlight_method = partial(self._highlight,
                                            self._cli.isFullPath,
                                            fuzzy_match.getHighlights)
 
         if self._cli.isAndMode:
-            if self._fuzzy_engine and isAscii(''.join(self._cli.pattern)):
+            if self._fuzzy_engine and isCMatchable(''.join(self._cli.pattern), encoding):
                 step = 20000 * cpu_count
+                engine = "and-fuzzyEngine"
             else:
                 step = 10000
-            pair, highlight_methods = self._filter(step, filter_method, content, is_continue)
+                engine = "and"
+            pair, highlight_methods = self._filter(step, filter_method, content, is_continue, engine=engine)
 
             pairs = sorted(zip(*pair), key=operator.itemgetter(0), reverse=True)
             self._result_content = self._getList(pairs)
@@ -1434,7 +1997,12 @@ class Manager(object):
                 else:
                     step = 60000 * cpu_count
 
-            _, self._result_content = self._filter(step, filter_method, content, is_continue, True, return_index)
+            top_k = 0 if return_index else self._initial_count
+            result = self._filter(step, filter_method, content, is_continue, True, return_index, top_k,
+                                  engine="fuzzyEngine")
+            if result is None:  # aborted by a keystroke or not finished, see _runAbortable()
+                return
+            _, self._result_content = result
         else:
             if step == 0:
                 if use_fuzzy_match_c:
@@ -1444,7 +2012,14 @@ class Manager(object):
                 else:
                     step = 12000
 
-            pairs = self._filter(step, filter_method, content, is_continue)
+            if use_fuzzy_match_c:
+                engine = "fuzzyMatchC"
+            elif process_filter is not None:
+                engine = "processMatcher"
+            else:
+                engine = "fuzzyMatch"
+            pairs = self._filter(step, filter_method, content, is_continue, engine=engine,
+                                 process_filter=process_filter)
             pairs.sort(key=operator.itemgetter(0), reverse=True)
             self._result_content = self._getList(pairs)
 
@@ -1689,7 +2264,22 @@ class Manager(object):
                     id = int(lfEval("matchaddpos('Lf_hl_matchRefine', %s)" % str(pos[j:j+8])))
                 self._highlight_ids.append(id)
 
+    def _getRegexMatcher(self):
+        """
+        return the search() method of the python regex translated from the pattern,
+        which is a vim regex, or None if the pattern can not be translated.
+        """
+        key = (self._cli.pattern, lfEval("&ignorecase") == '1')
+        if self._regex_matcher[0] != key:
+            regex = translateVimRegex(*key)
+            self._regex_matcher = (key, regex.search if regex else None)
+        return self._regex_matcher[1]
+
     def _regexFilter(self, iterable):
+        search = self._getRegexMatcher()
+        if search is not None:
+            return [line for line in iterable if search(self._getDigest(line, 0))]
+
         def noErrMatch(text, pattern):
             try:
                 return '-1' != lfEval("g:LfNoErrMsgMatch('%s', '%s')" % (text, pattern))
@@ -1710,9 +2300,7 @@ class Manager(object):
             return iter([])
 
     def _regexSearch(self, content, is_continue, step):
-        if not is_continue and not self._cli.isPrefix:
-            self._index = 0
-        self._result_content = self._filter(8000, self._regexFilter, content, is_continue)
+        self._result_content = self._filter(8000, self._regexFilter, content, is_continue, engine="regex")
         self._getInstance().setBuffer(self._result_content[:self._initial_count])
         self._getInstance().setStlResultsCount(len(self._result_content), True)
 
@@ -2001,6 +2589,8 @@ class Manager(object):
         self.clearSelections()
 
         self._content = self._getInstance().initBuffer(content, self._getUnit(), self._getExplorer().setContent)
+        self._resetCorpus()
+        self._resetDigests()
         self._iteration_end = True
 
         if self._cli.pattern:
@@ -2115,6 +2705,7 @@ class Manager(object):
             return
 
         self._cleanup()
+        self._clearNarrowCache()
 
         # lfCmd("echohl WarningMsg | redraw | echo ' searching ...' | echohl NONE")
         self._getInstance().setArguments(self._arguments)
@@ -2142,6 +2733,9 @@ class Manager(object):
             self._cli.setPattern(pattern)
             self._result_content = []
             self._cb_content = []
+            self._resetCorpus()
+            self._resetDigests()
+            self._clearNarrowStates()
 
         if not content:
             lfCmd("echohl Error | redraw | echo ' No content!' | echohl NONE")
@@ -2198,6 +2792,7 @@ class Manager(object):
                 if not remember_last_status and not empty_query:
                     self._getInstance().appendBuffer(self._content[self._initial_count:])
                 elif remember_last_status and len(self._getInstance().buffer) < len(self._result_content):
+                    self._sortRemainder()
                     self._getInstance().appendBuffer(self._result_content[self._initial_count:])
 
                 lfCmd("echo")
@@ -2292,6 +2887,7 @@ class Manager(object):
             self._read_content_exception = sys.exc_info()
 
     def _setResultContent(self):
+        self._sortRemainder()
         if len(self._result_content) > len(self._getInstance().buffer):
             self._getInstance().setBuffer(self._result_content)
         elif self._index == 0:
@@ -2310,6 +2906,11 @@ class Manager(object):
             else:
                 raise self._read_content_exception[1]
 
+        if self._background_job is not None:
+            if not self._background_job["thread"].is_alive():
+                self._resumeSearch()
+            return
+
         if bang == False and self._preview_open == False and self._getInstance().getWinPos() in ('popup', 'floatwin') \
                 and not self._getInstance().empty():
             self._previewResult(False)
@@ -2397,6 +2998,7 @@ class Manager(object):
                     self._search(self._content, True, step)
 
                     if bang:
+                        self._sortRemainder()
                         self._getInstance().appendBuffer(self._result_content[self._initial_count:])
         else:
             cur_len = len(self._content)
@@ -2473,6 +3075,11 @@ class Manager(object):
             self._guessSearch(self._content)
 
         for cmd in self._cli.input(self._callback):
+            if self._background_job is not None and not any(equal(cmd, c) for c in
+                    ('<Update>', '<Shorten>', '<Mode>', '<Up>', '<Down>', '<Quit>')):
+                # the result of the current pattern is needed
+                self._resumeSearch()
+
             cur_len = len(self._content)
             cur_content = self._content[:cur_len]
             if equal(cmd, '<Update>'):
@@ -2485,8 +3092,9 @@ class Manager(object):
                     lfCmd("normal! G")
                 else:
                     self._gotoFirstLine()
-                self._index = 0 # search from beginning
-                self._search(cur_content)
+                if not self._restoreNarrowState():
+                    self._index = 0 # search from beginning
+                    self._search(cur_content)
             elif equal(cmd, '<Mode>'):
                 self._setStlMode()
                 if self._getInstance().getWinPos() in ('popup', 'floatwin'):
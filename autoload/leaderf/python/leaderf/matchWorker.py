@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# the loop of a worker process of processMatcher, it must not import vim,
+# since the worker may be started by a Python interpreter, see ProcessMatcher.
+
+from .fuzzyMatch import FuzzyMatch
+
+
+def work(conn, index, count):
+    """
+    the loop of the `index`th worker of `count` workers, it keeps the digests of
+    the lines whose index `i` is such that i % count == index, so that the lines
+    of any range are scored by all the workers.
+    `shards` maps a key to the list of those digests.
+    """
+    shards = {}
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+
+        if msg is None:
+            break
+        elif msg[0] == 'extend':
+            _, key, digests = msg
+            shards.setdefault(key, []).extend(digests)
+        elif msg[0] == 'reset':
+            shards.pop(msg[1], None)
+        elif msg[0] == 'match':
+            _, key, pattern, encoding, method, start, end = msg
+            get_weight = getattr(FuzzyMatch(pattern, encoding), method)
+            MIN_WEIGHT = FuzzyMatch.MIN_WEIGHT
+            digests = shards.get(key, [])
+            # digests[k] is the digest of the line whose index is index + k * count
+            k_start = max(0, (start - index + count - 1) // count)
+            k_end = min(len(digests), (end - index + count - 1) // count)
+            result = []
+            for k in range(k_start, k_end):
+                weight = get_weight(digests[k])
+                if weight > MIN_WEIGHT:
+                    result.append((weight, index + k * count))
+            try:
+                conn.send(result)
+            except (IOError, OSError):  # the workers were stopped while matching
+                break
+
+
+#  vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import operator
+import multiprocessing
+from .utils import *
+from .matchWorker import work
+
+
+#*****************************************************
+# ProcessMatcher
+#*****************************************************
+class ProcessMatcher(object):
+    """
+    score the lines with the pure-Python FuzzyMatch in several worker processes,
+    it is used when fuzzyMatch_C is not built, see g:Lf_FuzzyMatchProcesses.
+    the digests of the lines are sent to the workers only once, and kept there,
+    each worker has every `count`th of them, so only the pattern is sent on every search.
+    the digests are kept by a key, so that the managers do not discard the others'.
+
+    the workers are started by a Python interpreter of the same version if one is
+    found, since Vim is not a Python interpreter. otherwise Vim's process is forked,
+    which is multi-threaded: only the forking thread is copied, so the workers must
+    never touch vim or any lock that may be held by another thread of Vim.
+    """
+    def __init__(self):
+        self._workers = []
+        self._digests = {}  # key -> the list of digests sent to the workers
+        self._sizes = {}    # key -> the number of digests sent to the workers
+        self._timeout = 10  # seconds to wait for the result of a worker
+
+    def _findPython(self):
+        if os.path.basename(sys.executable).lower().startswith('python'):
+            return sys.executable
+
+        if os.name == 'nt':
+            path = os.path.join(sys.exec_prefix, 'python.exe')
+        else:
+            path = os.path.join(sys.exec_prefix, 'bin', 'python%d.%d' % sys.version_info[:2])
+
+        return path if os.path.isfile(path) else None
+
+    def _getContext(self):
+        if sys.version_info >= (3, 4):
+            python = self._findPython()
+            if python is not None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                context.set_executable(python)
+                return context
+
+            if 'fork' not in multiprocessing.get_all_start_methods():
+                return None
+            return multiprocessing.get_context('fork')
+        elif os.name == 'nt':
+            return None
+        else:
+            return multiprocessing
+
+    def isEnabled(self):
+        process_count = int(lfEval("get(g:, 'Lf_FuzzyMatchProcesses', 0)"))
+        if process_count < 2:
+            self.stop()
+            return False
+
+        if len(self._workers) != process_count:
+            self.stop()
+            context = self._getContext()
+            if context is None:
+                return False
+
+            try:
+                for i in range(process_count):
+                    conn, child_conn = context.Pipe()
+                    process = context.Process(target=work, args=(child_conn, i, process_count))
+                    process.daemon = True
+                    process.start()
+                    child_conn.close()
+                    self._workers.append((process, conn))
+            except Exception:
+                self.stop()
+                return False
+
+        return True
+
+    def stop(self):
+        for process, conn in self._workers:
+            try:
+                conn.send(None)
+                conn.close()
+            except Exception:
+                pass
+            process.join(0.1)
+
+        self._workers = []
+        self._digests = {}
+        self._sizes = {}
+
+    def sync(self, digests, key):
+        """
+        make the workers have all the digests of `digests` under `key`,
+        `digests` is only extended, or replaced by another list.
+        """
+        if self._digests.get(key) is not digests:
+            for _, conn in self._workers:
+                conn.send(('reset', key))
+            self._digests[key] = digests
+            self._sizes[key] = 0
+
+        size = self._sizes[key]
+        length = len(digests)
+        if length > size:
+            count = len(self._workers)
+            for i, (_, conn) in enumerate(self._workers):
+                # the first index after `size` that belongs to the ith worker
+                first = size + (i - size) % count
+                if first < length:
+                    conn.send(('extend', key, digests[first:length:count]))
+            self._sizes[key] = length
+
+    def filter(self, key, pattern, encoding, method, start, end):
+        """
+        return a list of (weight, index) in the order of index, the weights of the
+        lines of digests[start:end] that match `pattern`, computed by `method` of FuzzyMatch.
+        an exception is raised if a worker exits or does not respond in time,
+        the caller should stop() the workers and match the lines by itself then.
+        """
+        msg = ('match', key, pattern, encoding, method, start, end)
+        for _, conn in self._workers:
+            conn.send(msg)
+
+        result = []
+        deadline = time.time() + self._timeout
+        for process, conn in self._workers:
+            while not conn.poll(0.1):
+                if not process.is_alive():
+                    raise RuntimeError("worker process %d exited" % process.pid)
+                if time.time() > deadline:
+                    raise RuntimeError("worker process %d does not respond" % process.pid)
+            result.extend(conn.recv())
+        result.sort(key=operator.itemgetter(1))
+
+        return result
+
+
+#*****************************************************
+# processMatcher is a singleton
+#*****************************************************
+processMatcher = ProcessMatcher()
+
+__all__ = ['processMatcher']
+
+#  vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import json
+from .utils import *
+
+
+#*****************************************************
+# StepController
+#*****************************************************
+class StepController(object):
+    """
+    learn how many lines per second each engine filters for each category,
+    so that the number of lines filtered one time can be adapted to the
+    time limit g:Lf_FilterTimeSlice, instead of a fixed number.
+    the learned rates are saved in the cache directory, so they are kept
+    across sessions.
+    """
+    def __init__(self):
+        self._rates = None
+        self._modified = False
+
+    def _getCacheFile(self):
+        return os.path.join(lfEval("g:Lf_CacheDirectory"), '.LfCache',
+                            'python' + lfEval("g:Lf_PythonVersion"), 'stepRates')
+
+    def _loadRates(self):
+        self._rates = {}
+        try:
+            with lfOpen(self._getCacheFile(), 'r', errors='ignore') as f:
+                rates = json.load(f)
+            if isinstance(rates, dict):
+                self._rates = dict((k, float(v)) for k, v in rates.items() if float(v) > 0)
+        except Exception:
+            pass
+
+    def getStep(self, category, engine, step, unit=1):
+        """
+        return the number of lines that `engine` is expected to filter within
+        g:Lf_FilterTimeSlice milliseconds, `step` is returned if nothing is learned.
+        """
+        time_slice = float(lfEval("get(g:, 'Lf_FilterTimeSlice', 16)"))
+        if time_slice <= 0:
+            return step
+
+        if self._rates is None:
+            self._loadRates()
+
+        rate = self._rates.get("%s:%s" % (category, engine))
+        if rate is None:
+            return step
+
+        # too small steps make the overhead of each call dominate
+        new_step = min(max(int(rate * time_slice / 1000), 1000 * unit), step * 8)
+        return max(new_step // unit * unit, unit)
+
+    def update(self, category, engine, count, elapsed):
+        """
+        `count` lines are filtered by `engine` in `elapsed` seconds.
+        """
+        # the samples are too small to be measured accurately
+        if count < 1000 or elapsed < 0.002:
+            return
+
+        if self._rates is None:
+            self._loadRates()
+
+        key = "%s:%s" % (category, engine)
+        rate = count / elapsed
+        if key in self._rates:
+            rate = self._rates[key] * 0.7 + rate * 0.3
+        self._rates[key] = rate
+        self._modified = True
+
+    def save(self):
+        if not self._modified:
+            return
+
+        self._modified = False
+        try:
+            cache_file = self._getCacheFile()
+            cache_dir = os.path.dirname(cache_file)
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            with lfOpen(cache_file, 'w', errors='ignore') as f:
+                json.dump(self._rates, f)
+        except Exception:
+            pass
+
+
+#*****************************************************
+# stepController is a singleton
+#*****************************************************
+stepController = StepController()
+
+__all__ = ['stepController']
+
+#  vim: set ts=4 sw=4 tw=0 et :
@@ -47,6 +47,10 @@ if sys.version_info >= (3, 0):
     def lfGetCwd():
         return os.getcwd()
 
+    def lfReraise(exc_info):
+        """ raise the exception of `exc_info`, returned by sys.exc_info(), with its traceback """
+        raise exc_info[1].with_traceback(exc_info[2])
+
 else: # python 2.x
 
     range = xrange
@@ -88,6 +92,10 @@ else: # python 2.x
     def lfGetCwd():
         return os.getcwdu().encode(lf_encoding)
 
+    # `raise tp, value, tb` is a syntax error in python 3.x
+    exec("def lfReraise(exc_info):\n"
+         "    raise exc_info[0], exc_info[1], exc_info[2]\n")
+
 #-----------------------------------------------------------------------------
 
 if os.name == 'nt':
@@ -138,6 +146,185 @@ def equal(str1, str2, ignorecase=True):
     else:
         return str1 == str2
 
+# character classes of vim regex, 'ignorecase' is not used by them
+_vim_char_classes = {
+    's': r'[ \t]',          'S': r'[^ \t]',
+    'd': r'[0-9]',          'D': r'[^0-9]',
+    'w': r'[0-9A-Za-z_]',   'W': r'[^0-9A-Za-z_]',
+    'a': r'[A-Za-z]',       'A': r'[^A-Za-z]',
+    'l': r'[a-z]',          'L': r'[^a-z]',
+    'u': r'[A-Z]',          'U': r'[^A-Z]',
+    'x': r'[0-9A-Fa-f]',    'X': r'[^0-9A-Fa-f]',
+    'o': r'[0-7]',          'O': r'[^0-7]',
+    'h': r'[A-Za-z_]',      'H': r'[^A-Za-z_]',
+}
+
+_vim_escapes = {'e': r'\x1b', 't': r'\t', 'r': r'\r', 'n': r'\n'}
+
+def _translateVimCollection(regex, i):
+    """
+    translate the collection starting at regex[i], which is '['.
+    return (python_regex, end), `python_regex` is '' if it is not a collection,
+    or None if it can not be translated.
+    """
+    n = len(regex)
+    j = i + 1
+    out = ['[']
+    if j < n and regex[j] == '^':
+        out.append('^')
+        j += 1
+    first = j
+    while j < n and (regex[j] != ']' or j == first):
+        c = regex[j]
+        if c == '[' and j + 1 < n and regex[j+1] in ':=.':
+            return (None, j)
+        elif c == '\\' and j + 1 < n:
+            c = regex[j+1]
+            if c in '\\]^-':
+                out.append('\\' + c)
+            elif c in _vim_escapes:
+                out.append(_vim_escapes[c])
+            else:
+                return (None, j)
+            j += 2
+        elif c == '-' and j != first and j + 1 < n and regex[j+1] != ']':
+            out.append('-')
+            j += 1
+        else:
+            out.append(re.escape(c))
+            j += 1
+
+    if j == n:  # no ']', '[' is a literal character
+        return ('', i + 1)
+
+    out.append(']')
+    return (''.join(out), j + 1)
+
+def translateVimRegex(regex, ignorecase=False):
+    """
+    translate `regex`, a vim regular expression in 'magic' mode, to a compiled
+    python regular expression, which matches the same strings as match() does.
+    `ignorecase` is the value of 'ignorecase'.
+    return None if `regex` can not be translated.
+    """
+    out = []
+    n = len(regex)
+    i = 0
+    # 'start' at the start of a branch, 'atom' after an atom, 'multi' after a multi
+    state = 'start'
+    # '^' is magic only at the start of a branch
+    is_branch_start = True
+    uses_case_class = False
+    while i < n:
+        c = regex[i]
+        i += 1
+        was_branch_start = is_branch_start
+        is_branch_start = False
+        if was_branch_start and c == '^':
+            out.append('^')
+            continue
+        if c == '\\':
+            if i == n:
+                return None
+            c = regex[i]
+            i += 1
+            if c == '(' or c == '%' and regex[i:i+1] == '(':
+                if c == '%':
+                    i += 1
+                out.append('(' if c == '(' else '(?:')
+                state = 'start'
+                is_branch_start = True
+            elif c == '|':
+                out.append('|')
+                state = 'start'
+                is_branch_start = True
+            elif c == ')':
+                out.append(')')
+                state = 'atom'
+            elif c in '+=?{':
+                if state != 'atom':
+                    return None
+                if c == '{':
+                    m = re.match(r'(-?)(\d*)(,?)(\d*)\\?\}', regex[i:])
+                    if m is None:
+                        return None
+                    i += m.end()
+                    lazy, low, comma, high = m.groups()
+                    if comma:
+                        multi = '{%s,%s}' % (low or '0', high)
+                    elif low:
+                        multi = '{%s}' % low
+                    else:
+                        multi = '*'
+                    out.append(multi + '?' if lazy else multi)
+                else:
+                    out.append('+' if c == '+' else '?')
+                state = 'multi'
+            elif c == '<':
+                out.append(r'\b(?=\w)')
+                state = 'multi'
+            elif c == '>':
+                out.append(r'\b(?<=\w)')
+                state = 'multi'
+            elif c in 'cC' or c == 'z' and regex[i:i+1] in ('s', 'e'):
+                if c == 'z':
+                    # \zs and \ze do not change whether a string matches
+                    i += 1
+                else:
+                    ignorecase = c == 'c'
+                is_branch_start = was_branch_start
+            elif c in _vim_char_classes:
+                uses_case_class = uses_case_class or c in 'lLuU'
+                out.append(_vim_char_classes[c])
+                state = 'atom'
+            elif c in _vim_escapes:
+                out.append(_vim_escapes[c])
+                state = 'atom'
+            elif c in '123456789':
+                out.append('\\' + c)
+                state = 'atom'
+            elif c in '\\.*[]~/^$':
+                out.append(re.escape(c))
+                state = 'atom'
+            else:
+                return None
+        elif c == '[':
+            collection, end = _translateVimCollection(regex, i - 1)
+            if collection is None:
+                return None
+            i = end
+            out.append(collection or re.escape(c))
+            state = 'atom'
+        elif c == '.':
+            out.append('.')
+            state = 'atom'
+        elif c == '*':
+            if state == 'multi':
+                return None
+            elif state == 'atom':
+                out.append('*')
+                state = 'multi'
+            else:
+                out.append(r'\*')
+                state = 'atom'
+        elif c == '$' and (i == n or regex[i:i+2] in ('\\|', '\\)')):
+            out.append('$')
+            state = 'multi'
+        elif c == '~':
+            return None
+        else:
+            out.append(re.escape(c))
+            state = 'atom'
+
+    # 'ignorecase' is not used by \l, \L, \u and \U, but re.IGNORECASE is
+    if ignorecase and uses_case_class:
+        return None
+
+    try:
+        return re.compile(''.join(out), re.IGNORECASE if ignorecase else 0)
+    except (re.error, OverflowError):
+        return None
+
 def lfRelpath(path, start=os.curdir):
     try:
         return lfEncode(os.path.relpath(lfDecode(path), start))
@@ -109,6 +109,16 @@ augroup LeaderF_Gtags
     endif
 augroup END
 
+augroup LeaderF_FileWatcher
+    autocmd!
+    if get(g:, 'Lf_UseFileWatcher', 0) == 1
+        autocmd VimEnter * call leaderf#File#watch()
+        if exists('##DirChanged')
+            autocmd DirChanged * call leaderf#File#watch()
+        endif
+    endif
+augroup END
+
 noremap <silent> <Plug>LeaderfFileTop        :<C-U>Leaderf file --top<CR>
 noremap <silent> <Plug>LeaderfFileBottom     :<C-U>Leaderf file --bottom<CR>
 noremap <silent> <Plug>LeaderfFileLeft       :<C-U>Leaderf file --left<CR>